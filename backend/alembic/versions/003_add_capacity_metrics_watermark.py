@@ -0,0 +1,22 @@
+"""add capacity metrics watermark
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('capacities', sa.Column('metrics_synced_through', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('capacities', 'metrics_synced_through')
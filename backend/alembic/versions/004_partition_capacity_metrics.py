@@ -0,0 +1,102 @@
+"""partition capacity_metrics by month
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '004'
+down_revision = '003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Month arithmetic on timestamptz follows the session zone, partition bounds are UTC
+    op.execute("SET LOCAL TIME ZONE 'UTC'")
+    op.add_column('customers', sa.Column('metrics_retention_days', sa.Integer(), nullable=True))
+
+    op.execute("ALTER TABLE capacity_metrics RENAME TO capacity_metrics_unpartitioned")
+    op.execute("ALTER TABLE capacity_metrics_unpartitioned RENAME CONSTRAINT capacity_metrics_pkey TO capacity_metrics_unpartitioned_pkey")
+    op.execute("ALTER INDEX ix_metric_customer_time RENAME TO ix_metric_customer_time_unpartitioned")
+    op.execute("ALTER INDEX ix_metric_capacity_name_time RENAME TO ix_metric_capacity_name_time_unpartitioned")
+
+    # The partition key has to be part of the primary key on a partitioned table
+    op.execute("""
+        CREATE TABLE capacity_metrics (
+            id BIGINT NOT NULL DEFAULT nextval('capacity_metrics_id_seq'),
+            customer_id UUID NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+            capacity_id UUID NOT NULL REFERENCES capacities(id) ON DELETE CASCADE,
+            collected_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            metric_name VARCHAR(100) NOT NULL,
+            metric_value DOUBLE PRECISION NOT NULL,
+            aggregation_type VARCHAR(20),
+            PRIMARY KEY (id, collected_at)
+        ) PARTITION BY RANGE (collected_at)
+    """)
+    op.create_index('ix_metric_customer_time', 'capacity_metrics', ['customer_id', 'collected_at'])
+    op.create_index('ix_metric_capacity_name_time', 'capacity_metrics', ['capacity_id', 'metric_name', 'collected_at'])
+
+    # Rows outside every monthly range (late or far-future timestamps) land here instead of failing
+    op.execute("CREATE TABLE capacity_metrics_default PARTITION OF capacity_metrics DEFAULT")
+
+    op.execute("""
+        DO $$
+        DECLARE
+            period_start TIMESTAMPTZ;
+            last_start TIMESTAMPTZ := date_trunc('month', now()) + interval '3 months';
+        BEGIN
+            SELECT date_trunc('month', min(collected_at)) INTO period_start FROM capacity_metrics_unpartitioned;
+            period_start := LEAST(COALESCE(period_start, last_start), date_trunc('month', now()));
+            WHILE period_start <= last_start LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF capacity_metrics FOR VALUES FROM (%L) TO (%L)',
+                    'capacity_metrics_p' || to_char(period_start, 'YYYYMMDD'),
+                    period_start,
+                    period_start + interval '1 month'
+                );
+                period_start := period_start + interval '1 month';
+            END LOOP;
+        END $$;
+    """)
+
+    op.execute("""
+        INSERT INTO capacity_metrics (id, customer_id, capacity_id, collected_at, metric_name, metric_value, aggregation_type)
+        SELECT id, customer_id, capacity_id, collected_at, metric_name, metric_value, aggregation_type
+        FROM capacity_metrics_unpartitioned
+    """)
+    op.execute("ALTER SEQUENCE capacity_metrics_id_seq OWNED BY capacity_metrics.id")
+    op.execute("DROP TABLE capacity_metrics_unpartitioned")
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE capacity_metrics RENAME TO capacity_metrics_partitioned")
+    op.execute("ALTER TABLE capacity_metrics_partitioned RENAME CONSTRAINT capacity_metrics_pkey TO capacity_metrics_partitioned_pkey")
+    op.execute("ALTER INDEX ix_metric_customer_time RENAME TO ix_metric_customer_time_partitioned")
+    op.execute("ALTER INDEX ix_metric_capacity_name_time RENAME TO ix_metric_capacity_name_time_partitioned")
+
+    op.execute("""
+        CREATE TABLE capacity_metrics (
+            id BIGINT NOT NULL DEFAULT nextval('capacity_metrics_id_seq') PRIMARY KEY,
+            customer_id UUID NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+            capacity_id UUID NOT NULL REFERENCES capacities(id) ON DELETE CASCADE,
+            collected_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            metric_name VARCHAR(100) NOT NULL,
+            metric_value DOUBLE PRECISION NOT NULL,
+            aggregation_type VARCHAR(20)
+        )
+    """)
+    op.execute("""
+        INSERT INTO capacity_metrics (id, customer_id, capacity_id, collected_at, metric_name, metric_value, aggregation_type)
+        SELECT id, customer_id, capacity_id, collected_at, metric_name, metric_value, aggregation_type
+        FROM capacity_metrics_partitioned
+    """)
+    op.execute("ALTER SEQUENCE capacity_metrics_id_seq OWNED BY capacity_metrics.id")
+    op.execute("DROP TABLE capacity_metrics_partitioned CASCADE")
+    op.create_index('ix_metric_customer_time', 'capacity_metrics', ['customer_id', 'collected_at'])
+    op.create_index('ix_metric_capacity_name_time', 'capacity_metrics', ['capacity_id', 'metric_name', 'collected_at'])
+
+    op.drop_column('customers', 'metrics_retention_days')
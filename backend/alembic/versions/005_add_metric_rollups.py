@@ -0,0 +1,56 @@
+"""add hourly and daily metric rollups
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def create_rollup_table(name: str) -> None:
+    op.create_table(
+        name,
+        sa.Column('capacity_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('metric_name', sa.String(length=100), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('customer_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('min_value', sa.Float(), nullable=False),
+        sa.Column('max_value', sa.Float(), nullable=False),
+        sa.Column('avg_value', sa.Float(), nullable=False),
+        sa.Column('p95_value', sa.Float(), nullable=False),
+        sa.Column('sample_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['capacity_id'], ['capacities.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['customer_id'], ['customers.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('capacity_id', 'metric_name', 'bucket_start')
+    )
+
+
+def upgrade() -> None:
+    create_rollup_table('metric_rollups_hourly')
+    op.create_index('ix_rollup_hourly_customer_time', 'metric_rollups_hourly', ['customer_id', 'bucket_start'])
+    create_rollup_table('metric_rollups_daily')
+    op.create_index('ix_rollup_daily_customer_time', 'metric_rollups_daily', ['customer_id', 'bucket_start'])
+
+    op.create_table(
+        'rollup_watermarks',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('last_metric_id', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('rollup_watermarks')
+    op.drop_index('ix_rollup_daily_customer_time', table_name='metric_rollups_daily')
+    op.drop_table('metric_rollups_daily')
+    op.drop_index('ix_rollup_hourly_customer_time', table_name='metric_rollups_hourly')
+    op.drop_table('metric_rollups_hourly')
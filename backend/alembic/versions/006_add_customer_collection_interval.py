@@ -0,0 +1,22 @@
+"""add customer collection interval
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('customers', sa.Column('collection_interval_minutes', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('customers', 'collection_interval_minutes')
@@ -0,0 +1,36 @@
+"""add capacity change tracking
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('capacities', sa.Column('content_hash', sa.String(64), nullable=True))
+    op.add_column('capacities', sa.Column('last_snapshot_at', sa.DateTime(timezone=True), nullable=True))
+    op.execute(
+        """
+        UPDATE capacities c
+        SET last_snapshot_at = s.collected_at
+        FROM (
+            SELECT capacity_id, max(collected_at) AS collected_at
+            FROM capacity_snapshots
+            GROUP BY capacity_id
+        ) s
+        WHERE s.capacity_id = c.id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('capacities', 'last_snapshot_at')
+    op.drop_column('capacities', 'content_hash')
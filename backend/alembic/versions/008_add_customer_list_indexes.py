@@ -0,0 +1,29 @@
+"""add customer list indexes
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_customers_created_id', 'customers', ['created_at', 'id'])
+    op.create_index(
+        'ix_customers_unhealthy',
+        'customers',
+        ['created_at', 'id'],
+        postgresql_where=sa.text("health_status IN ('degraded', 'critical')"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_customers_unhealthy', table_name='customers')
+    op.drop_index('ix_customers_created_id', table_name='customers')
@@ -0,0 +1,146 @@
+"""compact capacity_metrics with a metric_definitions dimension
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def set_aside(suffix: str) -> None:
+    # Partition and constraint names are reused by the replacement table, so the old ones move out of the way
+    op.execute(f"ALTER TABLE capacity_metrics RENAME TO capacity_metrics_{suffix}")
+    op.execute(f"ALTER TABLE capacity_metrics_{suffix} RENAME CONSTRAINT capacity_metrics_pkey TO capacity_metrics_{suffix}_pkey")
+    op.execute(f"""
+        DO $$
+        DECLARE
+            part RECORD;
+        BEGIN
+            FOR part IN
+                SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'capacity_metrics_{suffix}'::regclass
+            LOOP
+                EXECUTE format('ALTER TABLE %I RENAME TO %I', part.relname, part.relname || '_{suffix}');
+                EXECUTE format(
+                    'ALTER TABLE %I RENAME CONSTRAINT %I TO %I',
+                    part.relname || '_{suffix}', part.relname || '_pkey', part.relname || '_{suffix}_pkey'
+                );
+            END LOOP;
+        END $$;
+    """)
+
+
+def copy_partitions(suffix: str) -> None:
+    # Same bounds as before, so retention and partition maintenance carry on unchanged
+    op.execute(f"""
+        DO $$
+        DECLARE
+            part RECORD;
+        BEGIN
+            FOR part IN
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'capacity_metrics_{suffix}'::regclass
+            LOOP
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF capacity_metrics %s',
+                    left(part.relname, length(part.relname) - length('_{suffix}')),
+                    part.bound
+                );
+            END LOOP;
+        END $$;
+    """)
+
+
+def upgrade() -> None:
+    op.create_table(
+        'metric_definitions',
+        sa.Column('id', sa.SmallInteger(), sa.Identity(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('aggregation_type', sa.String(length=20), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name', 'aggregation_type', name='uq_metric_definition', postgresql_nulls_not_distinct=True)
+    )
+    op.execute("""
+        INSERT INTO metric_definitions (name, aggregation_type)
+        SELECT DISTINCT metric_name, aggregation_type FROM capacity_metrics ORDER BY 1, 2
+    """)
+
+    set_aside('wide')
+    op.execute("ALTER INDEX ix_metric_customer_time RENAME TO ix_metric_customer_time_wide")
+    op.execute("ALTER INDEX ix_metric_capacity_name_time RENAME TO ix_metric_capacity_name_time_wide")
+
+    # customer_id follows from capacity_id, and the name and aggregation type become a 2-byte key
+    op.execute("""
+        CREATE TABLE capacity_metrics (
+            id BIGINT NOT NULL DEFAULT nextval('capacity_metrics_id_seq'),
+            capacity_id UUID NOT NULL REFERENCES capacities(id) ON DELETE CASCADE,
+            collected_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            metric_id SMALLINT NOT NULL REFERENCES metric_definitions(id),
+            metric_value DOUBLE PRECISION NOT NULL,
+            PRIMARY KEY (id, collected_at)
+        ) PARTITION BY RANGE (collected_at)
+    """)
+    copy_partitions('wide')
+
+    op.execute("""
+        INSERT INTO capacity_metrics (id, capacity_id, collected_at, metric_id, metric_value)
+        SELECT m.id, m.capacity_id, m.collected_at, d.id, m.metric_value
+        FROM capacity_metrics_wide m
+        JOIN metric_definitions d
+            ON d.name = m.metric_name AND d.aggregation_type IS NOT DISTINCT FROM m.aggregation_type
+    """)
+    # Built after the load, which is faster than maintaining it row by row
+    op.create_index('ix_metric_capacity_metric_time', 'capacity_metrics', ['capacity_id', 'metric_id', 'collected_at'])
+    op.execute("ALTER SEQUENCE capacity_metrics_id_seq OWNED BY capacity_metrics.id")
+    op.execute("DROP TABLE capacity_metrics_wide")
+
+    # Power BI and ad-hoc SQL keep the old columns through this view
+    op.execute("""
+        CREATE VIEW capacity_metrics_view AS
+        SELECT m.id, c.customer_id, m.capacity_id, m.collected_at, d.name AS metric_name,
+               m.metric_value, d.aggregation_type
+        FROM capacity_metrics m
+        JOIN capacities c ON c.id = m.capacity_id
+        JOIN metric_definitions d ON d.id = m.metric_id
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP VIEW capacity_metrics_view")
+    set_aside('compact')
+    op.execute("ALTER INDEX ix_metric_capacity_metric_time RENAME TO ix_metric_capacity_metric_time_compact")
+
+    op.execute("""
+        CREATE TABLE capacity_metrics (
+            id BIGINT NOT NULL DEFAULT nextval('capacity_metrics_id_seq'),
+            customer_id UUID NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+            capacity_id UUID NOT NULL REFERENCES capacities(id) ON DELETE CASCADE,
+            collected_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            metric_name VARCHAR(100) NOT NULL,
+            metric_value DOUBLE PRECISION NOT NULL,
+            aggregation_type VARCHAR(20),
+            PRIMARY KEY (id, collected_at)
+        ) PARTITION BY RANGE (collected_at)
+    """)
+    copy_partitions('compact')
+
+    op.execute("""
+        INSERT INTO capacity_metrics (id, customer_id, capacity_id, collected_at, metric_name, metric_value, aggregation_type)
+        SELECT m.id, c.customer_id, m.capacity_id, m.collected_at, d.name, m.metric_value, d.aggregation_type
+        FROM capacity_metrics_compact m
+        JOIN capacities c ON c.id = m.capacity_id
+        JOIN metric_definitions d ON d.id = m.metric_id
+    """)
+    op.create_index('ix_metric_customer_time', 'capacity_metrics', ['customer_id', 'collected_at'])
+    op.create_index('ix_metric_capacity_name_time', 'capacity_metrics', ['capacity_id', 'metric_name', 'collected_at'])
+    op.execute("ALTER SEQUENCE capacity_metrics_id_seq OWNED BY capacity_metrics.id")
+    op.execute("DROP TABLE capacity_metrics_compact")
+    op.drop_table('metric_definitions')
@@ -0,0 +1,34 @@
+"""retune capacity_metrics indexes
+
+Revision ID: 010
+Revises: 009
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '010'
+down_revision = '009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Time before metric: the latest page for a capacity reads only its newest entries instead of sorting its
+    # whole history, and metric_value rides along so aggregations are answered from the index
+    op.drop_index('ix_metric_capacity_metric_time', table_name='capacity_metrics')
+    op.create_index(
+        'ix_metric_capacity_time_metric',
+        'capacity_metrics',
+        ['capacity_id', 'collected_at', 'metric_id'],
+        postgresql_include=['metric_value'],
+    )
+    # Rows arrive in time order, so block ranges summarise collected_at well for time-only filters
+    op.create_index('ix_metric_collected_at_brin', 'capacity_metrics', ['collected_at'], postgresql_using='brin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_metric_collected_at_brin', table_name='capacity_metrics')
+    op.drop_index('ix_metric_capacity_time_metric', table_name='capacity_metrics')
+    op.create_index('ix_metric_capacity_metric_time', 'capacity_metrics', ['capacity_id', 'metric_id', 'collected_at'])
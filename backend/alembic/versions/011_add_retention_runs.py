@@ -0,0 +1,36 @@
+"""add per-table retention and retention run reports
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision = '011'
+down_revision = '010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('customers', sa.Column('snapshots_retention_days', sa.Integer(), nullable=True))
+    op.add_column('customers', sa.Column('hourly_rollups_retention_days', sa.Integer(), nullable=True))
+    op.create_table(
+        'retention_runs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('dry_run', sa.Boolean(), nullable=False),
+        sa.Column('report', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('removed', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('retention_runs')
+    op.drop_column('customers', 'hourly_rollups_retention_days')
+    op.drop_column('customers', 'snapshots_retention_days')
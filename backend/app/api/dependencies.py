@@ -1,20 +1,21 @@
-from fastapi import Depends, HTTPException, Header
+from fastapi import Depends, HTTPException, Header, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.session import get_db
-from app.services.customer_service import get_customer_by_ingest_key
+from app.services.customer_service import authenticate_ingest_key
 from app.core.config import settings
+from app.services.ingest_queue import IngestQueue
 
 
 async def verify_ingest_key(
     x_ingest_key: str = Header(..., alias="X-Ingest-Key"),
     db: AsyncSession = Depends(get_db),
 ):
-    customer = await get_customer_by_ingest_key(db, x_ingest_key)
-    if not customer:
+    identity = await authenticate_ingest_key(db, x_ingest_key)
+    if not identity:
         raise HTTPException(status_code=401, detail="Invalid ingest key")
-    if not customer.is_active:
+    if not identity.is_active:
         raise HTTPException(status_code=403, detail="Customer is deactivated")
-    return customer
+    return identity
 
 
 async def verify_admin_key(
@@ -23,3 +24,8 @@ async def verify_admin_key(
     if x_admin_key != settings.admin_api_key:
         raise HTTPException(status_code=401, detail="Invalid admin key")
     return True
+
+
+def get_ingest_queue(request: Request) -> IngestQueue | None:
+    # None when the queue is disabled or the app runs without its lifespan; ingest then writes inline
+    return getattr(request.app.state, "ingest_queue", None)
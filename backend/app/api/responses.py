@@ -0,0 +1,113 @@
+import csv
+import hashlib
+import io
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Literal
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.services.response_cache import CachedResponse, etag_matches, response_cache
+
+ExportFormat = Literal["json", "ndjson", "csv"]
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+STREAM_BATCH_SIZE = 1000
+# Clients may keep a copy but must revalidate it with If-None-Match before use
+CACHE_CONTROL = "private, no-cache"
+
+
+def encode_batch(rows: list, schema: type[BaseModel], export_format: str) -> str:
+    if export_format == "ndjson":
+        return "".join(schema.model_validate(row).model_dump_json() + "\n" for row in rows)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(schema.model_validate(row).model_dump(mode="json").values())
+    return buffer.getvalue()
+
+
+def csv_header(schema: type[BaseModel]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(schema.model_fields.keys())
+    return buffer.getvalue()
+
+
+def stream_export(
+    session_factory: async_sessionmaker[AsyncSession],
+    statement: Select,
+    schema: type[BaseModel],
+    export_format: str,
+    filename: str,
+) -> StreamingResponse:
+    async def body() -> AsyncIterator[str]:
+        if export_format == "csv":
+            yield csv_header(schema)
+        async with session_factory() as db:
+            # Server-side cursor: rows arrive in fixed batches, so memory stays flat for any range
+            rows = await db.stream(statement.execution_options(yield_per=STREAM_BATCH_SIZE))
+            # Entity selects yield one ORM object per row, column selects are validated as rows
+            if len(statement.column_descriptions) == 1:
+                rows = rows.scalars()
+            async for batch in rows.partitions():
+                yield encode_batch(batch, schema, export_format)
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'},
+    )
+
+
+def set_next_cursor(response: Response, request: Request, next_cursor: str | None):
+    if not next_cursor:
+        return
+    response.headers["X-Next-Cursor"] = next_cursor
+    next_url = request.url.include_query_params(cursor=next_cursor)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+
+
+@lru_cache(maxsize=None)
+def type_adapter(model: Any) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def render_json(content: Any, model: Any = None) -> bytes:
+    if model is not None:
+        adapter = type_adapter(model)
+        content = adapter.dump_python(adapter.validate_python(content, from_attributes=True), mode="json")
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+async def cached_json(
+    request: Request,
+    response: Response,
+    tags: list[str],
+    load: Callable[[], Awaitable[Any]],
+    model: Any = None,
+) -> Any:
+    if not response_cache.enabled:
+        return await load()
+
+    key = await response_cache.key(
+        str(request.url.replace(query="")), request.query_params.multi_items(), tags
+    )
+    cached = await response_cache.get(key)
+    if cached is None:
+        body = render_json(await load(), model)
+        # Headers set while loading (cursor links, resolution) are part of the cached response
+        cached = CachedResponse(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"', dict(response.headers))
+        await response_cache.set(key, cached)
+
+    headers = {**cached.headers, "ETag": cached.etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        response_cache.stats.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
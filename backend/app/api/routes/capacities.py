@@ -1,10 +1,13 @@
 from uuid import UUID
 from datetime import datetime
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.api.responses import ExportFormat, cached_json, set_next_cursor, stream_export
+from app.db.session import get_db, get_session_factory
 from app.schemas.capacity import CapacityResponse, CapacitySnapshotResponse
 from app.services import capacity_service
+from app.services.pagination import InvalidCursorError, split_page
+from app.services.response_cache import capacity_snapshots_tag, customer_capacities_tag
 
 router = APIRouter()
 
@@ -12,10 +15,16 @@ router = APIRouter()
 @router.get("/customers/{customer_id}/capacities", response_model=list[CapacityResponse])
 async def list_capacities(
     customer_id: UUID,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
 ):
-    capacities = await capacity_service.get_capacities_by_customer(db, customer_id)
-    return capacities
+    async def load():
+        return await capacity_service.get_capacities_by_customer(db, customer_id)
+
+    return await cached_json(
+        request, response, [customer_capacities_tag(customer_id)], load, list[CapacityResponse]
+    )
 
 
 @router.get(
@@ -25,9 +34,40 @@ async def list_capacities(
 async def get_capacity_snapshots(
     customer_id: UUID,
     capacity_id: UUID,
+    request: Request,
+    response: Response,
     start: datetime | None = Query(None),
     end: datetime | None = Query(None),
+    cursor: str | None = Query(None),
+    limit: int = Query(1000, ge=1, le=10000),
+    format: ExportFormat = Query("json"),
     db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
 ):
-    snapshots = await capacity_service.get_snapshots(db, customer_id, capacity_id, start, end)
-    return snapshots
+    if format != "json":
+        try:
+            return stream_export(
+                session_factory,
+                capacity_service.snapshots_statement(customer_id, capacity_id, start, end, cursor),
+                CapacitySnapshotResponse,
+                format,
+                f"capacity-{capacity_id}-snapshots",
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def load():
+        try:
+            snapshots = await capacity_service.get_snapshots(
+                db, customer_id, capacity_id, start, end, cursor, limit + 1
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        page, next_cursor = split_page(snapshots, limit)
+        set_next_cursor(response, request, next_cursor)
+        return page
+
+    return await cached_json(
+        request, response, [capacity_snapshots_tag(capacity_id)], load, list[CapacitySnapshotResponse]
+    )
@@ -1,13 +1,17 @@
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from azure.keyvault.secrets.aio import SecretClient
 from azure.identity.aio import DefaultAzureCredential
 from app.core.config import settings
 from app.db.session import get_db
 from app.api.dependencies import verify_admin_key
+from app.api.responses import cached_json, set_next_cursor
 from app.schemas.customer import CustomerCreate, CustomerResponse, CustomerListResponse
 from app.services import customer_service
+from app.services.customer_service import HealthStatus
+from app.services.pagination import InvalidCursorError, split_page
+from app.services.response_cache import HEALTH_SUMMARY_TAG
 import structlog
 
 logger = structlog.get_logger()
@@ -37,12 +41,26 @@ async def create_customer(
 
 @router.get("/customers", response_model=list[CustomerListResponse])
 async def list_customers(
+    request: Request,
+    response: Response,
     active_only: bool = False,
+    health_status: list[HealthStatus] | None = Query(None),
+    search: str | None = Query(None, min_length=1, max_length=200),
+    cursor: str | None = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
     db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_admin_key),
 ):
-    customers = await customer_service.list_customers(db, active_only)
-    return customers
+    try:
+        customers = await customer_service.list_customer_page(
+            db, active_only, health_status, search, cursor, limit + 1
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    page, next_cursor = split_page(customers, limit, time_attr="created_at")
+    set_next_cursor(response, request, next_cursor)
+    return page
 
 
 @router.get("/customers/{customer_id}", response_model=CustomerResponse)
@@ -69,6 +87,19 @@ async def deactivate_customer(
     return customer
 
 
+@router.post("/customers/{customer_id}/ingest-key", response_model=CustomerResponse)
+async def rotate_ingest_key(
+    customer_id: UUID,
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(verify_admin_key),
+):
+    customer = await customer_service.rotate_ingest_key(db, customer_id)
+    if not customer:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    logger.info("customer_ingest_key_rotated", customer_id=str(customer.id))
+    return customer
+
+
 @router.get("/customers/{customer_id}/health")
 async def get_customer_health(
     customer_id: UUID,
@@ -92,27 +123,11 @@ async def get_customer_health(
 
 @router.get("/customers/health/summary")
 async def get_health_summary(
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db),
     _: bool = Depends(verify_admin_key),
 ):
-    customers = await customer_service.list_customers(db, active_only=True)
-    
-    summary = {
-        "total_customers": len(customers),
-        "healthy": sum(1 for c in customers if c.health_status == "healthy"),
-        "degraded": sum(1 for c in customers if c.health_status == "degraded"),
-        "critical": sum(1 for c in customers if c.health_status == "critical"),
-        "customers_by_status": []
-    }
-    
-    for customer in customers:
-        if customer.health_status in ("degraded", "critical"):
-            summary["customers_by_status"].append({
-                "customer_id": str(customer.id),
-                "customer_name": customer.name,
-                "health_status": customer.health_status,
-                "consecutive_failures": customer.consecutive_failures,
-                "last_error": customer.last_collection_error,
-            })
-    
-    return summary
+    return await cached_json(
+        request, response, [HEALTH_SUMMARY_TAG], lambda: customer_service.get_health_summary(db)
+    )
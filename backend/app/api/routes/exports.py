@@ -0,0 +1,59 @@
+import math
+from datetime import datetime
+from typing import Literal
+from uuid import UUID
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.api.dependencies import verify_admin_key
+from app.core.config import settings
+from app.db.session import get_db, get_session_factory
+from app.services import export_service
+from app.services.export_service import ColumnarFormat, ExportFilterError, ExportNotReadyError
+
+router = APIRouter()
+
+
+@router.get("/exports/{dataset}")
+async def export_dataset(
+    dataset: Literal["metrics", "snapshots", "capacities"],
+    format: ColumnarFormat = Query("parquet"),
+    customer_id: UUID | None = Query(None),
+    start: datetime | None = Query(None),
+    end: datetime | None = Query(None),
+    since_id: int | None = Query(None, ge=0),
+    db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
+    _: bool = Depends(verify_admin_key),
+):
+    export = export_service.EXPORT_DATASETS[dataset]
+    try:
+        through_id = await export_service.get_export_through_id(db, export)
+    except ExportNotReadyError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(math.ceil(settings.write_settle_timeout_seconds))},
+        )
+
+    try:
+        sql, args = export_service.export_query(export, customer_id, start, end, since_id, through_id)
+    except ExportFilterError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    headers = {
+        "Content-Disposition": (
+            f'attachment; filename="{dataset}.{export_service.COLUMNAR_EXTENSIONS[format]}"'
+        )
+    }
+    # Pass this back as since_id on the next call to fetch only rows added after this export
+    if through_id is not None:
+        headers["X-Export-Through-Id"] = str(through_id)
+
+    return StreamingResponse(
+        export_service.stream_columnar_export(
+            session_factory, export, sql, args, format, settings.export_batch_rows
+        ),
+        media_type=export_service.COLUMNAR_MEDIA_TYPES[format],
+        headers=headers,
+    )
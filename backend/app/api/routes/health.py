@@ -1,9 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from app import __version__
+from app.services.response_cache import response_cache
 
 router = APIRouter()
 
 
 @router.get("/health")
-async def health_check():
-    return {"status": "ok", "version": __version__}
+async def health_check(request: Request):
+    response = {"status": "ok", "version": __version__}
+    ingest_queue = getattr(request.app.state, "ingest_queue", None)
+    if ingest_queue:
+        response["ingest_queue"] = ingest_queue.snapshot()
+    if response_cache.enabled:
+        response["response_cache"] = response_cache.snapshot()
+    return response
@@ -1,23 +1,74 @@
-from datetime import datetime
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.db.session import get_db
-from app.api.dependencies import verify_ingest_key
+from app.api.dependencies import get_ingest_queue, verify_ingest_key
 from app.schemas.metric import IngestPayload
-from app.services.capacity_service import get_capacity_by_name_and_customer
-from app.models.metric import CapacityMetric
-from app.models.customer import Customer
+from app.services.capacity_service import (
+    get_capacity_by_name_and_customer,
+    get_capacities_by_names,
+)
+from app.services.metric_service import (
+    BatchPayloadError,
+    BatchPayloadTooLargeError,
+    MetricDefinitionLimitError,
+    build_metric_records,
+    bulk_insert_metrics,
+    decompress_body,
+    invalidate_cached_metrics,
+    parse_batch_body,
+    read_body,
+    resolve_metric_definitions,
+)
+from app.services.customer_service import IngestIdentity
+from app.services.ingest_queue import IngestQueue, IngestQueueFullError
+from app.services.telemetry import metric_rows_written
 import structlog
 
 logger = structlog.get_logger()
 router = APIRouter()
 
 
+async def store_metrics(
+    db: AsyncSession, ingest_queue: IngestQueue | None, records: list
+) -> dict[str, int]:
+    # Resolved here rather than at flush time so that a request over the limit is refused, not dropped
+    try:
+        await resolve_metric_definitions(
+            db,
+            {(record[3], record[5]) for record in records},
+            max_new=settings.ingest_max_new_metric_definitions,
+        )
+    except MetricDefinitionLimitError as e:
+        logger.warning("metric_definition_limit", rows=len(records), reason=str(e))
+        raise HTTPException(status_code=422, detail=str(e))
+
+    if ingest_queue is None:
+        metrics_stored = await bulk_insert_metrics(db, records)
+        await db.commit()
+        metric_rows_written.labels(source="ingest").inc(metrics_stored)
+        await invalidate_cached_metrics(records)
+        return {"metrics_stored": metrics_stored}
+
+    try:
+        return {"metrics_queued": ingest_queue.submit(records)}
+    except IngestQueueFullError as e:
+        logger.warning("ingest_queue_full", depth=ingest_queue.depth, rows=len(records))
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(settings.ingest_retry_after_seconds)},
+        )
+
+
 @router.post("/ingest", status_code=202)
 async def ingest_metrics(
     payload: IngestPayload,
-    customer: Customer = Depends(verify_ingest_key),
+    customer: IngestIdentity = Depends(verify_ingest_key),
     db: AsyncSession = Depends(get_db),
+    ingest_queue: IngestQueue | None = Depends(get_ingest_queue),
 ):
     logger.info(
         "ingest_request",
@@ -38,26 +89,79 @@ async def ingest_metrics(
             detail=f"Capacity '{payload.capacity_name}' not found for this customer",
         )
 
-    collected_at = payload.collected_at or datetime.utcnow()
+    records = build_metric_records(customer.id, capacity.id, payload)
+    stored = await store_metrics(db, ingest_queue, records)
+
+    logger.info(
+        "ingest_complete",
+        customer_id=str(customer.id),
+        capacity_id=str(capacity.id),
+        **stored,
+    )
+
+    return {"status": "accepted", **stored}
+
+
+@router.post("/ingest/batch", status_code=202)
+async def ingest_metrics_batch(
+    request: Request,
+    customer: IngestIdentity = Depends(verify_ingest_key),
+    db: AsyncSession = Depends(get_db),
+    ingest_queue: IngestQueue | None = Depends(get_ingest_queue),
+):
+    try:
+        body = await read_body(
+            request.stream(), request.headers.get("content-length"), settings.ingest_max_batch_bytes
+        )
+        raw_body = decompress_body(
+            body, request.headers.get("content-encoding"), settings.ingest_max_batch_bytes
+        )
+        batch = parse_batch_body(raw_body, request.headers.get("content-type"))
+    except BatchPayloadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BatchPayloadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+    capacity_names = [entry.capacity_name for entry in batch.capacities]
+    logger.info(
+        "ingest_batch_request",
+        customer_id=str(customer.id),
+        capacity_count=len(set(capacity_names)),
+        metric_count=sum(len(entry.metrics) for entry in batch.capacities),
+    )
 
-    for metric_data in payload.metrics:
-        metric = CapacityMetric(
-            customer_id=customer.id,
-            capacity_id=capacity.id,
-            collected_at=collected_at,
-            metric_name=metric_data.name,
-            metric_value=metric_data.value,
-            aggregation_type=metric_data.aggregation,
+    capacities = await get_capacities_by_names(db, customer.id, capacity_names)
+    missing = sorted(set(capacity_names) - capacities.keys())
+    if missing:
+        logger.warning(
+            "capacity_not_found",
+            customer_id=str(customer.id),
+            capacity_names=missing,
+        )
+        raise HTTPException(
+            status_code=404,
+            detail=f"Capacities not found for this customer: {', '.join(missing)}",
         )
-        db.add(metric)
 
-    await db.commit()
+    records = []
+    for entry in batch.capacities:
+        records.extend(
+            build_metric_records(customer.id, capacities[entry.capacity_name].id, entry)
+        )
+
+    stored = await store_metrics(db, ingest_queue, records)
 
     logger.info(
-        "ingest_complete",
+        "ingest_batch_complete",
         customer_id=str(customer.id),
-        capacity_id=str(capacity.id),
-        metrics_stored=len(payload.metrics),
+        capacities_updated=len(capacities),
+        **stored,
     )
 
-    return {"status": "accepted", "metrics_stored": len(payload.metrics)}
+    return {
+        "status": "accepted",
+        "capacities_updated": len(capacities),
+        **stored,
+    }
@@ -1,41 +1,180 @@
-from datetime import datetime
+from datetime import datetime, timezone
+from typing import Literal
 from uuid import UUID
-from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.session import get_db
-from app.models.metric import CapacityMetric
-from app.schemas.metric import CapacityMetricResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.api.dependencies import verify_admin_key
+from app.api.responses import ExportFormat, cached_json, set_next_cursor, stream_export
+from app.db.session import get_db, get_session_factory
+from app.schemas.metric import (
+    CapacityMetricResponse,
+    CapacityMetricRollupResponse,
+    MetricAggregateResponse,
+    TopCapacityResponse,
+)
+from app.services import aggregation_service, metric_service, rollup_service
+from app.services.aggregation_service import AggregateFunction, AggregationError, GroupBy
+from app.services.pagination import InvalidCursorError, split_page
+from app.services.response_cache import capacity_metrics_tag, capacity_rollups_tag
 
 router = APIRouter()
 
 
 @router.get(
     "/customers/{customer_id}/capacities/{capacity_id}/metrics",
-    response_model=list[CapacityMetricResponse],
+    response_model=list[CapacityMetricResponse] | list[CapacityMetricRollupResponse],
 )
 async def get_capacity_metrics(
     customer_id: UUID,
     capacity_id: UUID,
+    request: Request,
+    response: Response,
     start: datetime | None = Query(None),
     end: datetime | None = Query(None),
     metric_name: str | None = Query(None),
+    resolution: Literal["raw", "hour", "day", "auto"] = Query("raw"),
+    cursor: str | None = Query(None),
+    limit: int = Query(1000, ge=1, le=10000),
+    format: ExportFormat = Query("json"),
     db: AsyncSession = Depends(get_db),
+    session_factory: async_sessionmaker[AsyncSession] = Depends(get_session_factory),
 ):
-    query = select(CapacityMetric).where(
-        CapacityMetric.customer_id == customer_id,
-        CapacityMetric.capacity_id == capacity_id,
+    resolution = rollup_service.choose_resolution(resolution, start, end)
+    response.headers["X-Metrics-Resolution"] = resolution
+
+    if resolution != "raw":
+        if cursor or format != "json":
+            raise HTTPException(
+                status_code=400,
+                detail="Cursor pagination and streaming are only available for raw resolution",
+            )
+
+        async def load_rollups():
+            return await rollup_service.get_metric_rollups(
+                db, customer_id, capacity_id, resolution, start, end, metric_name, limit
+            )
+
+        return await cached_json(
+            request,
+            response,
+            [capacity_rollups_tag(capacity_id)],
+            load_rollups,
+            list[CapacityMetricRollupResponse],
+        )
+
+    if format != "json":
+        try:
+            return stream_export(
+                session_factory,
+                metric_service.capacity_metrics_statement(
+                    customer_id, capacity_id, start, end, metric_name, cursor
+                ),
+                CapacityMetricResponse,
+                format,
+                f"capacity-{capacity_id}-metrics",
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    async def load_metrics():
+        try:
+            metrics = await metric_service.get_capacity_metrics(
+                db, customer_id, capacity_id, start, end, metric_name, cursor, limit + 1
+            )
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        page, next_cursor = split_page(metrics, limit)
+        set_next_cursor(response, request, next_cursor)
+        return page
+
+    return await cached_json(
+        request, response, [capacity_metrics_tag(capacity_id)], load_metrics, list[CapacityMetricResponse]
     )
 
-    if start:
-        query = query.where(CapacityMetric.collected_at >= start)
-    if end:
-        query = query.where(CapacityMetric.collected_at <= end)
-    if metric_name:
-        query = query.where(CapacityMetric.metric_name == metric_name)
 
-    query = query.order_by(CapacityMetric.collected_at.desc()).limit(1000)
+async def aggregate(
+    db: AsyncSession,
+    metric_name: list[str],
+    start: datetime,
+    end: datetime | None,
+    bucket: str,
+    agg: list[AggregateFunction],
+    group_by: list[GroupBy],
+    customer_id: UUID | None,
+    capacity_id: list[UUID] | None,
+) -> list[dict]:
+    try:
+        return await aggregation_service.aggregate_metrics(
+            db,
+            metric_name,
+            start,
+            end or datetime.now(timezone.utc),
+            aggregation_service.parse_duration(bucket),
+            agg,
+            group_by,
+            customer_id,
+            capacity_id,
+        )
+    except AggregationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 
-    metrics_query = await db.execute(query)
-    metrics = metrics_query.scalars().all()
-    return list(metrics)
+@router.get(
+    "/customers/{customer_id}/metrics/aggregate",
+    response_model=list[MetricAggregateResponse],
+    response_model_exclude_unset=True,
+)
+async def aggregate_customer_metrics(
+    customer_id: UUID,
+    metric_name: list[str] = Query(..., min_length=1),
+    start: datetime = Query(...),
+    end: datetime | None = Query(None),
+    bucket: str = Query("PT1H"),
+    agg: list[AggregateFunction] = Query(["avg"]),
+    group_by: list[GroupBy] = Query(["capacity"]),
+    capacity_id: list[UUID] | None = Query(None),
+    db: AsyncSession = Depends(get_db),
+):
+    return await aggregate(db, metric_name, start, end, bucket, agg, group_by, customer_id, capacity_id)
+
+
+@router.get(
+    "/metrics/aggregate",
+    response_model=list[MetricAggregateResponse],
+    response_model_exclude_unset=True,
+)
+async def aggregate_fleet_metrics(
+    metric_name: list[str] = Query(..., min_length=1),
+    start: datetime = Query(...),
+    end: datetime | None = Query(None),
+    bucket: str = Query("PT1H"),
+    agg: list[AggregateFunction] = Query(["avg"]),
+    group_by: list[GroupBy] = Query(["capacity"]),
+    customer_id: UUID | None = Query(None),
+    capacity_id: list[UUID] | None = Query(None),
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(verify_admin_key),
+):
+    return await aggregate(db, metric_name, start, end, bucket, agg, group_by, customer_id, capacity_id)
+
+
+@router.get("/metrics/top", response_model=list[TopCapacityResponse])
+async def get_top_capacities(
+    metric_name: str = Query(...),
+    window: str = Query("PT1H"),
+    end: datetime | None = Query(None),
+    agg: AggregateFunction = Query("p95"),
+    limit: int = Query(10, ge=1, le=100),
+    customer_id: UUID | None = Query(None),
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(verify_admin_key),
+):
+    end = end or datetime.now(timezone.utc)
+    try:
+        start = end - aggregation_service.parse_duration(window)
+        return await aggregation_service.top_capacities(
+            db, metric_name, start, end, agg, limit, customer_id
+        )
+    except AggregationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.dependencies import verify_admin_key
+from app.db.session import get_db
+from app.schemas.retention import RetentionRunResponse
+from app.services import retention_service
+
+router = APIRouter()
+
+
+@router.get("/retention/runs", response_model=list[RetentionRunResponse])
+async def list_retention_runs(
+    limit: int = Query(20, ge=1, le=200),
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(verify_admin_key),
+):
+    return await retention_service.list_retention_runs(db, limit)
+
+
+@router.post("/retention/dry-run", response_model=RetentionRunResponse, status_code=201)
+async def run_retention_dry_run(
+    db: AsyncSession = Depends(get_db),
+    _: bool = Depends(verify_admin_key),
+):
+    run = await retention_service.run_retention(db, dry_run=True)
+    if run is None:
+        raise HTTPException(status_code=409, detail="A retention run is already in progress")
+    return run
@@ -0,0 +1,21 @@
+import secrets
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.openmetrics import exposition as openmetrics
+from app.core.config import settings
+from app.services.telemetry import registry
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def export_metrics(request: Request, authorization: str | None = Header(None)):
+    if settings.metrics_bearer_token and not secrets.compare_digest(
+        authorization or "", f"Bearer {settings.metrics_bearer_token}"
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+
+    # Prometheus asks for OpenMetrics when it can; anything else gets the classic text format
+    if "application/openmetrics-text" in request.headers.get("accept", ""):
+        return Response(openmetrics.generate_latest(registry), media_type=openmetrics.CONTENT_TYPE_LATEST)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
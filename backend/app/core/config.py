@@ -14,7 +14,72 @@ class Settings(BaseSettings):
     azure_storage_connection_string: str | None = None
     
     collector_interval_minutes: int = 15
+    collector_fast_interval_minutes: int = 2
+    collector_max_backoff_minutes: int = 240
+    collector_jitter_ratio: float = 0.1
+    collector_schedule_refresh_seconds: int = 60
+    collector_stage_timeout_seconds: int = 20
+    collector_customer_budget_seconds: int = 50
+    snapshot_keyframe_minutes: int = 360
     collector_max_concurrency: int = 10
+    collector_db_concurrency: int = 10
+    collector_lease_backend: str = "auto"
+    collector_shard_count: int = 32
+    collector_lease_seconds: int = 60
+    collector_lease_renew_seconds: int = 20
+    collector_replica_id: str | None = None
+    arm_http2: bool = True
+    arm_max_connections: int = 100
+    arm_max_keepalive_connections: int = 20
+    arm_subscription_reads_per_second: float = 20.0
+    arm_subscription_burst: int = 200
+    arm_tenant_reads_per_second: float = 20.0
+    arm_tenant_burst: int = 200
+    arm_ratelimit_reserve: int = 25
+    arm_max_retries: int = 4
+    arm_retry_backoff_seconds: float = 1.0
+    arm_retry_backoff_max_seconds: float = 30.0
+    arm_max_retry_after_seconds: float = 120.0
+    monitor_metrics_enabled: bool = True
+    monitor_metrics_interval: str = "PT5M"
+    monitor_metrics_lookback_minutes: int = 60
+    monitor_metrics_latency_minutes: int = 5
+    monitor_metrics_batch_size: int = 50
+    metric_definitions_ttl_seconds: int = 86400
+    credential_cache_max_entries: int = 1024
+    credential_refresh_margin_seconds: int = 300
+    key_vault_secret_ttl_seconds: int = 3600
+    metrics_partition_period: str = "month"
+    metrics_partition_premake: int = 3
+    metrics_retention_days: int = 395
+    partition_maintenance_interval_hours: int = 6
+    snapshots_retention_days: int = 395
+    hourly_rollups_retention_days: int = 395
+    retention_interval_hours: int = 6
+    retention_dry_run: bool = False
+    retention_batch_rows: int = 5000
+    retention_batch_pause_seconds: float = 0.5
+    rollup_interval_minutes: int = 15
+    rollup_batch_size: int = 500_000
+    write_settle_timeout_seconds: float = 10.0
+    rollup_id_overlap: int = 1000
+    ingest_max_batch_bytes: int = 50 * 1024 * 1024
+    ingest_max_new_metric_definitions: int = 50
+    metric_definition_ids_warn_ratio: float = 0.8
+    export_batch_rows: int = 100_000
+    ingest_key_cache_ttl_seconds: int = 60
+    ingest_key_negative_ttl_seconds: int = 10
+    ingest_key_cache_max_entries: int = 10_000
+    ingest_queue_enabled: bool = True
+    ingest_queue_max_rows: int = 200_000
+    ingest_flush_rows: int = 5000
+    ingest_flush_interval_seconds: float = 1.0
+    ingest_retry_after_seconds: int = 5
+    response_cache_backend: str = "memory"
+    response_cache_ttl_seconds: int = 300
+    response_cache_max_entries: int = 10_000
+    redis_url: str | None = None
+    metrics_bearer_token: str | None = None
     log_level: str = "INFO"
     
     app_version: str = "0.1.0"
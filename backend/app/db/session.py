@@ -22,3 +22,8 @@ async def get_db() -> AsyncSession:
             yield session
         finally:
             await session.close()
+
+
+def get_session_factory() -> async_sessionmaker[AsyncSession]:
+    # Streaming responses outlive request-scoped dependencies, so they open their own session
+    return AsyncSessionLocal
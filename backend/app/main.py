@@ -4,8 +4,20 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import structlog
 from app.core.config import settings
-from app.api.routes import health, customers, capacities, metrics, ingest
+from app.db.session import engine
+from app.api.routes import health, customers, capacities, metrics, ingest, exports, retention, telemetry
 from app.services.collector import run_collector_loop
+from app.services.ingest_queue import IngestQueue
+from app.services.partition_service import run_partition_maintenance_loop
+from app.services.response_cache import response_cache
+from app.services.retention_service import run_retention_loop
+from app.services.rollup_service import run_rollup_loop
+from app.services.telemetry import (
+    DatabasePoolCollector,
+    IngestQueueCollector,
+    RequestTimingMiddleware,
+    registry,
+)
 
 structlog.configure(
     processors=[
@@ -21,19 +33,45 @@ logger = structlog.get_logger()
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("app_startup", version=settings.app_version)
+    scrape_collectors = [DatabasePoolCollector(engine)]
     
     collector_task = asyncio.create_task(
         run_collector_loop(settings.collector_interval_minutes)
     )
+    partition_task = asyncio.create_task(
+        run_partition_maintenance_loop(settings.partition_maintenance_interval_hours)
+    )
+    rollup_task = asyncio.create_task(run_rollup_loop(settings.rollup_interval_minutes))
+    retention_task = asyncio.create_task(run_retention_loop(settings.retention_interval_hours))
+    tasks = [collector_task, partition_task, rollup_task, retention_task]
+
+    ingest_queue = None
+    if settings.ingest_queue_enabled:
+        ingest_queue = IngestQueue(
+            max_rows=settings.ingest_queue_max_rows,
+            flush_rows=settings.ingest_flush_rows,
+            flush_interval=settings.ingest_flush_interval_seconds,
+        )
+        app.state.ingest_queue = ingest_queue
+        tasks.append(asyncio.create_task(ingest_queue.run()))
+        scrape_collectors.append(IngestQueueCollector(ingest_queue))
+    for collector in scrape_collectors:
+        registry.register(collector)
     
     yield
     
     logger.info("app_shutdown")
-    collector_task.cancel()
-    try:
-        await collector_task
-    except asyncio.CancelledError:
-        pass
+    if ingest_queue:
+        await ingest_queue.close()
+    for task in tasks:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await response_cache.close()
+    for collector in scrape_collectors:
+        registry.unregister(collector)
 
 
 app = FastAPI(
@@ -49,9 +87,13 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestTimingMiddleware)
 
 app.include_router(health.router, tags=["health"])
+app.include_router(telemetry.router, tags=["telemetry"])
 app.include_router(customers.router, prefix="/api", tags=["customers"])
 app.include_router(capacities.router, prefix="/api", tags=["capacities"])
 app.include_router(metrics.router, prefix="/api", tags=["metrics"])
 app.include_router(ingest.router, prefix="/api", tags=["ingest"])
+app.include_router(exports.router, prefix="/api", tags=["exports"])
+app.include_router(retention.router, prefix="/api", tags=["retention"])
@@ -1,5 +1,17 @@
 from app.models.customer import Customer
 from app.models.capacity import Capacity, CapacitySnapshot
-from app.models.metric import CapacityMetric
+from app.models.metric import CapacityMetric, MetricDefinition
+from app.models.rollup import MetricRollupHourly, MetricRollupDaily, RollupWatermark
+from app.models.retention import RetentionRun
 
-__all__ = ["Customer", "Capacity", "CapacitySnapshot", "CapacityMetric"]
+__all__ = [
+    "Customer",
+    "Capacity",
+    "CapacitySnapshot",
+    "CapacityMetric",
+    "MetricDefinition",
+    "MetricRollupHourly",
+    "MetricRollupDaily",
+    "RollupWatermark",
+    "RetentionRun",
+]
@@ -22,6 +22,13 @@ class Capacity(Base):
     last_synced_at: Mapped[datetime | None] = mapped_column(
         DateTime(timezone=True), nullable=True
     )
+    metrics_synced_through: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    content_hash: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    last_snapshot_at: Mapped[datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
 
     customer: Mapped["Customer"] = relationship("Customer", back_populates="capacities")
     snapshots: Mapped[list["CapacitySnapshot"]] = relationship(
@@ -1,6 +1,6 @@
 from datetime import datetime
 from uuid import uuid4
-from sqlalchemy import Boolean, String, Text, DateTime, func
+from sqlalchemy import Boolean, Index, Integer, String, Text, DateTime, func, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
@@ -23,6 +23,10 @@ class Customer(Base):
     last_successful_collection: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     last_collection_error: Mapped[str | None] = mapped_column(Text, nullable=True)
     consecutive_failures: Mapped[int] = mapped_column(default=0, nullable=False)
+    metrics_retention_days: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    snapshots_retention_days: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    hourly_rollups_retention_days: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    collection_interval_minutes: Mapped[int | None] = mapped_column(Integer, nullable=True)
     
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
@@ -34,6 +38,14 @@ class Customer(Base):
     capacities: Mapped[list["Capacity"]] = relationship(
         "Capacity", back_populates="customer", cascade="all, delete-orphan"
     )
-    metrics: Mapped[list["CapacityMetric"]] = relationship(
-        "CapacityMetric", back_populates="customer", cascade="all, delete-orphan"
+
+    __table_args__ = (
+        Index("ix_customers_created_id", "created_at", "id"),
+        # Only the few customers needing attention are indexed, so the drill-down stays small at any fleet size
+        Index(
+            "ix_customers_unhealthy",
+            "created_at",
+            "id",
+            postgresql_where=text("health_status IN ('degraded', 'critical')"),
+        ),
     )
@@ -1,29 +1,54 @@
 from datetime import datetime
-from sqlalchemy import String, Text, DateTime, ForeignKey, Index, Float, BigInteger
+from sqlalchemy import DateTime, ForeignKey, Index, Float, BigInteger, Identity, SmallInteger, String, UniqueConstraint
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 
 
+class MetricDefinition(Base):
+    __tablename__ = "metric_definitions"
+
+    id: Mapped[int] = mapped_column(SmallInteger, Identity(), primary_key=True)
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
+    aggregation_type: Mapped[str | None] = mapped_column(String(20), nullable=True)
+
+    __table_args__ = (
+        UniqueConstraint(
+            "name", "aggregation_type", name="uq_metric_definition", postgresql_nulls_not_distinct=True
+        ),
+    )
+
+
 class CapacityMetric(Base):
     __tablename__ = "capacity_metrics"
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
-    customer_id: Mapped[UUID] = mapped_column(
-        UUID(as_uuid=True), ForeignKey("customers.id", ondelete="CASCADE"), nullable=False
-    )
     capacity_id: Mapped[UUID] = mapped_column(
         UUID(as_uuid=True), ForeignKey("capacities.id", ondelete="CASCADE"), nullable=False
     )
-    collected_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
-    metric_name: Mapped[str] = mapped_column(String(100), nullable=False)
+    # Part of the primary key because the table is range-partitioned on it (migration 004)
+    collected_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), primary_key=True, nullable=False
+    )
+    # Name and aggregation type live in metric_definitions; customer_id comes from the capacity (migration 009)
+    metric_id: Mapped[int] = mapped_column(
+        SmallInteger, ForeignKey("metric_definitions.id"), nullable=False
+    )
     metric_value: Mapped[float] = mapped_column(Float, nullable=False)
-    aggregation_type: Mapped[str | None] = mapped_column(String(20), nullable=True)
 
-    customer: Mapped["Customer"] = relationship("Customer", back_populates="metrics")
     capacity: Mapped["Capacity"] = relationship("Capacity", back_populates="metrics")
+    definition: Mapped[MetricDefinition] = relationship(MetricDefinition)
 
     __table_args__ = (
-        Index("ix_metric_customer_time", "customer_id", "collected_at"),
-        Index("ix_metric_capacity_name_time", "capacity_id", "metric_name", "collected_at"),
+        # Chosen with scripts/benchmark_indexes.py (migration 010)
+        Index(
+            "ix_metric_capacity_time_metric",
+            "capacity_id",
+            "collected_at",
+            "metric_id",
+            postgresql_include=["metric_value"],
+        ),
+        Index("ix_metric_collected_at_brin", "collected_at", postgresql_using="brin"),
+        # Partitions are created by partition_service, rows outside them land in the DEFAULT partition
+        {"postgresql_partition_by": "RANGE (collected_at)"},
     )
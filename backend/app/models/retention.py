@@ -0,0 +1,17 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, Boolean, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+
+class RetentionRun(Base):
+    __tablename__ = "retention_runs"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    started_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+    dry_run: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    # What the run found expired, written before anything is removed
+    report: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    removed: Mapped[dict | None] = mapped_column(JSONB, nullable=True)
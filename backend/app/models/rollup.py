@@ -0,0 +1,45 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+
+class MetricRollupColumns:
+    capacity_id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("capacities.id", ondelete="CASCADE"), primary_key=True
+    )
+    metric_name: Mapped[str] = mapped_column(String(100), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    customer_id: Mapped[UUID] = mapped_column(
+        UUID(as_uuid=True), ForeignKey("customers.id", ondelete="CASCADE"), nullable=False
+    )
+    min_value: Mapped[float] = mapped_column(Float, nullable=False)
+    max_value: Mapped[float] = mapped_column(Float, nullable=False)
+    avg_value: Mapped[float] = mapped_column(Float, nullable=False)
+    p95_value: Mapped[float] = mapped_column(Float, nullable=False)
+    sample_count: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class MetricRollupHourly(MetricRollupColumns, Base):
+    __tablename__ = "metric_rollups_hourly"
+
+    __table_args__ = (
+        Index("ix_rollup_hourly_customer_time", "customer_id", "bucket_start"),
+    )
+
+
+class MetricRollupDaily(MetricRollupColumns, Base):
+    __tablename__ = "metric_rollups_daily"
+
+    __table_args__ = (
+        Index("ix_rollup_daily_customer_time", "customer_id", "bucket_start"),
+    )
+
+
+class RollupWatermark(Base):
+    __tablename__ = "rollup_watermarks"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    last_metric_id: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
+    updated_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
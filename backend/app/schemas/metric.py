@@ -3,10 +3,14 @@ from uuid import UUID
 from pydantic import BaseModel, Field
 
 
+# PostgreSQL text cannot hold NUL, so such names would fail at write time instead of in validation
+NO_NUL_PATTERN = r"^[^\x00]*$"
+
+
 class MetricDataPoint(BaseModel):
-    name: str = Field(..., min_length=1, max_length=100)
+    name: str = Field(..., min_length=1, max_length=100, pattern=NO_NUL_PATTERN)
     value: float
-    aggregation: str | None = None
+    aggregation: str | None = Field(None, max_length=20, pattern=NO_NUL_PATTERN)
 
 
 class IngestPayload(BaseModel):
@@ -15,6 +19,10 @@ class IngestPayload(BaseModel):
     collected_at: datetime | None = None
 
 
+class BatchIngestPayload(BaseModel):
+    capacities: list[IngestPayload] = Field(..., min_length=1)
+
+
 class CapacityMetricResponse(BaseModel):
     id: int
     customer_id: UUID
@@ -25,3 +33,40 @@ class CapacityMetricResponse(BaseModel):
     aggregation_type: str | None
 
     model_config = {"from_attributes": True}
+
+
+class CapacityMetricRollupResponse(BaseModel):
+    capacity_id: UUID
+    customer_id: UUID
+    metric_name: str
+    bucket_start: datetime
+    min_value: float
+    max_value: float
+    avg_value: float
+    p95_value: float
+    sample_count: int
+
+    model_config = {"from_attributes": True}
+
+
+class MetricAggregateResponse(BaseModel):
+    bucket_start: datetime
+    capacity_id: UUID | None = None
+    customer_id: UUID | None = None
+    metric_name: str | None = None
+    avg: float | None = None
+    min: float | None = None
+    max: float | None = None
+    sum: float | None = None
+    count: int | None = None
+    p50: float | None = None
+    p95: float | None = None
+    p99: float | None = None
+
+
+class TopCapacityResponse(BaseModel):
+    capacity_id: UUID
+    customer_id: UUID
+    display_name: str | None
+    value: float
+    sample_count: int
@@ -0,0 +1,13 @@
+from datetime import datetime
+from pydantic import BaseModel
+
+
+class RetentionRunResponse(BaseModel):
+    id: int
+    started_at: datetime
+    finished_at: datetime | None
+    dry_run: bool
+    report: dict
+    removed: dict | None
+
+    model_config = {"from_attributes": True}
@@ -0,0 +1,158 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+from uuid import UUID
+from sqlalchemy import func, select, true
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.capacity import Capacity
+from app.models.metric import CapacityMetric, MetricDefinition
+from app.services.metric_service import metric_ids_named
+
+AggregateFunction = Literal["avg", "min", "max", "sum", "count", "p50", "p95", "p99"]
+GroupBy = Literal["capacity", "metric_name", "customer"]
+
+# Fixed origin so buckets line up across queries, e.g. PT15M buckets always start on the quarter hour
+BUCKET_ORIGIN = datetime(2000, 1, 1, tzinfo=timezone.utc)
+MAX_BUCKETS = 10_000
+DURATION_PATTERN = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?)?$")
+
+GROUP_COLUMNS = {
+    "capacity": CapacityMetric.capacity_id,
+    "metric_name": MetricDefinition.name,
+    "customer": Capacity.customer_id,
+}
+GROUP_LABELS = {"capacity": "capacity_id", "metric_name": "metric_name", "customer": "customer_id"}
+
+
+class AggregationError(ValueError):
+    pass
+
+
+def aggregate_expression(function: str, column):
+    if function.startswith("p"):
+        return func.percentile_cont(int(function[1:]) / 100).within_group(column)
+    if function == "count":
+        return func.count(column)
+    return getattr(func, function)(column)
+
+
+def parse_duration(value: str) -> timedelta:
+    match = DURATION_PATTERN.match(value.upper())
+    if not match or not any(match.groups()):
+        raise AggregationError(f"Invalid duration '{value}', expected ISO 8601 such as PT15M, PT1H or P1D")
+    days, hours, minutes = (int(part or 0) for part in match.groups())
+    duration = timedelta(days=days, hours=hours, minutes=minutes)
+    if duration < timedelta(minutes=1):
+        raise AggregationError("Duration must be at least one minute")
+    return duration
+
+
+def aggregate_metrics_statement(
+    metric_names: list[str],
+    start: datetime,
+    end: datetime,
+    bucket: timedelta,
+    functions: list[str],
+    group_by: list[str],
+    customer_id: UUID | None = None,
+    capacity_ids: list[UUID] | None = None,
+):
+    if end <= start:
+        raise AggregationError("end must be after start")
+    if (end - start) / bucket > MAX_BUCKETS:
+        raise AggregationError(f"Range covers more than {MAX_BUCKETS} buckets; use a larger bucket")
+
+    bucket_start = func.date_bin(bucket, CapacityMetric.collected_at, BUCKET_ORIGIN).label("bucket_start")
+    groups = [GROUP_COLUMNS[group].label(GROUP_LABELS[group]) for group in dict.fromkeys(group_by)]
+    aggregates = [
+        aggregate_expression(function, CapacityMetric.metric_value).label(function)
+        for function in dict.fromkeys(functions)
+    ]
+
+    capacities = select(Capacity.id).correlate(None)
+    # Requested capacities are intersected with the customer's, so another customer's ids match nothing
+    if customer_id:
+        capacities = capacities.where(Capacity.customer_id == customer_id)
+    if capacity_ids:
+        capacities = capacities.where(Capacity.id.in_(capacity_ids))
+
+    # Constraining capacity_id and the time range matches ix_metric_capacity_time_metric, which also carries
+    # metric_id and metric_value, and the range prunes partitions, so the rows are aggregated from the index
+    query = select(bucket_start, *groups, *aggregates).where(
+        CapacityMetric.capacity_id.in_(capacities),
+        CapacityMetric.metric_id.in_(metric_ids_named(metric_names)),
+        CapacityMetric.collected_at >= start,
+        CapacityMetric.collected_at < end,
+    )
+    if "metric_name" in group_by:
+        query = query.join(MetricDefinition, MetricDefinition.id == CapacityMetric.metric_id)
+    if "customer" in group_by:
+        query = query.join(Capacity, Capacity.id == CapacityMetric.capacity_id)
+
+    return query.group_by(bucket_start, *groups).order_by(bucket_start, *groups)
+
+
+async def aggregate_metrics(
+    db: AsyncSession,
+    metric_names: list[str],
+    start: datetime,
+    end: datetime,
+    bucket: timedelta,
+    functions: list[str],
+    group_by: list[str],
+    customer_id: UUID | None = None,
+    capacity_ids: list[UUID] | None = None,
+) -> list[dict]:
+    aggregate_query = await db.execute(
+        aggregate_metrics_statement(
+            metric_names, start, end, bucket, functions, group_by, customer_id, capacity_ids
+        )
+    )
+    return [dict(row) for row in aggregate_query.mappings().all()]
+
+
+async def top_capacities(
+    db: AsyncSession,
+    metric_name: str,
+    start: datetime,
+    end: datetime,
+    function: str = "p95",
+    limit: int = 10,
+    customer_id: UUID | None = None,
+) -> list[dict]:
+    if end <= start:
+        raise AggregationError("end must be after start")
+
+    # One index range scan per capacity through a lateral join, instead of grouping the whole fleet's rows
+    per_capacity = (
+        select(
+            aggregate_expression(function, CapacityMetric.metric_value).label("value"),
+            func.count().label("sample_count"),
+        )
+        .where(
+            CapacityMetric.capacity_id == Capacity.id,
+            CapacityMetric.metric_id.in_(metric_ids_named([metric_name])),
+            CapacityMetric.collected_at >= start,
+            CapacityMetric.collected_at < end,
+        )
+        .lateral("per_capacity")
+    )
+    query = (
+        select(
+            Capacity.id.label("capacity_id"),
+            Capacity.customer_id,
+            Capacity.display_name,
+            per_capacity.c.value,
+            per_capacity.c.sample_count,
+        )
+        .select_from(Capacity)
+        .join(per_capacity, true())
+        .where(per_capacity.c.sample_count > 0)
+        .order_by(per_capacity.c.value.desc(), Capacity.id)
+        .limit(limit)
+    )
+    if customer_id:
+        query = query.where(Capacity.customer_id == customer_id)
+
+    top_query = await db.execute(query)
+    return [dict(row) for row in top_query.mappings().all()]
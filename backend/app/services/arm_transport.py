@@ -0,0 +1,241 @@
+import asyncio
+import base64
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Callable
+import httpx
+import structlog
+
+logger = structlog.get_logger()
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+RATELIMIT_HEADER_PREFIX = "x-ms-ratelimit-remaining-"
+SUBSCRIPTION_PATTERN = re.compile(r"/subscriptions/([^/?]+)", re.IGNORECASE)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = float(capacity)
+        self.updated = clock()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float | None = None) -> float:
+        now = self.clock() if now is None else now
+        self._refill(now)
+        # Tokens may go negative: each caller takes its place in line and waits out its own debt
+        self.tokens -= 1
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def limit(self, remaining: float, now: float | None = None):
+        self._refill(self.clock() if now is None else now)
+        self.tokens = min(self.tokens, remaining)
+
+    def block(self, seconds: float, now: float | None = None):
+        now = self.clock() if now is None else now
+        self.blocked_until = max(self.blocked_until, now + seconds)
+
+
+@dataclass
+class ArmTransportStats:
+    requests: int = 0
+    retries: int = 0
+    throttled: int = 0
+    server_errors: int = 0
+    transport_errors: int = 0
+    throttle_wait_seconds: float = 0.0
+
+
+def token_tenant(authorization: str | None) -> str | None:
+    # Only routes the request to a tenant bucket; the token itself is validated by ARM
+    if not authorization or not authorization.lower().startswith("bearer "):
+        return None
+    parts = authorization[7:].split(".")
+    if len(parts) != 3:
+        return None
+    try:
+        payload = parts[1] + "=" * (-len(parts[1]) % 4)
+        return json.loads(base64.urlsafe_b64decode(payload)).get("tid")
+    except ValueError:
+        return None
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    retry_after_ms = response.headers.get("retry-after-ms") or response.headers.get("x-ms-retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(float(retry_after_ms) / 1000, 0.0)
+        except ValueError:
+            pass
+    retry_after = response.headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(float(retry_after), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def remaining_quota(response: httpx.Response) -> dict[str, int]:
+    remaining: dict[str, int] = {}
+    for name, value in response.headers.items():
+        if not name.lower().startswith(RATELIMIT_HEADER_PREFIX):
+            continue
+        scope = "tenant" if "-tenant-" in name.lower() else "subscription"
+        try:
+            count = int(value)
+        except ValueError:
+            continue
+        remaining[scope] = min(count, remaining.get(scope, count))
+    return remaining
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    def __init__(
+        self,
+        inner: httpx.AsyncBaseTransport,
+        subscription_rate: float = 20.0,
+        subscription_burst: int = 200,
+        tenant_rate: float = 20.0,
+        tenant_burst: int = 200,
+        remaining_reserve: int = 25,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        max_retry_after: float = 120.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], object] = asyncio.sleep,
+        rng: random.Random | None = None,
+    ):
+        self.inner = inner
+        self.subscription_rate = subscription_rate
+        self.subscription_burst = subscription_burst
+        self.tenant_rate = tenant_rate
+        self.tenant_burst = tenant_burst
+        self.remaining_reserve = remaining_reserve
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.clock = clock
+        self.sleep = sleep
+        self.rng = rng or random.Random()
+        self.stats = ArmTransportStats()
+        self.buckets: dict[tuple[str, ...], TokenBucket] = {}
+
+    def snapshot(self) -> dict:
+        return {"buckets": len(self.buckets), **self.stats.__dict__}
+
+    def _bucket(self, key: tuple[str, ...]) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if key[0] == "tenant":
+                bucket = TokenBucket(self.tenant_rate, self.tenant_burst, self.clock)
+            else:
+                bucket = TokenBucket(self.subscription_rate, self.subscription_burst, self.clock)
+            self.buckets[key] = bucket
+        return bucket
+
+    def buckets_for(self, request: httpx.Request) -> dict[str, TokenBucket]:
+        buckets = {}
+        # ARM and the regional metrics hosts throttle independently, so subscription buckets are per host
+        subscription = SUBSCRIPTION_PATTERN.search(request.url.path)
+        if subscription:
+            buckets["subscription"] = self._bucket(("subscription", request.url.host, subscription.group(1).lower()))
+        tenant = token_tenant(request.headers.get("authorization"))
+        if tenant:
+            buckets["tenant"] = self._bucket(("tenant", tenant))
+        return buckets
+
+    def backoff(self, attempt: int, retry_after: float | None) -> float:
+        if retry_after is not None:
+            # Retry-After is a floor; jitter on top keeps throttled callers from returning together
+            return retry_after + self.rng.uniform(0, self.backoff_base)
+        delay = min(self.backoff_max, self.backoff_base * 2**attempt)
+        return self.rng.uniform(delay / 2, delay)
+
+    async def _throttle(self, buckets: dict[str, TokenBucket]):
+        now = self.clock()
+        wait = max((bucket.reserve(now) for bucket in buckets.values()), default=0.0)
+        if wait > 0:
+            self.stats.throttle_wait_seconds += wait
+            await self.sleep(wait)
+
+    def _observe(self, response: httpx.Response, buckets: dict[str, TokenBucket]):
+        for scope, remaining in remaining_quota(response).items():
+            bucket = buckets.get(scope)
+            if bucket is not None:
+                # Slow down as ARM's own count nears zero, rather than waiting for the first 429
+                bucket.limit(remaining - self.remaining_reserve)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        buckets = self.buckets_for(request)
+        retryable = request.method in IDEMPOTENT_METHODS or request.extensions.get("idempotent", False)
+        attempt = 0
+        while True:
+            await self._throttle(buckets)
+            self.stats.requests += 1
+            try:
+                response = await self.inner.handle_async_request(request)
+            except httpx.TransportError as e:
+                self.stats.transport_errors += 1
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt, None)
+                logger.warning(
+                    "arm_request_retry",
+                    host=request.url.host,
+                    attempt=attempt + 1,
+                    delay=round(delay, 2),
+                    error=str(e),
+                )
+            else:
+                self._observe(response, buckets)
+                if response.status_code not in RETRYABLE_STATUS:
+                    return response
+
+                retry_after = retry_after_seconds(response)
+                if response.status_code == 429:
+                    self.stats.throttled += 1
+                else:
+                    self.stats.server_errors += 1
+                too_long = retry_after is not None and retry_after > self.max_retry_after
+                if not retryable or attempt >= self.max_retries or too_long:
+                    return response
+
+                await response.aclose()
+                delay = self.backoff(attempt, retry_after)
+                if response.status_code == 429:
+                    # Hold every request for this subscription and tenant, not only the one that was throttled
+                    for bucket in buckets.values():
+                        bucket.block(delay)
+                logger.warning(
+                    "arm_request_retry",
+                    host=request.url.host,
+                    attempt=attempt + 1,
+                    delay=round(delay, 2),
+                    status_code=response.status_code,
+                )
+
+            attempt += 1
+            self.stats.retries += 1
+            await self.sleep(delay)
+
+    async def aclose(self):
+        await self.inner.aclose()
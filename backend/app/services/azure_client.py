@@ -1,34 +1,87 @@
+import time
 import httpx
 from azure.identity.aio import ClientSecretCredential
-from typing import Any
+from typing import Any, AsyncIterator
+from app.core.config import settings
+from app.services.arm_transport import RateLimitedTransport
+from app.services.credential_cache import CredentialCache
 import structlog
 
 logger = structlog.get_logger()
 
+ARM_SCOPE = "https://management.azure.com/.default"
+MONITOR_METRICS_SCOPE = "https://metrics.monitor.azure.com/.default"
+
+
+def create_arm_transport(inner: httpx.AsyncBaseTransport | None = None) -> RateLimitedTransport:
+    if inner is None:
+        inner = httpx.AsyncHTTPTransport(
+            http2=settings.arm_http2,
+            limits=httpx.Limits(
+                max_connections=settings.arm_max_connections,
+                max_keepalive_connections=settings.arm_max_keepalive_connections,
+                keepalive_expiry=30.0,
+            ),
+        )
+    return RateLimitedTransport(
+        inner,
+        subscription_rate=settings.arm_subscription_reads_per_second,
+        subscription_burst=settings.arm_subscription_burst,
+        tenant_rate=settings.arm_tenant_reads_per_second,
+        tenant_burst=settings.arm_tenant_burst,
+        remaining_reserve=settings.arm_ratelimit_reserve,
+        max_retries=settings.arm_max_retries,
+        backoff_base=settings.arm_retry_backoff_seconds,
+        backoff_max=settings.arm_retry_backoff_max_seconds,
+        max_retry_after=settings.arm_max_retry_after_seconds,
+    )
+
 
 class AzureClient:
-    def __init__(self):
-        self.http_client = httpx.AsyncClient(timeout=30.0)
+    def __init__(self, transport: httpx.AsyncBaseTransport | None = None):
+        if not isinstance(transport, RateLimitedTransport):
+            transport = create_arm_transport(transport)
+        self.transport = transport
+        self.http_client = httpx.AsyncClient(
+            transport=self.transport, timeout=httpx.Timeout(30.0, connect=10.0)
+        )
         self.arm_endpoint = "https://management.azure.com"
         self.api_version = "2023-11-01"
         self.metrics_api_version = "2023-10-01"
+        self.token_cache = CredentialCache(
+            "arm_token",
+            max_entries=settings.credential_cache_max_entries,
+            refresh_margin=settings.credential_refresh_margin_seconds,
+        )
 
     async def close(self):
+        await self.token_cache.close()
         await self.http_client.aclose()
 
-    async def get_token(self, tenant_id: str, client_id: str, client_secret: str) -> str:
-        credential = ClientSecretCredential(
-            tenant_id=tenant_id,
-            client_id=client_id,
-            client_secret=client_secret,
-        )
-        token = await credential.get_token("https://management.azure.com/.default")
-        await credential.close()
-        return token.token
+    async def get_token(
+        self, tenant_id: str, client_id: str, client_secret: str, scope: str = ARM_SCOPE
+    ) -> str:
+        async def fetch_token() -> tuple[str, float]:
+            credential = ClientSecretCredential(
+                tenant_id=tenant_id,
+                client_id=client_id,
+                client_secret=client_secret,
+            )
+            try:
+                token = await credential.get_token(scope)
+            finally:
+                await credential.close()
+            return token.token, token.expires_on - time.time()
+
+        return await self.token_cache.get((tenant_id, client_id, scope), fetch_token)
+
+    def invalidate_token(self, tenant_id: str, client_id: str):
+        for scope in (ARM_SCOPE, MONITOR_METRICS_SCOPE):
+            self.token_cache.invalidate((tenant_id, client_id, scope))
 
     async def list_capacities(
         self, token: str, subscription_id: str, resource_group: str | None = None
-    ) -> list[dict[str, Any]]:
+    ) -> AsyncIterator[list[dict[str, Any]]]:
         headers = {"Authorization": f"Bearer {token}"}
         
         if resource_group:
@@ -45,22 +98,29 @@ class AzureClient:
                 f"?api-version={self.api_version}"
             )
 
-        try:
-            response = await self.http_client.get(url, headers=headers)
-            response.raise_for_status()
-            capacities_body = response.json()
-            return capacities_body.get("value", [])
-        except httpx.HTTPStatusError as e:
-            logger.error(
-                "arm_api_error",
-                url=url,
-                status_code=e.response.status_code,
-                response=e.response.text,
-            )
-            raise
-        except Exception as e:
-            logger.error("arm_api_exception", url=url, error=str(e))
-            raise
+        while url:
+            try:
+                response = await self.http_client.get(url, headers=headers)
+                response.raise_for_status()
+                capacities_body = response.json()
+            except httpx.HTTPStatusError as e:
+                logger.error(
+                    "arm_api_error",
+                    url=url,
+                    status_code=e.response.status_code,
+                    response=e.response.text,
+                )
+                raise
+            except Exception as e:
+                logger.error("arm_api_exception", url=url, error=str(e))
+                raise
+
+            yield capacities_body.get("value", [])
+
+            url = capacities_body.get("nextLink")
+            # The bearer token is only ever sent back to ARM, whatever host a continuation link names
+            if url and not url.startswith(f"{self.arm_endpoint}/"):
+                raise ValueError(f"Refusing to follow nextLink outside {self.arm_endpoint}: {url}")
 
     async def get_capacity(self, token: str, resource_id: str) -> dict[str, Any]:
         headers = {"Authorization": f"Bearer {token}"}
@@ -139,3 +199,52 @@ class AzureClient:
         except Exception as e:
             logger.warning("metrics_exception", resource_id=resource_id, error=str(e))
             return {"value": []}
+
+    async def get_metrics_batch(
+        self,
+        token: str,
+        subscription_id: str,
+        region: str,
+        resource_ids: list[str],
+        metric_names: list[str],
+        aggregations: list[str],
+        starttime: str,
+        endtime: str,
+        interval: str = "PT5M",
+        metric_namespace: str = "Microsoft.Fabric/capacities",
+    ) -> list[dict[str, Any]]:
+        headers = {"Authorization": f"Bearer {token}"}
+        # The batch API is regional and takes up to 50 resources of one type and subscription
+        url = f"https://{region}.metrics.monitor.azure.com/subscriptions/{subscription_id}/metrics:getBatch"
+        params = {
+            "api-version": self.metrics_api_version,
+            "metricnamespace": metric_namespace,
+            "metricnames": ",".join(metric_names),
+            "aggregation": ",".join(aggregations),
+            "starttime": starttime,
+            "endtime": endtime,
+            "interval": interval,
+        }
+
+        try:
+            # getBatch is a read behind a POST, so it is safe to retry
+            response = await self.http_client.post(
+                url,
+                headers=headers,
+                params=params,
+                json={"resourceids": resource_ids},
+                extensions={"idempotent": True},
+            )
+            response.raise_for_status()
+            return response.json().get("values", [])
+        except httpx.HTTPStatusError as e:
+            logger.warning(
+                "metrics_batch_not_available",
+                region=region,
+                resource_count=len(resource_ids),
+                status_code=e.response.status_code,
+            )
+            return []
+        except Exception as e:
+            logger.warning("metrics_batch_exception", region=region, error=str(e))
+            return []
@@ -1,8 +1,30 @@
-from datetime import datetime
-from uuid import UUID
-from sqlalchemy import select
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Any, NamedTuple
+from uuid import UUID, uuid4
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 from app.models.capacity import Capacity, CapacitySnapshot
+from app.services.pagination import keyset_query
+from app.services.telemetry import time_stage
+
+CAPACITY_HASH_FIELDS = ("display_name", "sku_name", "sku_tier", "location", "state")
+
+
+class CapacitySync(NamedTuple):
+    capacities: list[Capacity]
+    changed: int
+    unchanged: int
+    snapshots: int
+    snapshot_capacity_ids: list[UUID]
+
+
+def capacity_hash(capacity: dict[str, Any]) -> str:
+    fields = [capacity.get(field) for field in CAPACITY_HASH_FIELDS]
+    return hashlib.sha256(json.dumps(fields, separators=(",", ":")).encode()).hexdigest()
 
 
 async def upsert_capacity(
@@ -55,6 +77,155 @@ async def create_snapshot(
     return snapshot
 
 
+async def bulk_upsert_capacities(
+    db: AsyncSession, customer_id: UUID, capacities: list[dict[str, Any]]
+) -> list[Capacity]:
+    if not capacities:
+        return []
+
+    synced_at = datetime.now(timezone.utc)
+    # ON CONFLICT cannot touch the same row twice in one statement, last occurrence wins
+    rows_by_resource = {
+        capacity["azure_resource_id"]: {
+            "id": uuid4(),
+            "customer_id": customer_id,
+            "last_synced_at": synced_at,
+            "content_hash": capacity_hash(capacity),
+            **capacity,
+        }
+        for capacity in capacities
+    }
+    update_columns = [*CAPACITY_HASH_FIELDS, "last_synced_at", "content_hash"]
+    if "last_snapshot_at" in capacities[0]:
+        update_columns.append("last_snapshot_at")
+
+    stmt = pg_insert(Capacity).values(list(rows_by_resource.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Capacity.azure_resource_id],
+        set_={
+            column: stmt.excluded[column]
+            for column in update_columns
+        },
+        # Never rewrite a resource row that belongs to another customer
+        where=Capacity.customer_id == stmt.excluded.customer_id,
+    ).returning(Capacity)
+
+    capacities_query = await db.execute(
+        stmt, execution_options={"populate_existing": True}
+    )
+    return list(capacities_query.scalars().all())
+
+
+async def create_snapshots(db: AsyncSession, snapshots: list[dict[str, Any]]) -> int:
+    if not snapshots:
+        return 0
+    await db.execute(insert(CapacitySnapshot), snapshots)
+    return len(snapshots)
+
+
+async def sync_capacities(
+    db: AsyncSession,
+    customer_id: UUID,
+    capacities: list[dict[str, Any]],
+    keyframe_interval: timedelta,
+) -> CapacitySync:
+    if not capacities:
+        return CapacitySync([], 0, 0, 0, [])
+
+    synced_at = datetime.now(timezone.utc)
+    incoming = {capacity["azure_resource_id"]: capacity for capacity in capacities}
+    with time_stage("upsert"):
+        existing_query = await db.execute(
+            select(
+                Capacity.id,
+                Capacity.azure_resource_id,
+                Capacity.content_hash,
+                Capacity.state,
+                Capacity.sku_name,
+                Capacity.last_snapshot_at,
+            ).where(
+                Capacity.customer_id == customer_id,
+                Capacity.azure_resource_id.in_(list(incoming)),
+            )
+        )
+        existing = {row.azure_resource_id: row for row in existing_query.all()}
+
+        changed_rows = []
+        unchanged_ids = []
+        keyframe_ids = []
+        snapshot_resources = set()
+        for resource_id, capacity in incoming.items():
+            current = existing.get(resource_id)
+            transition = current is None or (current.state, current.sku_name) != (
+                capacity.get("state"),
+                capacity.get("sku_name"),
+            )
+            # Snapshots mark transitions; keyframes bound how far back a reader has to look for the state in effect
+            snapshot_due = transition or current.last_snapshot_at is None or (
+                synced_at - current.last_snapshot_at >= keyframe_interval
+            )
+            if snapshot_due:
+                snapshot_resources.add(resource_id)
+            if current is not None and current.content_hash == capacity_hash(capacity):
+                unchanged_ids.append(current.id)
+                if snapshot_due:
+                    keyframe_ids.append(current.id)
+            else:
+                changed_rows.append(
+                    {**capacity, "last_snapshot_at": synced_at if snapshot_due else current.last_snapshot_at}
+                )
+
+        synced = await bulk_upsert_capacities(db, customer_id, changed_rows) if changed_rows else []
+
+        if unchanged_ids:
+            # Heartbeat only: last_synced_at is unindexed, so this stays a HOT update
+            heartbeat_query = await db.execute(
+                update(Capacity)
+                .where(Capacity.id.in_(unchanged_ids))
+                .values(
+                    last_synced_at=synced_at,
+                    last_snapshot_at=case(
+                        (Capacity.id.in_(keyframe_ids), synced_at), else_=Capacity.last_snapshot_at
+                    ),
+                )
+                .returning(Capacity),
+                execution_options={"populate_existing": True},
+            )
+            synced.extend(heartbeat_query.scalars().all())
+
+    snapshot_capacities = [capacity for capacity in synced if capacity.azure_resource_id in snapshot_resources]
+    with time_stage("snapshot"):
+        snapshots = await create_snapshots(
+            db,
+            [
+                {
+                    "capacity_id": capacity.id,
+                    "collected_at": synced_at,
+                    "state": capacity.state or "Unknown",
+                    "sku_name": capacity.sku_name or "Unknown",
+                }
+                for capacity in snapshot_capacities
+            ],
+        )
+    return CapacitySync(
+        synced,
+        len(changed_rows),
+        len(unchanged_ids),
+        snapshots,
+        [capacity.id for capacity in snapshot_capacities],
+    )
+
+
+async def set_metrics_synced_through(
+    db: AsyncSession, capacity_ids: list[UUID], synced_through: datetime
+):
+    await db.execute(
+        update(Capacity)
+        .where(Capacity.id.in_(capacity_ids))
+        .values(metrics_synced_through=synced_through)
+    )
+
+
 async def get_capacities_by_customer(db: AsyncSession, customer_id: UUID) -> list[Capacity]:
     capacities_query = await db.execute(
         select(Capacity)
@@ -75,28 +246,62 @@ async def get_capacity_by_name_and_customer(
     return capacity_query.scalars().first()
 
 
-async def get_snapshots(
-    db: AsyncSession, customer_id: UUID, capacity_id: UUID, start: datetime | None, end: datetime | None
-) -> list[CapacitySnapshot]:
-    capacity_query = await db.execute(
-        select(Capacity).where(
-            Capacity.id == capacity_id,
-            Capacity.customer_id == customer_id
+def snapshots_statement(
+    customer_id: UUID,
+    capacity_id: UUID,
+    start: datetime | None,
+    end: datetime | None,
+    cursor: str | None = None,
+    limit: int | None = None,
+):
+    # Joining on the owning capacity scopes snapshots to the customer without a separate lookup
+    query = (
+        select(CapacitySnapshot)
+        .join(Capacity, Capacity.id == CapacitySnapshot.capacity_id)
+        .where(
+            CapacitySnapshot.capacity_id == capacity_id,
+            Capacity.customer_id == customer_id,
         )
     )
-    capacity = capacity_query.scalars().first()
-    
-    if not capacity:
-        return []
-    
-    query = select(CapacitySnapshot).where(CapacitySnapshot.capacity_id == capacity_id)
-    
+
     if start:
-        query = query.where(CapacitySnapshot.collected_at >= start)
+        # Snapshots are written on transitions and keyframes, so the one in effect at start opens the range
+        earlier = aliased(CapacitySnapshot)
+        in_effect = (
+            select(func.max(earlier.collected_at))
+            .where(earlier.capacity_id == capacity_id, earlier.collected_at <= start)
+            .scalar_subquery()
+        )
+        query = query.where(CapacitySnapshot.collected_at >= func.coalesce(in_effect, start))
     if end:
         query = query.where(CapacitySnapshot.collected_at <= end)
-    
-    query = query.order_by(CapacitySnapshot.collected_at.desc())
-    
-    snapshots_query = await db.execute(query)
+
+    return keyset_query(query, CapacitySnapshot.collected_at, CapacitySnapshot.id, cursor, limit)
+
+
+async def get_snapshots(
+    db: AsyncSession,
+    customer_id: UUID,
+    capacity_id: UUID,
+    start: datetime | None,
+    end: datetime | None,
+    cursor: str | None = None,
+    limit: int | None = None,
+) -> list[CapacitySnapshot]:
+    snapshots_query = await db.execute(
+        snapshots_statement(customer_id, capacity_id, start, end, cursor, limit)
+    )
     return list(snapshots_query.scalars().all())
+
+
+async def get_capacities_by_names(
+    db: AsyncSession, customer_id: UUID, capacity_names: list[str]
+) -> dict[str, Capacity]:
+    if not capacity_names:
+        return {}
+    capacity_query = await db.execute(
+        select(Capacity)
+        .where(Capacity.customer_id == customer_id)
+        .where(Capacity.display_name.in_(set(capacity_names)))
+    )
+    return {capacity.display_name: capacity for capacity in capacity_query.scalars().all()}
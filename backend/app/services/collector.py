@@ -1,95 +1,231 @@
 import asyncio
-from datetime import datetime
+import os
+import socket
+import time
+from contextlib import asynccontextmanager, suppress
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, TypeVar
 from azure.keyvault.secrets.aio import SecretClient
 from azure.identity.aio import DefaultAzureCredential
 from azure.core.exceptions import ClientAuthenticationError
-from azure.storage.blob.aio import BlobServiceClient
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import select, update
+from sqlalchemy.orm import aliased
 from app.core.config import settings
-from app.services.azure_client import AzureClient
+from app.services.azure_client import AzureClient, MONITOR_METRICS_SCOPE
+from app.services.credential_cache import CredentialCache
+from app.services.leases import ShardLeaseManager, create_lease_backend
 from app.services.customer_service import list_customers
-from app.services.capacity_service import upsert_capacity, create_snapshot
+from app.services.capacity_service import set_metrics_synced_through, sync_capacities
+from app.services.metric_service import bulk_insert_metrics, invalidate_cached_metrics
+from app.services.monitor_metrics import MonitorMetricPuller
+from app.services.response_cache import (
+    HEALTH_SUMMARY_TAG,
+    capacity_snapshots_tag,
+    customer_capacities_tag,
+    response_cache,
+)
+from app.services.telemetry import (
+    collection_seconds,
+    customers_in_flight,
+    metric_rows_written,
+    time_pages,
+    time_stage,
+)
+from app.services.scheduler import (
+    CRITICAL_AFTER_FAILURES,
+    DEGRADED_AFTER_FAILURES,
+    CollectionResult,
+    CollectionScheduler,
+)
 from app.models.customer import Customer
 import structlog
 import httpx
 
 logger = structlog.get_logger()
 
+T = TypeVar("T")
+
+# Second handle on customers, for reading the pre-update row inside an UPDATE ... RETURNING
+PreviousCustomer = aliased(Customer)
+
+# Loop time by which the current customer's collection must finish; stages stop there on their own
+collection_deadline: ContextVar[float | None] = ContextVar("collection_deadline", default=None)
+# Time past the deadline before a collection stuck outside any stage is cancelled
+STRAGGLER_GRACE_SECONDS = 5.0
+REPORT_MAX_CUSTOMERS = 50
+
+
+class StageTimeoutError(Exception):
+    def __init__(self, stage: str, seconds: float):
+        super().__init__(f"Collection stage '{stage}' did not finish within {seconds:.1f}s")
+        self.stage = stage
+        self.seconds = seconds
+
+
+@asynccontextmanager
+async def stage_deadline(stage: str):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    when = started + settings.collector_stage_timeout_seconds
+    budget = collection_deadline.get()
+    if budget is not None:
+        when = min(when, budget)
+    try:
+        async with asyncio.timeout_at(when):
+            yield
+    except TimeoutError as e:
+        raise StageTimeoutError(stage, when - started) from e
+
+
+async def pages_within_deadline(source: AsyncIterator[T], stage: str) -> AsyncIterator[T]:
+    try:
+        while True:
+            async with stage_deadline(stage):
+                try:
+                    item = await anext(source)
+                except StopAsyncIteration:
+                    return
+            yield item
+    finally:
+        await source.aclose()
+
+
+@dataclass
+class CycleReport:
+    started: float = field(default_factory=time.monotonic)
+    collected: int = 0
+    failed: int = 0
+    timed_out: dict[str, str] = field(default_factory=dict)
+    skipped: dict[str, str] = field(default_factory=dict)
+    slot_wait_max_seconds: float = 0.0
+
+    def late(self, customer_id, stage: str):
+        self.timed_out[str(customer_id)] = stage
+
+    def skip(self, customer_id, reason: str):
+        self.skipped[str(customer_id)] = reason
+
+    def summary(self) -> dict:
+        # Counts are complete; the listed customers are capped so one bad window cannot flood the logs
+        return {
+            "window_seconds": round(time.monotonic() - self.started, 1),
+            "collected": self.collected,
+            "failed": self.failed,
+            "timed_out": len(self.timed_out),
+            "skipped": len(self.skipped),
+            "slot_wait_max_seconds": round(self.slot_wait_max_seconds, 1),
+            "late_customers": dict(list(self.timed_out.items())[:REPORT_MAX_CUSTOMERS]),
+            "skipped_customers": dict(list(self.skipped.items())[:REPORT_MAX_CUSTOMERS]),
+        }
+
+
+async def prefetch(source: AsyncIterator[T]) -> AsyncIterator[T]:
+    pending = asyncio.ensure_future(anext(source))
+    try:
+        while True:
+            try:
+                item = await pending
+            except StopAsyncIteration:
+                return
+            pending = asyncio.ensure_future(anext(source))
+            yield item
+    finally:
+        if not pending.done():
+            pending.cancel()
+        # The generator cannot be closed while the cancelled fetch is still unwinding inside it
+        with suppress(asyncio.CancelledError, StopAsyncIteration, Exception):
+            await pending
+        await source.aclose()
+
+
+def capacity_values(cap_data: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "azure_resource_id": cap_data["id"],
+        "display_name": cap_data.get("name"),
+        "sku_name": cap_data.get("sku", {}).get("name"),
+        "sku_tier": cap_data.get("sku", {}).get("tier"),
+        "location": cap_data.get("location"),
+        "state": cap_data.get("properties", {}).get("state"),
+    }
+
 
 class CapacityCollector:
-    def __init__(self):
-        self.azure_client = AzureClient()
+    def __init__(
+        self,
+        azure_client: AzureClient | None = None,
+        session_factory: async_sessionmaker[AsyncSession] | None = None,
+        shard_leases: ShardLeaseManager | None = None,
+    ):
+        self.azure_client = azure_client or AzureClient()
+        self.session_factory = session_factory
         self.kv_client: SecretClient | None = None
-        self.blob_client: BlobServiceClient | None = None
-        self.lease_blob_name = "collector-lock"
-        self.lease_duration = 60
+        self.shard_leases = shard_leases
+        self.customer_semaphore = asyncio.Semaphore(settings.collector_max_concurrency)
+        self.db_semaphore = asyncio.Semaphore(settings.collector_db_concurrency)
+        self.cycle_report = CycleReport()
+        self.metric_puller = MonitorMetricPuller(
+            self.azure_client,
+            interval=settings.monitor_metrics_interval,
+            lookback_minutes=settings.monitor_metrics_lookback_minutes,
+            batch_size=settings.monitor_metrics_batch_size,
+            definitions_ttl=settings.metric_definitions_ttl_seconds,
+            latency_minutes=settings.monitor_metrics_latency_minutes,
+        )
+        self.secret_cache = CredentialCache(
+            "key_vault_secret",
+            max_entries=settings.credential_cache_max_entries,
+            refresh_margin=settings.credential_refresh_margin_seconds,
+        )
 
     async def initialize(self):
         credential = DefaultAzureCredential()
         self.kv_client = SecretClient(vault_url=settings.azure_key_vault_url, credential=credential)
         
-        if settings.azure_storage_connection_string:
-            self.blob_client = BlobServiceClient.from_connection_string(
-                settings.azure_storage_connection_string
+        if self.shard_leases is None:
+            backend = create_lease_backend(
+                settings.collector_lease_backend, settings.azure_storage_connection_string
             )
+            if backend is None:
+                logger.warning("distributed_locking_disabled", reason="lease_backend_none")
+            else:
+                self.shard_leases = ShardLeaseManager(
+                    backend,
+                    replica_id=settings.collector_replica_id or f"{socket.gethostname()}-{os.getpid()}",
+                    shard_count=settings.collector_shard_count,
+                    lease_seconds=settings.collector_lease_seconds,
+                    renew_seconds=settings.collector_lease_renew_seconds,
+                )
+
+    @asynccontextmanager
+    async def customer_session(self):
+        if self.session_factory is None:
+            # Deferred import to avoid circular dependency with db module at startup
+            from app.db.session import AsyncSessionLocal
+            self.session_factory = AsyncSessionLocal
+
+        # Each customer writes on its own pooled connection, bounded separately from ARM concurrency
+        async with self.db_semaphore:
+            async with self.session_factory() as db:
+                yield db
 
     async def close(self):
+        await self.secret_cache.close()
         await self.azure_client.close()
         if self.kv_client:
             await self.kv_client.close()
-        if self.blob_client:
-            await self.blob_client.close()
+        if self.shard_leases:
+            await self.shard_leases.release_all()
+            await self.shard_leases.backend.close()
     
-    async def acquire_lock(self) -> str | None:
-        if not self.blob_client:
-            logger.warning("distributed_locking_disabled", reason="no_storage_connection_string")
-            return None
-            
-        try:
-            container_client = self.blob_client.get_container_client("locks")
-            
-            try:
-                await container_client.create_container()
-                logger.info("lock_container_created")
-            except Exception:
-                pass
-            
-            blob_client = container_client.get_blob_client(self.lease_blob_name)
-            
-            try:
-                await blob_client.upload_blob(b"lock", overwrite=False)
-            except Exception:
-                pass
-            
-            lease_client = blob_client.get_blob_lease_client()
-            lease_id = await lease_client.acquire(lease_duration=self.lease_duration)
-            logger.info("distributed_lock_acquired", lease_id=lease_id)
-            return lease_id
-            
-        except Exception as e:
-            logger.warning("failed_to_acquire_lock", error=str(e))
-            return None
-    
-    async def release_lock(self, lease_id: str | None):
-        if not lease_id or not self.blob_client:
-            return
-            
-        try:
-            container_client = self.blob_client.get_container_client("locks")
-            blob_client = container_client.get_blob_client(self.lease_blob_name)
-            lease_client = blob_client.get_blob_lease_client(lease_id)
-            await lease_client.release()
-            logger.info("distributed_lock_released", lease_id=lease_id)
-        except Exception as e:
-            logger.warning("failed_to_release_lock", error=str(e))
-
     async def update_customer_health(
         self, db: AsyncSession, customer_id, success: bool, error_message: str | None = None
     ):
         try:
             if success:
-                await db.execute(
+                health_query = await db.execute(
                     update(Customer)
                     .where(Customer.id == customer_id)
                     .values(
@@ -98,7 +234,15 @@ class CapacityCollector:
                         last_collection_error=None,
                         consecutive_failures=0,
                     )
+                    # A subquery in RETURNING reads the row as it was before this UPDATE
+                    .returning(
+                        select(PreviousCustomer.health_status)
+                        .where(PreviousCustomer.id == customer_id)
+                        .scalar_subquery()
+                    )
                 )
+                # The summary only lists degraded and critical customers, so a healthy success leaves it as is
+                summary_changed = health_query.scalar() != "healthy"
             else:
                 result = await db.execute(
                     select(Customer).where(Customer.id == customer_id)
@@ -107,9 +251,9 @@ class CapacityCollector:
                 new_failures = customer.consecutive_failures + 1
                 
                 health_status = "healthy"
-                if new_failures >= 3:
+                if new_failures >= DEGRADED_AFTER_FAILURES:
                     health_status = "degraded"
-                if new_failures >= 5:
+                if new_failures >= CRITICAL_AFTER_FAILURES:
                     health_status = "critical"
                 
                 await db.execute(
@@ -121,57 +265,147 @@ class CapacityCollector:
                         consecutive_failures=new_failures,
                     )
                 )
+                summary_changed = health_status != "healthy" or customer.health_status != "healthy"
             
             await db.commit()
+            if summary_changed:
+                await response_cache.invalidate(HEALTH_SUMMARY_TAG)
             
         except Exception as e:
             logger.error("failed_to_update_customer_health", customer_id=str(customer_id), error=str(e))
 
-    async def collect_for_customer(self, db: AsyncSession, customer):
+    async def get_client_secret(self, customer) -> str:
+        async def fetch_secret() -> tuple[str, float]:
+            secret = await self.kv_client.get_secret(customer.client_secret_ref)
+            return secret.value, settings.key_vault_secret_ttl_seconds
+
+        return await self.secret_cache.get((customer.tenant_id, customer.client_id), fetch_secret)
+
+    def invalidate_credentials(self, customer):
+        # A rotated or revoked secret must be refetched rather than retried from cache
+        self.secret_cache.invalidate((customer.tenant_id, customer.client_id))
+        self.azure_client.invalidate_token(customer.tenant_id, customer.client_id)
+
+    async def collect_monitor_metrics(
+        self, customer, client_secret: str, arm_token: str, capacities: list
+    ):
+        stored = 0
+        try:
+            async with stage_deadline("monitor_metrics"):
+                monitor_token = await self.azure_client.get_token(
+                    customer.tenant_id, customer.client_id, client_secret, scope=MONITOR_METRICS_SCOPE
+                )
+                # Each regional batch is written as it arrives so a later failure keeps earlier progress
+                async for batch in self.metric_puller.pull(
+                    arm_token, monitor_token, customer.subscription_id, capacities
+                ):
+                    async with self.customer_session() as db:
+                        written = await bulk_insert_metrics(db, batch.records)
+                        await set_metrics_synced_through(db, batch.capacity_ids, batch.synced_through)
+                        await db.commit()
+                    stored += written
+                    metric_rows_written.labels(source="monitor").inc(written)
+                    await invalidate_cached_metrics(batch.records)
+
+            logger.info("monitor_metrics_collected", customer_id=str(customer.id), metrics_stored=stored)
+        except StageTimeoutError as e:
+            # The synced_through watermarks keep the written batches, so the next cycle picks up the rest
+            self.cycle_report.late(customer.id, e.stage)
+            logger.warning(
+                "monitor_metrics_timed_out", customer_id=str(customer.id), metrics_stored=stored, error=str(e)
+            )
+        except Exception as e:
+            logger.warning("monitor_metrics_failed", customer_id=str(customer.id), error=str(e))
+
+    async def record_failure(self, customer_id, error_message: str):
+        async with self.customer_session() as db:
+            await self.update_customer_health(db, customer_id, success=False, error_message=error_message)
+
+    async def collect_for_customer(self, customer) -> CollectionResult:
         error_type = "unknown"
         error_message = None
         
         try:
             logger.info("collecting_capacities", customer_id=str(customer.id), customer_name=customer.name)
 
-            secret = await self.kv_client.get_secret(customer.client_secret_ref)
-            client_secret = secret.value
+            with time_stage("secret"):
+                async with stage_deadline("secret"):
+                    client_secret = await self.get_client_secret(customer)
 
-            token = await self.azure_client.get_token(
-                customer.tenant_id, customer.client_id, client_secret
-            )
+            with time_stage("token"):
+                async with stage_deadline("token"):
+                    token = await self.azure_client.get_token(
+                        customer.tenant_id, customer.client_id, client_secret
+                    )
 
-            capacities = await self.azure_client.list_capacities(
-                token, customer.subscription_id, customer.resource_group
-            )
+            upserted = []
+            pages = changed = unchanged = snapshots = 0
+            keyframe_interval = timedelta(minutes=settings.snapshot_keyframe_minutes)
+            # Each page is written while the next one is still being fetched from ARM
+            async for page in prefetch(
+                pages_within_deadline(
+                    time_pages(
+                        self.azure_client.list_capacities(
+                            token, customer.subscription_id, customer.resource_group
+                        ),
+                        "list_capacities",
+                    ),
+                    "list_capacities",
+                )
+            ):
+                pages += 1
+                if not page:
+                    continue
+                async with stage_deadline("write_capacities"):
+                    async with self.customer_session() as db:
+                        sync = await sync_capacities(
+                            db, customer.id, [capacity_values(cap_data) for cap_data in page], keyframe_interval
+                        )
+                        await db.commit()
+                # Heartbeats move last_synced_at, so the capacity list changes on every page
+                await response_cache.invalidate(
+                    customer_capacities_tag(customer.id),
+                    *map(capacity_snapshots_tag, sync.snapshot_capacity_ids),
+                )
+                upserted.extend(sync.capacities)
+                changed += sync.changed
+                unchanged += sync.unchanged
+                snapshots += sync.snapshots
 
             logger.info(
                 "capacities_discovered",
                 customer_id=str(customer.id),
-                count=len(capacities),
+                count=len(upserted),
+                pages=pages,
+                changed=changed,
+                unchanged=unchanged,
+                snapshots=snapshots,
             )
 
-            for cap_data in capacities:
-                capacity = await upsert_capacity(
-                    db,
-                    customer.id,
-                    cap_data["id"],
-                    cap_data.get("name"),
-                    cap_data.get("sku", {}).get("name"),
-                    cap_data.get("sku", {}).get("tier"),
-                    cap_data.get("location"),
-                    cap_data.get("properties", {}).get("state"),
-                )
+            with time_stage("health"):
+                async with stage_deadline("health"):
+                    async with self.customer_session() as db:
+                        await self.update_customer_health(db, customer.id, success=True)
 
-                await create_snapshot(
-                    db,
-                    capacity.id,
-                    capacity.state or "Unknown",
-                    capacity.sku_name or "Unknown",
-                )
+            if settings.monitor_metrics_enabled and upserted:
+                with time_stage("monitor_metrics"):
+                    await self.collect_monitor_metrics(customer, client_secret, token, upserted)
 
-            await self.update_customer_health(db, customer.id, success=True)
             logger.info("collection_complete", customer_id=str(customer.id))
+            return CollectionResult(True, {capacity.id: capacity.state for capacity in upserted})
+
+        except StageTimeoutError as e:
+            # Pages written before the timeout are kept; the customer is retried on its next due time
+            self.cycle_report.late(customer.id, e.stage)
+            logger.error(
+                "stage_timeout",
+                customer_id=str(customer.id),
+                customer_name=customer.name,
+                stage=e.stage,
+                error=str(e),
+            )
+            await self.record_failure(customer.id, str(e))
+            return CollectionResult(False)
 
         except ClientAuthenticationError as e:
             error_type = "authentication_failed"
@@ -184,10 +418,13 @@ class CapacityCollector:
                 client_id=customer.client_id,
                 error=str(e),
             )
-            await self.update_customer_health(db, customer.id, success=False, error_message=error_message)
+            self.invalidate_credentials(customer)
+            await self.record_failure(customer.id, error_message)
+            return CollectionResult(False)
             
         except httpx.HTTPStatusError as e:
             if e.response.status_code in (401, 403):
+                self.invalidate_credentials(customer)
                 error_type = "authorization_failed"
                 error_message = f"Azure API authorization failed (HTTP {e.response.status_code}): insufficient Service Principal permissions"
             else:
@@ -201,7 +438,8 @@ class CapacityCollector:
                 status_code=e.response.status_code,
                 error=str(e),
             )
-            await self.update_customer_health(db, customer.id, success=False, error_message=error_message)
+            await self.record_failure(customer.id, error_message)
+            return CollectionResult(False)
             
         except Exception as e:
             error_type = "collection_failed"
@@ -212,52 +450,136 @@ class CapacityCollector:
                 customer_name=customer.name,
                 error=str(e),
             )
-            await self.update_customer_health(db, customer.id, success=False, error_message=error_message)
+            await self.record_failure(customer.id, error_message)
+            return CollectionResult(False)
 
-    async def run_collection(self, db: AsyncSession):
-        lease_id = None
-        
-        try:
-            lease_id = await self.acquire_lock()
-            
-            if lease_id is None and self.blob_client is not None:
-                logger.info("collection_skipped", reason="another_instance_holds_lock")
-                return
-            
-            logger.info("collection_cycle_start")
+    async def collect_with_limit(self, customer) -> CollectionResult | None:
+        queued = time.perf_counter()
+        async with self.customer_semaphore:
+            started = time.perf_counter()
+            self.cycle_report.slot_wait_max_seconds = max(self.cycle_report.slot_wait_max_seconds, started - queued)
+            # A shard lost while this customer waited for a slot now belongs to another replica
+            if self.shard_leases and not self.shard_leases.owns_customer(customer.id):
+                logger.info("customer_skipped", customer_id=str(customer.id), reason="shard_lease_lost")
+                self.cycle_report.skip(customer.id, "shard_lease_lost")
+                return None
+
+            # The budget starts once a slot is free, so a backlog delays customers instead of failing them
+            budget = settings.collector_customer_budget_seconds
+            deadline = asyncio.get_running_loop().time() + budget
+            deadline_token = collection_deadline.set(deadline)
+            try:
+                with customers_in_flight.track_inprogress():
+                    # Stages stop at the deadline themselves; this cancels work stuck between stages
+                    async with asyncio.timeout_at(deadline + STRAGGLER_GRACE_SECONDS):
+                        result = await self.collect_for_customer(customer)
+                outcome = "success" if result.success else "failure"
+            except TimeoutError:
+                error_message = f"Collection did not finish within its {budget}s budget and was cancelled"
+                logger.error("collection_budget_exceeded", customer_id=str(customer.id), budget_seconds=budget)
+                self.cycle_report.late(customer.id, "budget")
+                await self.record_failure(customer.id, error_message)
+                result = CollectionResult(False)
+                outcome = "timed_out"
+            finally:
+                collection_deadline.reset(deadline_token)
+
+            collection_seconds.labels(outcome=outcome).observe(time.perf_counter() - started)
+            if result.success:
+                self.cycle_report.collected += 1
+            else:
+                self.cycle_report.failed += 1
+            return result
+
+    async def load_customers(self) -> list[Customer]:
+        async with self.customer_session() as db:
             customers = await list_customers(db, active_only=True)
-            logger.info("active_customers", count=len(customers))
+        if self.shard_leases:
+            customers = [c for c in customers if self.shard_leases.owns_customer(c.id)]
+        return customers
 
-            semaphore = asyncio.Semaphore(settings.collector_max_concurrency)
-            
-            async def collect_with_limit(customer):
-                async with semaphore:
-                    await self.collect_for_customer(db, customer)
-            
-            await asyncio.gather(
-                *[collect_with_limit(customer) for customer in customers],
-                return_exceptions=True
-            )
+    async def run_scheduled(self, scheduler: CollectionScheduler):
+        wakeup = asyncio.Event()
+        running: set[asyncio.Task] = set()
+        refresh_at = scheduler.clock()
 
-            logger.info("collection_cycle_complete", customers_processed=len(customers))
-            
+        async def collect_and_reschedule(customer):
+            result = CollectionResult(False)
+            try:
+                result = await self.collect_with_limit(customer)
+            finally:
+                scheduler.complete(customer.id, result)
+                wakeup.set()
+
+        try:
+            while True:
+                now = scheduler.clock()
+                if now >= refresh_at:
+                    # New customers, deactivations and shard moves are picked up between due times
+                    try:
+                        customers = await self.load_customers()
+                    except Exception as e:
+                        logger.error("collection_schedule_refresh_failed", error=str(e))
+                    else:
+                        scheduler.sync(customers, now)
+                        # Stragglers were already handed to scheduler.complete, so they are due again next interval
+                        logger.info("collection_cycle_report", running=len(running), **self.cycle_report.summary())
+                        self.cycle_report = CycleReport()
+                        logger.info(
+                            "collection_schedule_refreshed",
+                            customers=len(scheduler),
+                            running=len(running),
+                            shards_owned=len(self.shard_leases.owned) if self.shard_leases else None,
+                            secret_cache=self.secret_cache.snapshot(),
+                            token_cache=self.azure_client.token_cache.snapshot(),
+                            arm_transport=self.azure_client.transport.snapshot(),
+                        )
+                    refresh_at = now + settings.collector_schedule_refresh_seconds
+
+                for customer in scheduler.pop_due(now):
+                    task = asyncio.create_task(collect_and_reschedule(customer))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+
+                next_due = scheduler.next_due()
+                wake_at = refresh_at if next_due is None else min(refresh_at, next_due)
+                wakeup.clear()
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout=max(wake_at - scheduler.clock(), 0))
+                except asyncio.TimeoutError:
+                    pass
         finally:
-            if lease_id:
-                await self.release_lock(lease_id)
+            for task in running:
+                task.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+
+
+def create_scheduler(interval_minutes: int) -> CollectionScheduler:
+    return CollectionScheduler(
+        default_interval=interval_minutes * 60,
+        fast_interval=settings.collector_fast_interval_minutes * 60,
+        max_backoff=settings.collector_max_backoff_minutes * 60,
+        jitter=settings.collector_jitter_ratio,
+    )
 
 
 async def run_collector_loop(interval_minutes: int):
     collector = CapacityCollector()
     await collector.initialize()
 
-    try:
-        while True:
-            # Deferred import to avoid circular dependency with db module at startup
-            from app.db.session import AsyncSessionLocal
+    lease_task = None
+    if collector.shard_leases:
+        # Claim shards before the first cycle; the heartbeat then renews and rebalances in the background
+        await collector.shard_leases.heartbeat()
+        lease_task = asyncio.create_task(collector.shard_leases.run())
 
-            async with AsyncSessionLocal() as db:
-                await collector.run_collection(db)
-            
-            await asyncio.sleep(interval_minutes * 60)
+    try:
+        await collector.run_scheduled(create_scheduler(interval_minutes))
     finally:
+        if lease_task:
+            lease_task.cancel()
+            try:
+                await lease_task
+            except asyncio.CancelledError:
+                pass
         await collector.close()
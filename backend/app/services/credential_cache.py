@@ -0,0 +1,147 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+import structlog
+
+logger = structlog.get_logger()
+
+Loader = Callable[[], Awaitable[tuple[Any, float]]]
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    expires_at: float
+    refresh_at: float
+    loader: Loader | None
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    refreshes: int = 0
+    refresh_failures: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+
+class CredentialCache:
+    def __init__(
+        self,
+        name: str,
+        max_entries: int = 1024,
+        refresh_margin: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.max_entries = max_entries
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.stats = CacheStats()
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._locks: dict[Hashable, asyncio.Lock] = {}
+        self._refresh_tasks: dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: Hashable, loader: Loader) -> Any:
+        entry = self._entries.get(key)
+        now = self.clock()
+
+        if entry and now < entry.expires_at:
+            self.stats.hits += 1
+            self._entries.move_to_end(key)
+            if entry.loader:
+                entry.loader = loader
+            # Hits inside the refresh margin keep serving the cached value while one reload runs
+            if now >= entry.refresh_at and key not in self._refresh_tasks:
+                self._schedule_refresh(key)
+            return entry.value
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another caller may have loaded the key while this one waited on the lock
+            entry = self._entries.get(key)
+            if entry and self.clock() < entry.expires_at:
+                self.stats.hits += 1
+                return entry.value
+
+            self.stats.misses += 1
+            value, ttl = await loader()
+            self._store(key, value, ttl, loader)
+            return value
+
+    def invalidate(self, key: Hashable):
+        task = self._refresh_tasks.pop(key, None)
+        if task:
+            task.cancel()
+        if self._entries.pop(key, None) is not None:
+            self.stats.invalidations += 1
+
+    async def close(self):
+        tasks = list(self._refresh_tasks.values())
+        self._refresh_tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._entries.clear()
+
+    def snapshot(self) -> dict[str, int]:
+        return {"entries": len(self._entries), **self.stats.__dict__}
+
+    def _store(self, key: Hashable, value: Any, ttl: float, loader: Loader):
+        now = self.clock()
+        ttl = max(ttl, 0.0)
+        # Short-lived values refresh at the halfway point rather than immediately
+        margin = min(self.refresh_margin, ttl / 2)
+        self._entries[key] = CacheEntry(
+            value=value,
+            expires_at=now + ttl,
+            refresh_at=now + ttl - margin,
+            # Without a refresh margin nothing reloads in the background, so the loader and
+            # whatever it closes over (a request session, a plaintext key) is not retained
+            loader=loader if self.refresh_margin > 0 else None,
+        )
+        self._entries.move_to_end(key)
+
+        if len(self._entries) > self.max_entries:
+            for expired_key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+                self._entries.pop(expired_key)
+                self._locks.pop(expired_key, None)
+                self.stats.evictions += 1
+
+        while len(self._entries) > self.max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._locks.pop(evicted_key, None)
+            self.stats.evictions += 1
+
+    def _schedule_refresh(self, key: Hashable):
+        task = asyncio.create_task(self._refresh(key))
+        self._refresh_tasks[key] = task
+        task.add_done_callback(lambda done: self._refresh_done(key, done))
+
+    def _refresh_done(self, key: Hashable, task: asyncio.Task):
+        if self._refresh_tasks.get(key) is task:
+            del self._refresh_tasks[key]
+
+    async def _refresh(self, key: Hashable):
+        entry = self._entries.get(key)
+        if entry is None or entry.loader is None:
+            return
+        try:
+            value, ttl = await entry.loader()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The current value stays usable until it actually expires
+            self.stats.refresh_failures += 1
+            logger.warning("credential_cache_refresh_failed", cache=self.name, error=str(e))
+            return
+
+        if key in self._entries:
+            self.stats.refreshes += 1
+            self._store(key, value, ttl, entry.loader)
@@ -1,9 +1,45 @@
+import hashlib
 import secrets
+from typing import Literal, NamedTuple
 from uuid import UUID
-from sqlalchemy import select
+from sqlalchemy import Select, func, literal, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
 from app.models.customer import Customer
 from app.schemas.customer import CustomerCreate
+from app.services.credential_cache import CredentialCache
+from app.services.pagination import keyset_query
+from app.services.response_cache import HEALTH_SUMMARY_TAG, ingest_key_tag, response_cache
+
+
+HealthStatus = Literal["healthy", "degraded", "critical"]
+UNHEALTHY_STATUSES = ("degraded", "critical")
+CUSTOMER_LIST_COLUMNS = (
+    Customer.id,
+    Customer.name,
+    Customer.is_active,
+    Customer.health_status,
+    Customer.consecutive_failures,
+    Customer.last_successful_collection,
+    Customer.created_at,
+)
+
+
+class IngestIdentity(NamedTuple):
+    id: UUID
+    is_active: bool
+
+
+# Keyed by SHA-256 of the ingest key; no refresh margin so entries never hold the plaintext key
+ingest_key_cache = CredentialCache(
+    "ingest_key",
+    max_entries=settings.ingest_key_cache_max_entries,
+    refresh_margin=0,
+)
+
+
+def hash_ingest_key(ingest_key: str) -> bytes:
+    return hashlib.sha256(ingest_key.encode()).digest()
 
 
 async def create_customer(db: AsyncSession, customer_data: CustomerCreate) -> Customer:
@@ -22,6 +58,7 @@ async def create_customer(db: AsyncSession, customer_data: CustomerCreate) -> Cu
     db.add(customer)
     await db.commit()
     await db.refresh(customer)
+    await response_cache.invalidate(HEALTH_SUMMARY_TAG)
     return customer
 
 
@@ -35,6 +72,45 @@ async def get_customer_by_ingest_key(db: AsyncSession, ingest_key: str) -> Custo
     return customer_query.scalars().first()
 
 
+async def authenticate_ingest_key(db: AsyncSession, ingest_key: str) -> IngestIdentity | None:
+    key_hash = hash_ingest_key(ingest_key)
+    tag = ingest_key_tag(key_hash)
+
+    async def load_identity():
+        # Read before the customer, so a revocation committed after this lookup always changes the version
+        version = await response_cache.shared_version(tag)
+        customer = await get_customer_by_ingest_key(db, ingest_key)
+        # Unknown keys are cached briefly too, so repeated bad keys do not each hit the database
+        if customer is None:
+            return (None, version), settings.ingest_key_negative_ttl_seconds
+        return (IngestIdentity(customer.id, customer.is_active), version), settings.ingest_key_cache_ttl_seconds
+
+    identity, version = await ingest_key_cache.get(key_hash, load_identity)
+    # With a shared (Redis) backend, a rotation or deactivation on any replica bumps the key's tag, so
+    # every replica drops its cached identity on the next request instead of at the TTL
+    if response_cache.shared and await response_cache.shared_version(tag) != version:
+        ingest_key_cache.invalidate(key_hash)
+        identity, version = await ingest_key_cache.get(key_hash, load_identity)
+    return identity
+
+
+async def revoke_ingest_key(ingest_key: str):
+    key_hash = hash_ingest_key(ingest_key)
+    ingest_key_cache.invalidate(key_hash)
+    await response_cache.invalidate(ingest_key_tag(key_hash))
+
+
+async def rotate_ingest_key(db: AsyncSession, customer_id: UUID) -> Customer | None:
+    customer = await get_customer(db, customer_id)
+    if customer:
+        previous_key = customer.ingest_key
+        customer.ingest_key = secrets.token_urlsafe(48)
+        await db.commit()
+        await db.refresh(customer)
+        await revoke_ingest_key(previous_key)
+    return customer
+
+
 async def list_customers(db: AsyncSession, active_only: bool = False) -> list[Customer]:
     query = select(Customer)
     if active_only:
@@ -43,10 +119,85 @@ async def list_customers(db: AsyncSession, active_only: bool = False) -> list[Cu
     return list(customers_query.scalars().all())
 
 
+def health_status_filter(statuses: list[str]):
+    # Inlined constants rather than bind parameters, so the planner can prove the
+    # ix_customers_unhealthy predicate even when asyncpg reuses a generic plan
+    return Customer.health_status.in_([literal(status, literal_execute=True) for status in statuses])
+
+
+def customer_page_statement(
+    active_only: bool = False,
+    health_status: list[str] | None = None,
+    search: str | None = None,
+    cursor: str | None = None,
+    limit: int | None = None,
+) -> Select:
+    query = select(*CUSTOMER_LIST_COLUMNS)
+    if active_only:
+        query = query.where(Customer.is_active == True)
+    if health_status:
+        query = query.where(health_status_filter(health_status))
+    if search:
+        query = query.where(Customer.name.icontains(search, autoescape=True))
+    return keyset_query(query, Customer.created_at, Customer.id, cursor, limit, id_type=UUID)
+
+
+async def list_customer_page(
+    db: AsyncSession,
+    active_only: bool = False,
+    health_status: list[str] | None = None,
+    search: str | None = None,
+    cursor: str | None = None,
+    limit: int | None = None,
+) -> list:
+    page_query = await db.execute(customer_page_statement(active_only, health_status, search, cursor, limit))
+    return list(page_query.all())
+
+
+async def get_health_summary(db: AsyncSession) -> dict:
+    counts_query = await db.execute(
+        select(Customer.health_status, func.count())
+        .where(Customer.is_active == True)
+        .group_by(Customer.health_status)
+    )
+    counts = dict(counts_query.all())
+
+    unhealthy_query = await db.execute(
+        select(
+            Customer.id,
+            Customer.name,
+            Customer.health_status,
+            Customer.consecutive_failures,
+            Customer.last_collection_error,
+        )
+        .where(Customer.is_active == True, health_status_filter(list(UNHEALTHY_STATUSES)))
+        .order_by(Customer.created_at.desc(), Customer.id.desc())
+    )
+
+    return {
+        "total_customers": sum(counts.values()),
+        "healthy": counts.get("healthy", 0),
+        "degraded": counts.get("degraded", 0),
+        "critical": counts.get("critical", 0),
+        "customers_by_status": [
+            {
+                "customer_id": str(customer.id),
+                "customer_name": customer.name,
+                "health_status": customer.health_status,
+                "consecutive_failures": customer.consecutive_failures,
+                "last_error": customer.last_collection_error,
+            }
+            for customer in unhealthy_query.all()
+        ],
+    }
+
+
 async def deactivate_customer(db: AsyncSession, customer_id: UUID) -> Customer | None:
     customer = await get_customer(db, customer_id)
     if customer:
         customer.is_active = False
         await db.commit()
         await db.refresh(customer)
+        await revoke_ingest_key(customer.ingest_key)
+        await response_cache.invalidate(HEALTH_SUMMARY_TAG)
     return customer
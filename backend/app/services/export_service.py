@@ -0,0 +1,270 @@
+from datetime import datetime
+from typing import AsyncIterator, Literal, NamedTuple
+from uuid import UUID
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from app.services.id_horizon import settled_max_id
+
+ColumnarFormat = Literal["parquet", "arrow"]
+
+COLUMNAR_MEDIA_TYPES = {
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+COLUMNAR_EXTENSIONS = {
+    "parquet": "parquet",
+    "arrow": "arrows",
+}
+
+UTC_TIMESTAMP = pa.timestamp("us", tz="UTC")
+
+
+class ExportDataset(NamedTuple):
+    table: str
+    source: str
+    columns: dict[str, str]
+    schema: pa.Schema
+    customer_column: str
+    time_column: str | None = None
+    id_column: str | None = None
+
+
+# UUIDs are cast to text in SQL so asyncpg hands back values pyarrow can take as-is
+EXPORT_DATASETS = {
+    "metrics": ExportDataset(
+        table="capacity_metrics",
+        source=(
+            "capacity_metrics m JOIN capacities c ON c.id = m.capacity_id "
+            "JOIN metric_definitions d ON d.id = m.metric_id"
+        ),
+        columns={
+            "id": "m.id",
+            "customer_id": "c.customer_id::text",
+            "capacity_id": "m.capacity_id::text",
+            "collected_at": "m.collected_at",
+            "metric_name": "d.name",
+            "metric_value": "m.metric_value",
+            "aggregation_type": "d.aggregation_type",
+        },
+        schema=pa.schema(
+            [
+                ("id", pa.int64()),
+                ("customer_id", pa.string()),
+                ("capacity_id", pa.string()),
+                ("collected_at", UTC_TIMESTAMP),
+                ("metric_name", pa.string()),
+                ("metric_value", pa.float64()),
+                ("aggregation_type", pa.string()),
+            ]
+        ),
+        customer_column="c.customer_id",
+        time_column="m.collected_at",
+        id_column="m.id",
+    ),
+    "snapshots": ExportDataset(
+        table="capacity_snapshots",
+        source="capacity_snapshots s JOIN capacities c ON c.id = s.capacity_id",
+        columns={
+            "id": "s.id",
+            "customer_id": "c.customer_id::text",
+            "capacity_id": "s.capacity_id::text",
+            "collected_at": "s.collected_at",
+            "state": "s.state",
+            "sku_name": "s.sku_name",
+        },
+        schema=pa.schema(
+            [
+                ("id", pa.int64()),
+                ("customer_id", pa.string()),
+                ("capacity_id", pa.string()),
+                ("collected_at", UTC_TIMESTAMP),
+                ("state", pa.string()),
+                ("sku_name", pa.string()),
+            ]
+        ),
+        customer_column="c.customer_id",
+        time_column="s.collected_at",
+        id_column="s.id",
+    ),
+    "capacities": ExportDataset(
+        table="capacities",
+        source="capacities c",
+        columns={
+            "id": "c.id::text",
+            "customer_id": "c.customer_id::text",
+            "azure_resource_id": "c.azure_resource_id",
+            "display_name": "c.display_name",
+            "sku_name": "c.sku_name",
+            "sku_tier": "c.sku_tier",
+            "location": "c.location",
+            "state": "c.state",
+            "last_synced_at": "c.last_synced_at",
+        },
+        schema=pa.schema(
+            [
+                ("id", pa.string()),
+                ("customer_id", pa.string()),
+                ("azure_resource_id", pa.string()),
+                ("display_name", pa.string()),
+                ("sku_name", pa.string()),
+                ("sku_tier", pa.string()),
+                ("location", pa.string()),
+                ("state", pa.string()),
+                ("last_synced_at", UTC_TIMESTAMP),
+            ]
+        ),
+        customer_column="c.customer_id",
+    ),
+}
+
+
+class ExportFilterError(ValueError):
+    pass
+
+
+class ExportNotReadyError(Exception):
+    pass
+
+
+class ChunkSink:
+    # Write-only file object for pyarrow writers; tell() stays absolute so Parquet footer offsets are valid
+    def __init__(self):
+        self.chunks: list[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self.chunks.append(chunk)
+        self.position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def export_query(
+    dataset: ExportDataset,
+    customer_id: UUID | None,
+    start: datetime | None,
+    end: datetime | None,
+    since_id: int | None,
+    through_id: int | None,
+) -> tuple[str, list]:
+    if dataset.time_column is None and (start or end):
+        raise ExportFilterError("This dataset does not support start/end filters")
+    if dataset.id_column is None and since_id is not None:
+        raise ExportFilterError("This dataset does not support since_id")
+
+    conditions = []
+    args = []
+
+    def add(condition: str, value):
+        args.append(value)
+        conditions.append(condition.format(f"${len(args)}"))
+
+    if customer_id:
+        add(f"{dataset.customer_column} = {{}}", customer_id)
+    if start:
+        add(f"{dataset.time_column} >= {{}}", start)
+    if end:
+        add(f"{dataset.time_column} <= {{}}", end)
+    if since_id is not None:
+        add(f"{dataset.id_column} > {{}}", since_id)
+    if through_id is not None:
+        add(f"{dataset.id_column} <= {{}}", through_id)
+
+    select_list = ", ".join(f"{expression} AS {name}" for name, expression in dataset.columns.items())
+    sql = f"SELECT {select_list} FROM {dataset.source}"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    return sql, args
+
+
+def records_to_batch(records: list, schema: pa.Schema) -> pa.RecordBatch:
+    return pa.RecordBatch.from_arrays(
+        [
+            pa.array([record[index] for record in records], type=field.type)
+            for index, field in enumerate(schema)
+        ],
+        schema=schema,
+    )
+
+
+async def get_export_through_id(db: AsyncSession, dataset: ExportDataset) -> int | None:
+    if dataset.id_column is None:
+        return None
+    # A later since_id call starts above this id, so it must not pass rows an open writer can still commit
+    through_id = await settled_max_id(db, dataset.table)
+    if through_id is None:
+        raise ExportNotReadyError(f"Writes to {dataset.table} are still in flight; retry shortly")
+    return through_id
+
+
+async def stream_record_batches(
+    db: AsyncSession,
+    sql: str,
+    args: list,
+    schema: pa.Schema,
+    batch_rows: int,
+) -> AsyncIterator[pa.RecordBatch]:
+    # asyncpg cursors only live inside a transaction; this statement opens the session's one
+    await db.execute(text("SET TRANSACTION READ ONLY"))
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    # Records go straight from the server-side cursor into Arrow columns, no ORM objects in between
+    cursor = await raw_connection.driver_connection.cursor(sql, *args)
+    while True:
+        records = await cursor.fetch(batch_rows)
+        if not records:
+            break
+        yield records_to_batch(records, schema)
+
+
+async def write_columnar(
+    batches: AsyncIterator[pa.RecordBatch], schema: pa.Schema, export_format: str
+) -> AsyncIterator[bytes]:
+    sink = ChunkSink()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    async for batch in batches:
+        # Each batch becomes its own row group or IPC message and is sent before the next fetch
+        writer.write_batch(batch)
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
+
+
+async def stream_columnar_export(
+    session_factory: async_sessionmaker[AsyncSession],
+    dataset: ExportDataset,
+    sql: str,
+    args: list,
+    export_format: str,
+    batch_rows: int,
+) -> AsyncIterator[bytes]:
+    async with session_factory() as db:
+        batches = stream_record_batches(db, sql, args, dataset.schema, batch_rows)
+        async for chunk in write_columnar(batches, dataset.schema, export_format):
+            yield chunk
@@ -0,0 +1,46 @@
+import asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+import structlog
+
+logger = structlog.get_logger()
+
+# Ids are drawn when a row is inserted but become visible at commit, so a writer still in flight can
+# commit ids below the visible maximum. Every writer holds a lock on its own transaction id, and the locks
+# are read after the statement's snapshot is taken, so any writer that was open at the snapshot is listed
+MAX_ID_AND_WRITERS_SQL = """
+    SELECT
+        (SELECT coalesce(max(id), 0) FROM {table}),
+        array(
+            SELECT transactionid::text::bigint FROM pg_locks
+            WHERE locktype = 'transactionid' AND mode = 'ExclusiveLock' AND pid <> pg_backend_pid()
+        )
+"""
+RUNNING_WRITERS_SQL = """
+    SELECT array(
+        SELECT transactionid::text::bigint FROM pg_locks
+        WHERE locktype = 'transactionid' AND mode = 'ExclusiveLock'
+            AND transactionid::text::bigint = ANY(CAST(:xids AS bigint[]))
+    )
+"""
+POLL_SECONDS = 0.05
+
+
+# None when the writers do not finish within WRITE_SETTLE_TIMEOUT_SECONDS, such as an idle open transaction
+async def settled_max_id(db: AsyncSession, table: str) -> int | None:
+    max_id_query = await db.execute(text(MAX_ID_AND_WRITERS_SQL.format(table=table)))
+    max_id, writers = max_id_query.one()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.write_settle_timeout_seconds
+    # Every id up to max_id was drawn before this snapshot, so once the writers open at that point have
+    # ended, nothing can appear below it any more
+    while writers:
+        if loop.time() >= deadline:
+            logger.warning("id_horizon_unsettled", table=table, max_id=max_id, open_transactions=writers)
+            return None
+        await asyncio.sleep(POLL_SECONDS)
+        running_query = await db.execute(text(RUNNING_WRITERS_SQL), {"xids": writers})
+        writers = running_query.scalar()
+    return max_id
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable
+from asyncpg.exceptions import DataError, IntegrityConstraintViolationError
+from sqlalchemy import exc
+from app.services.metric_service import MetricRecord, bulk_insert_metrics, invalidate_cached_metrics
+from app.services.telemetry import ingest_flush_seconds, metric_rows_written
+import structlog
+
+logger = structlog.get_logger()
+
+
+
+def is_payload_error(error: Exception) -> bool:
+    # COPY raises asyncpg's own classes; the metric definition insert raises them wrapped by SQLAlchemy
+    if isinstance(error, exc.DBAPIError):
+        error = error.orig.__cause__ or error.orig
+    return isinstance(error, (IntegrityConstraintViolationError, DataError))
+
+
+class IngestQueueFullError(Exception):
+    pass
+
+
+@dataclass
+class IngestQueueStats:
+    enqueued_rows: int = 0
+    rejected_rows: int = 0
+    flushed_rows: int = 0
+    dropped_rows: int = 0
+    flushes: int = 0
+    flush_failures: int = 0
+    last_flush_seconds: float = 0.0
+    max_flush_seconds: float = 0.0
+
+
+class IngestQueue:
+    def __init__(
+        self,
+        session_factory: Callable | None = None,
+        max_rows: int = 200_000,
+        flush_rows: int = 5000,
+        flush_interval: float = 1.0,
+    ):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.stats = IngestQueueStats()
+        self._pending: deque[list[MetricRecord]] = deque()
+        self._pending_rows = 0
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._closing = False
+
+    @property
+    def depth(self) -> int:
+        return self._pending_rows
+
+    def submit(self, records: list[MetricRecord]) -> int:
+        if self._closing:
+            raise IngestQueueFullError("Ingest queue is shutting down")
+        if self._pending_rows + len(records) > self.max_rows:
+            self.stats.rejected_rows += len(records)
+            raise IngestQueueFullError(f"Ingest queue holds {self._pending_rows} rows")
+
+        self._pending.append(records)
+        self._pending_rows += len(records)
+        self.stats.enqueued_rows += len(records)
+        if self._pending_rows >= self.flush_rows:
+            self._wakeup.set()
+        return len(records)
+
+    def snapshot(self) -> dict:
+        return {"depth": self._pending_rows, "max_rows": self.max_rows, **self.stats.__dict__}
+
+    async def run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def close(self):
+        self._closing = True
+        self._wakeup.set()
+        # Whatever is still queued at shutdown gets one last attempt before the process exits
+        await self.flush()
+        if self._pending_rows:
+            logger.error("ingest_queue_abandoned", rows=self._pending_rows)
+
+    async def flush(self) -> int:
+        flushed = 0
+        async with self._flush_lock:
+            while self._pending:
+                payloads = self._take()
+                try:
+                    flushed += await self._write(payloads)
+                except Exception as e:
+                    # Rows stay queued in order; once the queue fills, ingest answers 429 until the database is back
+                    self._pending.extendleft(reversed(payloads))
+                    self._pending_rows += sum(len(records) for records in payloads)
+                    self.stats.flush_failures += 1
+                    logger.error("ingest_flush_failed", error=str(e), depth=self._pending_rows)
+                    break
+        return flushed
+
+    def _take(self) -> list[list[MetricRecord]]:
+        payloads = []
+        rows = 0
+        while self._pending and rows < self.flush_rows:
+            records = self._pending.popleft()
+            payloads.append(records)
+            rows += len(records)
+        self._pending_rows -= rows
+        return payloads
+
+    async def _write(self, payloads: list[list[MetricRecord]]) -> int:
+        started = time.perf_counter()
+        try:
+            written = await self._copy([record for records in payloads for record in records])
+        except Exception as e:
+            # A capacity deleted after its payload was accepted, or a value the column rejects, would fail
+            # every retry of the whole batch, so fall back to one COPY per payload and drop only the bad ones
+            if not is_payload_error(e):
+                raise
+            written = 0
+            for records in payloads:
+                try:
+                    written += await self._copy(records)
+                except Exception as e:
+                    if not is_payload_error(e):
+                        raise
+                    self.stats.dropped_rows += len(records)
+                    logger.warning("ingest_payload_dropped", rows=len(records), error=str(e))
+
+        elapsed = time.perf_counter() - started
+        self.stats.flushes += 1
+        self.stats.flushed_rows += written
+        self.stats.last_flush_seconds = elapsed
+        self.stats.max_flush_seconds = max(self.stats.max_flush_seconds, elapsed)
+        ingest_flush_seconds.observe(elapsed)
+        metric_rows_written.labels(source="ingest").inc(written)
+        logger.info(
+            "ingest_flush_complete",
+            rows=written,
+            duration_ms=round(elapsed * 1000, 1),
+            depth=self._pending_rows,
+        )
+        return written
+
+    async def _copy(self, records: list[MetricRecord]) -> int:
+        session_factory = self.session_factory
+        if session_factory is None:
+            # Deferred import to avoid circular dependency with db module at startup
+            from app.db.session import AsyncSessionLocal
+
+            session_factory = AsyncSessionLocal
+
+        async with session_factory() as db:
+            written = await bulk_insert_metrics(db, records)
+            await db.commit()
+        await invalidate_cached_metrics(records)
+        return written
@@ -0,0 +1,350 @@
+import asyncio
+import hashlib
+import math
+import time
+from typing import Callable, Protocol
+from uuid import NAMESPACE_URL, UUID, uuid5
+from azure.core.exceptions import HttpResponseError, ResourceExistsError
+from azure.storage.blob.aio import BlobServiceClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+import structlog
+
+logger = structlog.get_logger()
+
+LEASE_PREFIX = "collector-"
+SHARD_PREFIX = "collector-shard-"
+MEMBER_PREFIX = "collector-member-"
+LEASE_BACKENDS = ("auto", "blob", "postgres", "none")
+# First key of the two-key advisory lock form, keeping collector locks apart from any other advisory locks
+ADVISORY_LOCK_NAMESPACE = 0x46434D
+APPLICATION_NAME_PREFIX = "fabricmon-collector:"
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    # Jump consistent hash: changing the shard count only moves the keys that have to move
+    result, candidate = -1, 0
+    while candidate < buckets:
+        result = candidate
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        candidate = int((result + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return result
+
+
+def shard_for(customer_id: UUID, shard_count: int) -> int:
+    return jump_hash(customer_id.int & 0xFFFFFFFFFFFFFFFF, shard_count)
+
+
+def shard_lease_name(shard: int) -> str:
+    return f"{SHARD_PREFIX}{shard:03d}"
+
+
+def member_lease_name(replica_id: str) -> str:
+    return f"{MEMBER_PREFIX}{replica_id}"
+
+
+def advisory_key(name: str) -> int:
+    return int.from_bytes(hashlib.sha256(name.encode()).digest()[:4], "big") & 0x7FFFFFFF
+
+
+def shard_preference(replica_id: str, shard: int) -> bytes:
+    # Rendezvous order, so replicas reaching for free shards at the same moment mostly pick different ones
+    return hashlib.sha256(f"{replica_id}:{shard}".encode()).digest()
+
+
+class LeaseBackend(Protocol):
+    async def acquire(self, name: str, owner: str, duration: int) -> bool: ...
+
+    async def renew(self, name: str, owner: str, duration: int) -> bool: ...
+
+    async def release(self, name: str, owner: str): ...
+
+    async def holders(self, prefix: str) -> dict[str, str]: ...
+
+    async def close(self): ...
+
+
+class BlobLeaseBackend:
+    def __init__(self, blob_client: BlobServiceClient, container: str = "locks"):
+        self.blob_client = blob_client
+        self.container_client = blob_client.get_container_client(container)
+        self._container_ready = False
+
+    @staticmethod
+    def lease_id(owner: str) -> str:
+        # Blob leases take caller-proposed GUIDs, so each replica's lease id is derived from its name
+        return str(uuid5(NAMESPACE_URL, owner))
+
+    async def acquire(self, name: str, owner: str, duration: int) -> bool:
+        if not self._container_ready:
+            try:
+                await self.container_client.create_container()
+                logger.info("lock_container_created")
+            except ResourceExistsError:
+                pass
+            self._container_ready = True
+
+        blob = self.container_client.get_blob_client(name)
+        try:
+            await blob.upload_blob(b"lease", overwrite=False)
+        except ResourceExistsError:
+            pass
+
+        lease = blob.get_blob_lease_client(self.lease_id(owner))
+        try:
+            await lease.acquire(lease_duration=duration)
+        except HttpResponseError as e:
+            if e.status_code == 409:
+                return False
+            raise
+        await blob.set_blob_metadata({"owner": owner}, lease=lease)
+        return True
+
+    async def renew(self, name: str, owner: str, duration: int) -> bool:
+        lease = self.container_client.get_blob_client(name).get_blob_lease_client(self.lease_id(owner))
+        try:
+            await lease.renew()
+            return True
+        except HttpResponseError as e:
+            logger.warning("lease_renew_failed", lease=name, error=str(e))
+            return False
+
+    async def release(self, name: str, owner: str):
+        lease = self.container_client.get_blob_client(name).get_blob_lease_client(self.lease_id(owner))
+        try:
+            await lease.release()
+        except HttpResponseError as e:
+            logger.warning("lease_release_failed", lease=name, error=str(e))
+
+    async def holders(self, prefix: str) -> dict[str, str]:
+        held = {}
+        async for blob in self.container_client.list_blobs(name_starts_with=prefix, include=["metadata"]):
+            if blob.lease.status == "locked":
+                held[blob.name] = (blob.metadata or {}).get("owner", "")
+        return held
+
+    async def close(self):
+        await self.blob_client.close()
+
+
+class PostgresAdvisoryLeaseBackend:
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self._connection: AsyncConnection | None = None
+        self._owner: str | None = None
+        self._held: set[int] = set()
+        self._names: dict[int, str] = {}
+
+    def _register(self, name: str) -> int:
+        key = advisory_key(name)
+        self._names[key] = name
+        return key
+
+    async def _execute(self, owner: str, sql: str, params: dict):
+        if self._connection is None:
+            # Advisory locks belong to the session, so all of them go through one dedicated connection
+            connection = await self.engine.connect()
+            await connection.execution_options(isolation_level="AUTOCOMMIT")
+            await connection.execute(
+                text("SELECT set_config('application_name', :name, false)"),
+                {"name": f"{APPLICATION_NAME_PREFIX}{owner}"},
+            )
+            self._connection = connection
+            self._owner = owner
+        try:
+            return await self._connection.execute(text(sql), params)
+        except Exception:
+            await self._disconnect()
+            raise
+
+    async def _disconnect(self):
+        connection, self._connection = self._connection, None
+        self._held.clear()
+        if connection is not None:
+            # Never hand a connection holding session locks back to the pool; dropping it frees them
+            try:
+                await connection.invalidate()
+                await connection.close()
+            except Exception as e:
+                logger.warning("lease_connection_close_failed", error=str(e))
+
+    async def acquire(self, name: str, owner: str, duration: int) -> bool:
+        key = self._register(name)
+        if key in self._held:
+            return True
+        locked_query = await self._execute(
+            owner,
+            "SELECT pg_try_advisory_lock(:namespace, :key)",
+            {"namespace": ADVISORY_LOCK_NAMESPACE, "key": key},
+        )
+        locked = locked_query.scalar()
+        if locked:
+            self._held.add(key)
+        return bool(locked)
+
+    async def renew(self, name: str, owner: str, duration: int) -> bool:
+        key = self._register(name)
+        if key not in self._held:
+            return False
+        # Session locks have no expiry; renewing proves the session that holds them is still alive
+        held_query = await self._execute(
+            owner,
+            "SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND pid = pg_backend_pid() "
+            "AND classid = :namespace AND objid = :key AND objsubid = 2 AND granted",
+            {"namespace": ADVISORY_LOCK_NAMESPACE, "key": key},
+        )
+        held = held_query.scalar()
+        if not held:
+            self._held.discard(key)
+        return bool(held)
+
+    async def release(self, name: str, owner: str):
+        key = self._register(name)
+        if key not in self._held:
+            return
+        self._held.discard(key)
+        await self._execute(
+            owner,
+            "SELECT pg_advisory_unlock(:namespace, :key)",
+            {"namespace": ADVISORY_LOCK_NAMESPACE, "key": key},
+        )
+
+    async def holders(self, prefix: str) -> dict[str, str]:
+        if self._connection is None:
+            return {}
+        result = await self._execute(
+            self._owner,
+            """
+            SELECT l.objid, a.application_name
+            FROM pg_locks l
+            JOIN pg_stat_activity a ON a.pid = l.pid
+            WHERE l.locktype = 'advisory' AND l.classid = :namespace
+                AND l.objsubid = 2 AND l.granted
+            """,
+            {"namespace": ADVISORY_LOCK_NAMESPACE},
+        )
+        held = {}
+        for key, application_name in result.all():
+            owner = (application_name or "").removeprefix(APPLICATION_NAME_PREFIX)
+            # Lock keys are hashes; names come from leases this replica has touched or from the
+            # holder's own member lease, and unknown shards are simply tried and refused
+            name = self._names.get(key)
+            if name is None and advisory_key(member_lease_name(owner)) == key:
+                name = member_lease_name(owner)
+            if name and name.startswith(prefix):
+                held[name] = owner
+        return held
+
+    async def close(self):
+        await self._disconnect()
+
+
+def create_lease_backend(kind: str, storage_connection_string: str | None) -> LeaseBackend | None:
+    if kind not in LEASE_BACKENDS:
+        raise ValueError(f"Unsupported lease backend '{kind}', expected one of {LEASE_BACKENDS}")
+    if kind == "none":
+        return None
+    if kind == "blob" or (kind == "auto" and storage_connection_string):
+        if not storage_connection_string:
+            raise ValueError("The blob lease backend needs AZURE_STORAGE_CONNECTION_STRING")
+        return BlobLeaseBackend(BlobServiceClient.from_connection_string(storage_connection_string))
+
+    # Deferred import to avoid circular dependency with db module at startup
+    from app.db.session import engine
+
+    return PostgresAdvisoryLeaseBackend(engine)
+
+
+class ShardLeaseManager:
+    def __init__(
+        self,
+        backend: LeaseBackend,
+        replica_id: str,
+        shard_count: int = 32,
+        lease_seconds: int = 60,
+        renew_seconds: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.replica_id = replica_id
+        self.shard_count = shard_count
+        self.lease_seconds = lease_seconds
+        self.renew_seconds = renew_seconds
+        self.clock = clock
+        self.owned: set[int] = set()
+        self._member_held = False
+        self._renewed_at: float | None = None
+
+    def owns_customer(self, customer_id: UUID) -> bool:
+        # Once renewals have failed for a full lease period another replica may already hold the shard
+        if self._renewed_at is None or self.clock() - self._renewed_at >= self.lease_seconds:
+            return False
+        return shard_for(customer_id, self.shard_count) in self.owned
+
+    async def rebalance(self):
+        renew_started = self.clock()
+        member = member_lease_name(self.replica_id)
+        if self._member_held:
+            self._member_held = await self.backend.renew(member, self.replica_id, self.lease_seconds)
+        if not self._member_held:
+            self._member_held = await self.backend.acquire(member, self.replica_id, self.lease_seconds)
+
+        for shard in sorted(self.owned):
+            if not await self.backend.renew(shard_lease_name(shard), self.replica_id, self.lease_seconds):
+                self.owned.discard(shard)
+                logger.warning("shard_lease_lost", replica_id=self.replica_id, shard=shard)
+        self._renewed_at = renew_started
+
+        holders = await self.backend.holders(LEASE_PREFIX)
+        members = {owner for name, owner in holders.items() if name.startswith(MEMBER_PREFIX)}
+        members.add(self.replica_id)
+        # Live replicas are the ones renewing a member lease; a dead replica drops out once its leases lapse
+        fair_share = math.ceil(self.shard_count / len(members))
+
+        by_preference = sorted(self.owned, key=lambda shard: shard_preference(self.replica_id, shard))
+        released = by_preference[fair_share:]
+        for shard in released:
+            await self.backend.release(shard_lease_name(shard), self.replica_id)
+            self.owned.discard(shard)
+
+        acquired = []
+        free = [
+            shard
+            for shard in range(self.shard_count)
+            if shard not in self.owned and shard_lease_name(shard) not in holders
+        ]
+        for shard in sorted(free, key=lambda shard: shard_preference(self.replica_id, shard)):
+            if len(self.owned) >= fair_share:
+                break
+            if await self.backend.acquire(shard_lease_name(shard), self.replica_id, self.lease_seconds):
+                self.owned.add(shard)
+                acquired.append(shard)
+
+        if acquired or released:
+            logger.info(
+                "shard_leases_rebalanced",
+                replica_id=self.replica_id,
+                replicas=len(members),
+                owned=len(self.owned),
+                acquired=acquired,
+                released=released,
+            )
+
+    async def heartbeat(self):
+        try:
+            await self.rebalance()
+        except Exception as e:
+            logger.warning("shard_rebalance_failed", replica_id=self.replica_id, error=str(e))
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.renew_seconds)
+            await self.heartbeat()
+
+    async def release_all(self):
+        for shard in sorted(self.owned):
+            await self.backend.release(shard_lease_name(shard), self.replica_id)
+        self.owned.clear()
+        if self._member_held:
+            await self.backend.release(member_lease_name(self.replica_id), self.replica_id)
+            self._member_held = False
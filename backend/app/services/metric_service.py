@@ -0,0 +1,275 @@
+import zlib
+from datetime import datetime, timezone
+from typing import AsyncIterator
+from uuid import UUID
+from asyncpg.exceptions import SequenceGeneratorLimitExceededError
+from sqlalchemy import and_, exc, or_, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.capacity import Capacity
+from app.models.metric import CapacityMetric, MetricDefinition
+from app.schemas.metric import BatchIngestPayload, IngestPayload
+from app.services.pagination import keyset_query
+from app.services.response_cache import capacity_metrics_tag, response_cache
+from app.services.telemetry import metric_definition_ids_used
+import structlog
+
+logger = structlog.get_logger()
+
+METRIC_COPY_COLUMNS = (
+    "capacity_id",
+    "collected_at",
+    "metric_id",
+    "metric_value",
+)
+
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+# metric_definitions.id is a smallint identity
+METRIC_DEFINITION_ID_MAX = 32767
+
+MetricRecord = tuple[UUID, UUID, datetime, str, float, str | None]
+MetricKey = tuple[str, str | None]
+
+# (name, aggregation_type) -> metric_definitions.id; definitions are never deleted, so entries stay valid
+metric_definition_ids: dict[MetricKey, int] = {}
+
+
+class BatchPayloadError(ValueError):
+    pass
+
+
+class BatchPayloadTooLargeError(BatchPayloadError):
+    pass
+
+
+class MetricDefinitionLimitError(ValueError):
+    pass
+
+
+def as_utc(value: datetime | None) -> datetime:
+    if value is None:
+        return datetime.now(timezone.utc)
+    # asyncpg encodes naive datetimes in the server's local zone, ingest timestamps are UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+async def read_body(chunks: AsyncIterator[bytes], content_length: str | None, max_bytes: int) -> bytes:
+    if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+        raise BatchPayloadTooLargeError(f"Body exceeds {max_bytes} bytes")
+
+    # Chunked uploads carry no length, so stop reading as soon as the limit is passed
+    body = bytearray()
+    async for chunk in chunks:
+        body.extend(chunk)
+        if len(body) > max_bytes:
+            raise BatchPayloadTooLargeError(f"Body exceeds {max_bytes} bytes")
+    return bytes(body)
+
+
+def decompress_body(body: bytes, content_encoding: str | None, max_bytes: int) -> bytes:
+    if len(body) > max_bytes:
+        raise BatchPayloadTooLargeError(f"Body exceeds {max_bytes} bytes")
+
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        raw = body
+    elif encoding == "gzip":
+        # Bounded inflate so a small compressed body cannot expand into an unbounded buffer
+        decompressor = zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+        try:
+            raw = decompressor.decompress(body, max_bytes + 1)
+        except zlib.error as e:
+            raise BatchPayloadError(f"Invalid gzip body: {e}") from e
+    else:
+        raise BatchPayloadError(f"Unsupported Content-Encoding '{content_encoding}'")
+
+    if len(raw) > max_bytes:
+        raise BatchPayloadTooLargeError(f"Decompressed body exceeds {max_bytes} bytes")
+    return raw
+
+
+def parse_batch_body(body: bytes, content_type: str | None) -> BatchIngestPayload:
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+
+    if media_type in NDJSON_CONTENT_TYPES:
+        capacities = [
+            IngestPayload.model_validate_json(line)
+            for line in body.splitlines()
+            if line.strip()
+        ]
+        return BatchIngestPayload(capacities=capacities)
+    if media_type == "application/json":
+        return BatchIngestPayload.model_validate_json(body)
+
+    raise BatchPayloadError(f"Unsupported Content-Type '{content_type}'")
+
+
+def build_metric_records(
+    customer_id: UUID, capacity_id: UUID, payload: IngestPayload
+) -> list[MetricRecord]:
+    collected_at = as_utc(payload.collected_at)
+    return [
+        (
+            customer_id,
+            capacity_id,
+            collected_at,
+            metric_data.name,
+            metric_data.value,
+            metric_data.aggregation,
+        )
+        for metric_data in payload.metrics
+    ]
+
+
+def definitions_matching(keys: list[MetricKey]):
+    return select(MetricDefinition.name, MetricDefinition.aggregation_type, MetricDefinition.id).where(
+        or_(
+            *(
+                and_(
+                    MetricDefinition.name == name,
+                    MetricDefinition.aggregation_type.is_not_distinct_from(aggregation),
+                )
+                for name, aggregation in keys
+            )
+        )
+    )
+
+
+def is_sequence_exhausted(error: exc.DBAPIError) -> bool:
+    return isinstance(error.orig.__cause__, SequenceGeneratorLimitExceededError)
+
+
+async def resolve_metric_definitions(
+    db: AsyncSession, keys: set[MetricKey], max_new: int | None = None
+) -> dict[MetricKey, int]:
+    missing = sorted(keys - metric_definition_ids.keys(), key=lambda key: (key[0], key[1] or ""))
+    if missing:
+        # Definitions commit on their own connection, so every id handed out is for a committed row and
+        # can be kept for the life of the process whatever happens to the caller's transaction
+        async with db.bind.begin() as connection:
+            existing_query = await connection.execute(definitions_matching(missing))
+            metric_definition_ids.update(
+                {(name, aggregation): id for name, aggregation, id in existing_query.all()}
+            )
+            new = [key for key in missing if key not in metric_definition_ids]
+            if new:
+                # Ids come from one smallint sequence shared by every customer, so a single request may
+                # only spend a bounded number of them
+                if max_new is not None and len(new) > max_new:
+                    raise MetricDefinitionLimitError(
+                        f"Request introduces {len(new)} new metric definitions, at most {max_new} are allowed"
+                    )
+                try:
+                    await connection.execute(
+                        pg_insert(MetricDefinition)
+                        .values([{"name": name, "aggregation_type": aggregation} for name, aggregation in new])
+                        .on_conflict_do_nothing(constraint="uq_metric_definition")
+                    )
+                except exc.DBAPIError as e:
+                    if not is_sequence_exhausted(e):
+                        raise
+                    logger.error("metric_definition_ids_exhausted", new_definitions=len(new))
+                    raise MetricDefinitionLimitError("No metric definition ids are left") from e
+                definitions_query = await connection.execute(definitions_matching(new))
+                created = {(name, aggregation): id for name, aggregation, id in definitions_query.all()}
+                metric_definition_ids.update(created)
+                record_definition_ids_used(max(created.values()))
+    return {key: metric_definition_ids[key] for key in keys}
+
+
+def record_definition_ids_used(max_id: int) -> None:
+    metric_definition_ids_used.set(max_id)
+    if max_id >= METRIC_DEFINITION_ID_MAX * settings.metric_definition_ids_warn_ratio:
+        logger.warning(
+            "metric_definition_ids_filling",
+            max_id=max_id,
+            id_limit=METRIC_DEFINITION_ID_MAX,
+        )
+
+
+async def bulk_insert_metrics(db: AsyncSession, records: list[MetricRecord]) -> int:
+    if not records:
+        return 0
+
+    metric_ids = await resolve_metric_definitions(db, {(record[3], record[5]) for record in records})
+    connection = await db.connection()
+    raw_connection = await connection.get_raw_connection()
+    if not raw_connection.driver_connection.is_in_transaction():
+        # The driver opens the transaction on the first statement it runs, and COPY bypasses it, so a
+        # leading COPY would autocommit and escape the caller's rollback
+        await connection.exec_driver_sql("SELECT 1")
+    # COPY runs on the session's connection so it shares the caller's transaction
+    await raw_connection.driver_connection.copy_records_to_table(
+        CapacityMetric.__tablename__,
+        records=[
+            (capacity_id, collected_at, metric_ids[(name, aggregation)], value)
+            for _, capacity_id, collected_at, name, value, aggregation in records
+        ],
+        columns=METRIC_COPY_COLUMNS,
+    )
+    return len(records)
+
+
+async def invalidate_cached_metrics(records: list[MetricRecord]):
+    # Call after the insert has committed, or a reader could cache the old rows under the new version
+    await response_cache.invalidate(*{capacity_metrics_tag(record[1]) for record in records})
+
+
+def capacity_metrics_statement(
+    customer_id: UUID,
+    capacity_id: UUID,
+    start: datetime | None,
+    end: datetime | None,
+    metric_name: str | None,
+    cursor: str | None = None,
+    limit: int | None = None,
+):
+    # The definition and capacity joins give back the columns the fact table no longer stores
+    query = (
+        select(
+            CapacityMetric.id,
+            Capacity.customer_id,
+            CapacityMetric.capacity_id,
+            CapacityMetric.collected_at,
+            MetricDefinition.name.label("metric_name"),
+            CapacityMetric.metric_value,
+            MetricDefinition.aggregation_type,
+        )
+        .join(Capacity, Capacity.id == CapacityMetric.capacity_id)
+        .join(MetricDefinition, MetricDefinition.id == CapacityMetric.metric_id)
+        .where(Capacity.customer_id == customer_id, CapacityMetric.capacity_id == capacity_id)
+    )
+
+    if start:
+        query = query.where(CapacityMetric.collected_at >= start)
+    if end:
+        query = query.where(CapacityMetric.collected_at <= end)
+    if metric_name:
+        query = query.where(CapacityMetric.metric_id.in_(metric_ids_named([metric_name])))
+
+    return keyset_query(query, CapacityMetric.collected_at, CapacityMetric.id, cursor, limit)
+
+
+def metric_ids_named(metric_names: list[str]):
+    # Never correlated, so callers that also join metric_definitions keep an index condition on metric_id
+    return select(MetricDefinition.id).where(MetricDefinition.name.in_(metric_names)).correlate(None)
+
+
+async def get_capacity_metrics(
+    db: AsyncSession,
+    customer_id: UUID,
+    capacity_id: UUID,
+    start: datetime | None,
+    end: datetime | None,
+    metric_name: str | None,
+    cursor: str | None = None,
+    limit: int = 1000,
+) -> list:
+    metrics_query = await db.execute(
+        capacity_metrics_statement(customer_id, capacity_id, start, end, metric_name, cursor, limit)
+    )
+    return list(metrics_query.all())
@@ -0,0 +1,166 @@
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, NamedTuple
+from uuid import UUID
+from app.models.capacity import Capacity
+from app.services.azure_client import AzureClient
+from app.services.metric_service import MetricRecord
+import structlog
+
+logger = structlog.get_logger()
+
+INTERVAL_MINUTES = {"PT1M": 1, "PT5M": 5, "PT15M": 15, "PT30M": 30, "PT1H": 60}
+
+
+class MetricBatch(NamedTuple):
+    capacity_ids: list[UUID]
+    records: list[MetricRecord]
+    synced_through: datetime
+
+
+def floor_to_interval(value: datetime, minutes: int) -> datetime:
+    value = value.replace(second=0, microsecond=0)
+    return value - timedelta(minutes=value.minute % minutes)
+
+
+def format_timestamp(value: datetime) -> str:
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def monitor_region(location: str | None) -> str | None:
+    # ARM reports locations as either "westeurope" or "West Europe"; regional hosts need the former
+    if not location:
+        return None
+    return location.replace(" ", "").lower()
+
+
+def parse_batch_values(
+    values: list[dict[str, Any]], aggregations: dict[str, str]
+) -> list[tuple[str, datetime, str, float, str]]:
+    points = []
+    for resource in values:
+        resource_id = resource.get("resourceid", "")
+        for metric in resource.get("value", []):
+            name = metric.get("name", {}).get("value")
+            aggregation = aggregations.get(name)
+            if not aggregation:
+                continue
+            field = aggregation[0].lower() + aggregation[1:]
+            for series in metric.get("timeseries", []):
+                for point in series.get("data", []):
+                    value = point.get(field)
+                    if value is None:
+                        continue
+                    timestamp = datetime.fromisoformat(point["timeStamp"].replace("Z", "+00:00"))
+                    points.append((resource_id.lower(), timestamp, name, float(value), aggregation))
+    return points
+
+
+class MonitorMetricPuller:
+    def __init__(
+        self,
+        azure_client: AzureClient,
+        interval: str = "PT5M",
+        lookback_minutes: int = 60,
+        batch_size: int = 50,
+        definitions_ttl: float = 86400.0,
+        latency_minutes: int = 5,
+    ):
+        self.azure_client = azure_client
+        self.interval = interval
+        self.interval_minutes = INTERVAL_MINUTES[interval]
+        self.lookback = timedelta(minutes=lookback_minutes)
+        self.latency = timedelta(minutes=latency_minutes)
+        self.batch_size = batch_size
+        self.definitions_ttl = definitions_ttl
+        self._definitions: dict[str, tuple[float, dict[str, str]]] = {}
+
+    async def get_definitions(self, arm_token: str, resource_id: str) -> dict[str, str]:
+        cached = self._definitions.get(resource_id)
+        if cached and time.monotonic() < cached[0]:
+            return cached[1]
+
+        definitions = await self.azure_client.get_metric_definitions(arm_token, resource_id)
+        aggregations = {
+            definition["name"]["value"]: definition.get("primaryAggregationType", "Average")
+            for definition in definitions
+            if definition.get("name", {}).get("value")
+        }
+        # Failed lookups return no definitions and are retried next cycle instead of cached
+        if aggregations:
+            self._definitions[resource_id] = (time.monotonic() + self.definitions_ttl, aggregations)
+        return aggregations
+
+    async def pull(
+        self,
+        arm_token: str,
+        monitor_token: str,
+        subscription_id: str,
+        capacities: list[Capacity],
+        now: datetime | None = None,
+    ) -> AsyncIterator[MetricBatch]:
+        # Azure Monitor publishes a bucket a few minutes after it closes, so the watermark stays that far
+        # behind the clock; a point missing at the watermark would otherwise never be fetched
+        end = floor_to_interval((now or datetime.now(timezone.utc)) - self.latency, self.interval_minutes)
+        earliest = end - self.lookback
+
+        groups: dict[str, list[Capacity]] = defaultdict(list)
+        for capacity in capacities:
+            region = monitor_region(capacity.location)
+            start = max(capacity.metrics_synced_through or earliest, earliest)
+            if region and start < end:
+                groups[region].append(capacity)
+
+        for region, region_capacities in groups.items():
+            for offset in range(0, len(region_capacities), self.batch_size):
+                batch = region_capacities[offset:offset + self.batch_size]
+                aggregations: dict[str, str] = {}
+                for capacity in batch:
+                    aggregations.update(await self.get_definitions(arm_token, capacity.azure_resource_id))
+                if not aggregations:
+                    continue
+
+                starts = {
+                    capacity.azure_resource_id.lower(): max(
+                        capacity.metrics_synced_through or earliest, earliest
+                    )
+                    for capacity in batch
+                }
+                values = await self.azure_client.get_metrics_batch(
+                    monitor_token,
+                    subscription_id,
+                    region,
+                    [capacity.azure_resource_id for capacity in batch],
+                    sorted(aggregations),
+                    sorted({aggregation.lower() for aggregation in aggregations.values()}),
+                    format_timestamp(min(starts.values())),
+                    format_timestamp(end),
+                    self.interval,
+                )
+                if not values:
+                    continue
+
+                by_resource = {capacity.azure_resource_id.lower(): capacity for capacity in batch}
+                records = [
+                    (
+                        by_resource[resource_id].customer_id,
+                        by_resource[resource_id].id,
+                        timestamp,
+                        name,
+                        value,
+                        aggregation,
+                    )
+                    for resource_id, timestamp, name, value, aggregation in parse_batch_values(
+                        values, aggregations
+                    )
+                    if resource_id in by_resource and starts[resource_id] <= timestamp < end
+                ]
+
+                logger.info(
+                    "monitor_metrics_batch",
+                    region=region,
+                    resource_count=len(batch),
+                    points=len(records),
+                )
+                yield MetricBatch([capacity.id for capacity in batch], records, end)
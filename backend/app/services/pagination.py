@@ -0,0 +1,47 @@
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import Select, tuple_
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+def encode_cursor(collected_at: datetime, row_id: int | UUID) -> str:
+    row_id = row_id if isinstance(row_id, int) else str(row_id)
+    payload = json.dumps({"t": collected_at.isoformat(), "id": row_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, id_type: type = int) -> tuple[datetime, int | UUID]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), id_type(payload["id"])
+    # A forged cursor can carry any JSON value; UUID() raises AttributeError on an int
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+
+
+def keyset_query(
+    query: Select, time_column, id_column, cursor: str | None, limit: int | None, id_type: type = int
+) -> Select:
+    # Newest first; (time, id) breaks ties between rows collected at the same instant
+    if cursor:
+        collected_at, row_id = decode_cursor(cursor, id_type)
+        query = query.where(tuple_(time_column, id_column) < tuple_(collected_at, row_id))
+    query = query.order_by(time_column.desc(), id_column.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+
+def split_page(rows: list, limit: int, time_attr: str = "collected_at") -> tuple[list, str | None]:
+    # Callers fetch limit + 1 rows; the extra row only signals that another page exists
+    if len(rows) <= limit:
+        return rows, None
+    page = rows[:limit]
+    last = page[-1]
+    return page, encode_cursor(getattr(last, time_attr), last.id)
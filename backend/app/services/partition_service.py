@@ -0,0 +1,174 @@
+import asyncio
+import re
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.customer import Customer
+import structlog
+
+logger = structlog.get_logger()
+
+PARENT_TABLE = "capacity_metrics"
+DEFAULT_PARTITION = "capacity_metrics_default"
+PARTITION_PERIODS = ("day", "week", "month")
+BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+MAINTENANCE_LOCK_KEY = "capacity_metrics_partitions"
+
+
+class Partition(NamedTuple):
+    name: str
+    start: datetime
+    end: datetime
+
+
+def period_start(value: datetime, period: str) -> datetime:
+    value = value.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == "day":
+        return value
+    if period == "week":
+        return value - timedelta(days=value.weekday())
+    if period == "month":
+        return value.replace(day=1)
+    raise ValueError(f"Unsupported partition period '{period}', expected one of {PARTITION_PERIODS}")
+
+
+def next_period_start(value: datetime, period: str) -> datetime:
+    start = period_start(value, period)
+    if period == "day":
+        return start + timedelta(days=1)
+    if period == "week":
+        return start + timedelta(weeks=1)
+    if start.month == 12:
+        return start.replace(year=start.year + 1, month=1)
+    return start.replace(month=start.month + 1)
+
+
+def partition_name(start: datetime) -> str:
+    return f"{PARENT_TABLE}_p{start:%Y%m%d}"
+
+
+def parse_partition_bound(bound: str) -> tuple[datetime, datetime] | None:
+    match = BOUND_PATTERN.search(bound)
+    if not match:
+        return None
+    return tuple(
+        datetime.fromisoformat(value).astimezone(timezone.utc) for value in match.groups()
+    )
+
+
+async def list_metric_partitions(db: AsyncSession) -> list[Partition]:
+    partitions_query = await db.execute(
+        text(
+            """
+            SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = :parent
+            """
+        ),
+        {"parent": PARENT_TABLE},
+    )
+    partitions = []
+    for name, bound in partitions_query.all():
+        bounds = parse_partition_bound(bound or "")
+        # The DEFAULT partition has no range and is never created or dropped here
+        if bounds:
+            partitions.append(Partition(name, *bounds))
+    return sorted(partitions, key=lambda partition: partition.start)
+
+
+async def ensure_metric_partitions(
+    db: AsyncSession, now: datetime, period: str, premake: int
+) -> list[str]:
+    partitions = await list_metric_partitions(db)
+    horizon = now
+    for _ in range(premake):
+        horizon = next_period_start(horizon, period)
+
+    # Continue from the newest existing bound so a changed period never overlaps old ranges
+    start = partitions[-1].end if partitions else period_start(now, period)
+    created = []
+    while start <= horizon:
+        end = next_period_start(start, period)
+        name = partition_name(start)
+        await move_default_rows_aside(db, start, end)
+        await db.execute(
+            text(
+                f'CREATE TABLE IF NOT EXISTS "{name}" PARTITION OF {PARENT_TABLE} '
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+        )
+        await db.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM pending_partition_rows"))
+        await db.execute(text("DROP TABLE pending_partition_rows"))
+        created.append(name)
+        start = end
+    return created
+
+
+async def move_default_rows_aside(db: AsyncSession, start: datetime, end: datetime):
+    # Postgres refuses to create a range partition while the DEFAULT partition holds rows for it
+    await db.execute(
+        text(f"CREATE TEMP TABLE pending_partition_rows (LIKE {PARENT_TABLE}) ON COMMIT DROP")
+    )
+    await db.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+            "WHERE collected_at >= :start AND collected_at < :end RETURNING *) "
+            "INSERT INTO pending_partition_rows SELECT * FROM moved"
+        ),
+        {"start": start, "end": end},
+    )
+
+
+async def metrics_retention_cutoff(db: AsyncSession, now: datetime) -> datetime:
+    # A partition holds every customer's rows, so it can only go once the longest retention has passed
+    longest_query = await db.execute(
+        select(func.max(func.coalesce(Customer.metrics_retention_days, settings.metrics_retention_days)))
+    )
+    longest_days = longest_query.scalar() or settings.metrics_retention_days
+    return now - timedelta(days=longest_days)
+
+
+async def drop_expired_metric_partitions(db: AsyncSession, cutoff: datetime) -> list[str]:
+    dropped = []
+    for partition in await list_metric_partitions(db):
+        if partition.end > cutoff:
+            continue
+        await db.execute(text(f'ALTER TABLE {PARENT_TABLE} DETACH PARTITION "{partition.name}"'))
+        await db.execute(text(f'DROP TABLE "{partition.name}"'))
+        dropped.append(partition.name)
+    return dropped
+
+
+async def run_partition_maintenance(db: AsyncSession, now: datetime | None = None) -> dict:
+    now = now or datetime.now(timezone.utc)
+    # Serializes replicas running maintenance at the same time; released at commit
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": MAINTENANCE_LOCK_KEY}
+    )
+
+    created = await ensure_metric_partitions(
+        db, now, settings.metrics_partition_period, settings.metrics_partition_premake
+    )
+    await db.commit()
+
+    # Expired partitions are dropped by the retention run (retention_service)
+    logger.info("partition_maintenance_complete", created=created)
+    return {"created": created}
+
+
+async def run_partition_maintenance_loop(interval_hours: int):
+    # Deferred import to avoid circular dependency with db module at startup
+    from app.db.session import AsyncSessionLocal
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await run_partition_maintenance(db)
+        except Exception as e:
+            logger.error("partition_maintenance_failed", error=str(e))
+
+        await asyncio.sleep(interval_hours * 3600)
@@ -0,0 +1,253 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Protocol
+from uuid import UUID
+from redis.asyncio import Redis
+from app.core.config import settings
+import structlog
+
+logger = structlog.get_logger()
+
+RESPONSE_CACHE_BACKENDS = ("memory", "redis", "none")
+KEY_PREFIX = "fabricmon:response:"
+TAG_PREFIX = "fabricmon:tag:"
+HEALTH_SUMMARY_TAG = "health-summary"
+
+
+def customer_capacities_tag(customer_id: UUID) -> str:
+    return f"capacities:{customer_id}"
+
+
+def capacity_snapshots_tag(capacity_id: UUID) -> str:
+    return f"snapshots:{capacity_id}"
+
+
+def capacity_metrics_tag(capacity_id: UUID) -> str:
+    return f"metrics:{capacity_id}"
+
+
+def capacity_rollups_tag(capacity_id: UUID) -> str:
+    return f"rollups:{capacity_id}"
+
+
+def ingest_key_tag(key_hash: bytes) -> str:
+    return f"ingest-key:{key_hash.hex()}"
+
+
+@dataclass
+class CachedResponse:
+    body: bytes
+    etag: str
+    headers: dict[str, str]
+
+    def encode(self) -> bytes:
+        header = json.dumps({"etag": self.etag, "headers": self.headers}).encode()
+        return header + b"\n" + self.body
+
+    @classmethod
+    def decode(cls, value: bytes) -> "CachedResponse":
+        header, _, body = value.partition(b"\n")
+        meta = json.loads(header)
+        return cls(body, meta["etag"], meta["headers"])
+
+
+@dataclass
+class ResponseCacheStats:
+    hits: int = 0
+    misses: int = 0
+    not_modified: int = 0
+    invalidations: int = 0
+    errors: int = 0
+
+
+class ResponseCacheBackend(Protocol):
+    async def get(self, key: str) -> bytes | None: ...
+
+    async def set(self, key: str, value: bytes, ttl: int): ...
+
+    async def versions(self, tags: list[str]) -> list[int]: ...
+
+    async def bump(self, tags: list[str]): ...
+
+    async def clear(self): ...
+
+    async def close(self): ...
+
+
+class MemoryResponseCacheBackend:
+    def __init__(self, max_entries: int = 10_000, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, key: str) -> bytes | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if self.clock() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        self._entries[key] = (value, self.clock() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def versions(self, tags: list[str]) -> list[int]:
+        return [self._versions.get(tag, 0) for tag in tags]
+
+    async def bump(self, tags: list[str]):
+        for tag in tags:
+            self._versions[tag] = self._versions.get(tag, 0) + 1
+
+    async def clear(self):
+        self._entries.clear()
+        self._versions.clear()
+
+    async def close(self):
+        self._entries.clear()
+
+
+class RedisResponseCacheBackend:
+    def __init__(self, client: Redis):
+        self.client = client
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.client.get(KEY_PREFIX + key)
+
+    async def set(self, key: str, value: bytes, ttl: int):
+        await self.client.set(KEY_PREFIX + key, value, ex=ttl)
+
+    async def versions(self, tags: list[str]) -> list[int]:
+        values = await self.client.mget([TAG_PREFIX + tag for tag in tags])
+        return [int(value or 0) for value in values]
+
+    async def bump(self, tags: list[str]):
+        # INCR is atomic, so replicas invalidating the same tag concurrently never lose a bump
+        async with self.client.pipeline(transaction=False) as pipe:
+            for tag in tags:
+                pipe.incr(TAG_PREFIX + tag)
+            await pipe.execute()
+
+    async def clear(self):
+        for prefix in (KEY_PREFIX, TAG_PREFIX):
+            async for key in self.client.scan_iter(match=prefix + "*"):
+                await self.client.delete(key)
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses weak comparison, so W/"x" matches "x"
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class ResponseCache:
+    def __init__(self, backend: ResponseCacheBackend | None, ttl: int = 300):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = ResponseCacheStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.backend is not None
+
+    @property
+    def shared(self) -> bool:
+        return isinstance(self.backend, RedisResponseCacheBackend)
+
+    async def shared_version(self, tag: str) -> int | None:
+        if not self.shared:
+            return None
+        try:
+            (version,) = await self.backend.versions([tag])
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning("response_cache_version_failed", error=str(e))
+            return None
+        return version
+
+    def snapshot(self) -> dict:
+        return {"backend": type(self.backend).__name__ if self.backend else None, **self.stats.__dict__}
+
+    async def key(self, path: str, params: list[tuple[str, str]], tags: list[str]) -> str:
+        # Tag versions are part of the key: bumping a tag orphans every entry built from it,
+        # and orphaned entries age out through the TTL and LRU instead of being found and deleted
+        versions = await self.backend.versions(tags)
+        material = json.dumps([path, sorted(params), list(zip(tags, versions))], separators=(",", ":"))
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    async def get(self, key: str) -> CachedResponse | None:
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning("response_cache_get_failed", error=str(e))
+            return None
+        if value is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return CachedResponse.decode(value)
+
+    async def set(self, key: str, response: CachedResponse):
+        try:
+            await self.backend.set(key, response.encode(), self.ttl)
+        except Exception as e:
+            self.stats.errors += 1
+            logger.warning("response_cache_set_failed", error=str(e))
+
+    async def invalidate(self, *tags: str):
+        if self.backend is None or not tags:
+            return
+        try:
+            await self.backend.bump(list(dict.fromkeys(tags)))
+            self.stats.invalidations += len(tags)
+        except Exception as e:
+            # Entries for these tags stay reachable until the TTL runs out
+            self.stats.errors += 1
+            logger.error("response_cache_invalidate_failed", tags=len(tags), error=str(e))
+
+    async def clear(self):
+        if self.backend is not None:
+            await self.backend.clear()
+
+    async def close(self):
+        if self.backend is not None:
+            await self.backend.close()
+
+
+def create_response_cache_backend(kind: str, redis_url: str | None) -> ResponseCacheBackend | None:
+    if kind not in RESPONSE_CACHE_BACKENDS:
+        raise ValueError(f"Unsupported response cache backend '{kind}', expected one of {RESPONSE_CACHE_BACKENDS}")
+    if kind == "none":
+        return None
+    if kind == "redis":
+        if not redis_url:
+            raise ValueError("The redis response cache backend needs REDIS_URL")
+        return RedisResponseCacheBackend(Redis.from_url(redis_url))
+    return MemoryResponseCacheBackend(settings.response_cache_max_entries)
+
+
+response_cache = ResponseCache(
+    create_response_cache_backend(settings.response_cache_backend, settings.redis_url),
+    ttl=settings.response_cache_ttl_seconds,
+)
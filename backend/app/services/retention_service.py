@@ -0,0 +1,294 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+from uuid import UUID
+from sqlalchemy import Select, delete, func, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.core.config import settings
+from app.models.capacity import Capacity, CapacitySnapshot
+from app.models.customer import Customer
+from app.models.metric import CapacityMetric
+from app.models.retention import RetentionRun
+from app.models.rollup import MetricRollupHourly, RollupWatermark
+from app.services.partition_service import (
+    MAINTENANCE_LOCK_KEY,
+    drop_expired_metric_partitions,
+    list_metric_partitions,
+    metrics_retention_cutoff,
+)
+from app.services.response_cache import (
+    capacity_metrics_tag,
+    capacity_rollups_tag,
+    capacity_snapshots_tag,
+    response_cache,
+)
+from app.services.rollup_service import WATERMARK_NAME
+import structlog
+
+logger = structlog.get_logger()
+
+RETENTION_LOCK_KEY = "data_retention"
+RETENTION_TABLES = ("capacity_metrics", "capacity_snapshots", "metric_rollups_hourly")
+RETENTION_CACHE_TAGS = {
+    "capacity_metrics": capacity_metrics_tag,
+    "capacity_snapshots": capacity_snapshots_tag,
+    "metric_rollups_hourly": capacity_rollups_tag,
+}
+
+
+class RetentionPolicy(NamedTuple):
+    customer_id: UUID
+    metrics_days: int
+    snapshots_days: int
+    hourly_rollups_days: int
+
+
+class RetentionBounds(NamedTuple):
+    now: datetime
+    partition_cutoff: datetime
+    # Rows older than this sit in partitions that are dropped whole, so row deletes skip them
+    partition_floor: datetime | None
+    longest_metrics_days: int
+    rolled_up_through: int
+
+
+async def list_retention_policies(db: AsyncSession) -> list[RetentionPolicy]:
+    policies_query = await db.execute(
+        select(
+            Customer.id,
+            func.coalesce(Customer.metrics_retention_days, settings.metrics_retention_days),
+            func.coalesce(Customer.snapshots_retention_days, settings.snapshots_retention_days),
+            func.coalesce(Customer.hourly_rollups_retention_days, settings.hourly_rollups_retention_days),
+        ).order_by(Customer.id)
+    )
+    return [RetentionPolicy(*row) for row in policies_query.all()]
+
+
+def customer_capacity_ids(customer_id: UUID) -> Select:
+    return select(Capacity.id).where(Capacity.customer_id == customer_id).correlate(None)
+
+
+def expired_rows(table: str, customer_id: UUID, cutoff: datetime, bounds: RetentionBounds) -> Select:
+    if table == "capacity_metrics":
+        query = select(CapacityMetric.id, CapacityMetric.collected_at).where(
+            CapacityMetric.capacity_id.in_(customer_capacity_ids(customer_id)),
+            CapacityMetric.collected_at < cutoff,
+            # Rows the rollup job has not passed yet stay until their buckets are final
+            CapacityMetric.id <= bounds.rolled_up_through,
+        )
+        if bounds.partition_floor:
+            query = query.where(CapacityMetric.collected_at >= bounds.partition_floor)
+        return query
+    if table == "capacity_snapshots":
+        # The newest snapshot before the cutoff is still in effect at the cutoff, so it is kept
+        newer = aliased(CapacitySnapshot)
+        superseded = (
+            select(newer.id)
+            .where(
+                newer.capacity_id == CapacitySnapshot.capacity_id,
+                newer.collected_at <= cutoff,
+                tuple_(newer.collected_at, newer.id) > tuple_(CapacitySnapshot.collected_at, CapacitySnapshot.id),
+            )
+            .exists()
+        )
+        return select(CapacitySnapshot.id).where(
+            CapacitySnapshot.capacity_id.in_(customer_capacity_ids(customer_id)),
+            CapacitySnapshot.collected_at < cutoff,
+            superseded,
+        )
+    if table == "metric_rollups_hourly":
+        return select(
+            MetricRollupHourly.capacity_id, MetricRollupHourly.metric_name, MetricRollupHourly.bucket_start
+        ).where(MetricRollupHourly.customer_id == customer_id, MetricRollupHourly.bucket_start < cutoff)
+    raise ValueError(f"Unsupported retention table '{table}', expected one of {RETENTION_TABLES}")
+
+
+def delete_expired_batch(table: str, expired: Select, batch_rows: int):
+    batch = expired.limit(batch_rows)
+    if table == "capacity_metrics":
+        return delete(CapacityMetric).where(tuple_(CapacityMetric.id, CapacityMetric.collected_at).in_(batch))
+    if table == "capacity_snapshots":
+        return delete(CapacitySnapshot).where(CapacitySnapshot.id.in_(batch))
+    return delete(MetricRollupHourly).where(
+        tuple_(
+            MetricRollupHourly.capacity_id, MetricRollupHourly.metric_name, MetricRollupHourly.bucket_start
+        ).in_(batch)
+    )
+
+
+def table_cutoffs(policy: RetentionPolicy, bounds: RetentionBounds) -> dict[str, tuple[int, datetime]]:
+    cutoffs = {
+        "capacity_snapshots": policy.snapshots_days,
+        "metric_rollups_hourly": policy.hourly_rollups_days,
+    }
+    # At the longest retention, partition drops alone keep up; row deletes are for shorter policies
+    if policy.metrics_days < bounds.longest_metrics_days:
+        cutoffs["capacity_metrics"] = policy.metrics_days
+    return {table: (days, bounds.now - timedelta(days=days)) for table, days in cutoffs.items()}
+
+
+async def retention_bounds(db: AsyncSession, now: datetime) -> tuple[RetentionBounds, list[dict]]:
+    partition_cutoff = await metrics_retention_cutoff(db, now)
+    expired_partitions = [
+        partition for partition in await list_metric_partitions(db) if partition.end <= partition_cutoff
+    ]
+    estimates = {}
+    if expired_partitions:
+        estimates_query = await db.execute(
+            text("SELECT relname, greatest(reltuples, 0)::bigint FROM pg_class WHERE relname = ANY(:names)"),
+            {"names": [partition.name for partition in expired_partitions]},
+        )
+        estimates = dict(estimates_query.all())
+
+    watermark_query = await db.execute(
+        select(RollupWatermark.last_metric_id).where(RollupWatermark.name == WATERMARK_NAME)
+    )
+    # Rollups rescan an overlap below their watermark, so those rows must outlive it too
+    rolled_up_through = max((watermark_query.scalar() or 0) - settings.rollup_id_overlap, 0)
+
+    bounds = RetentionBounds(
+        now=now,
+        partition_cutoff=partition_cutoff,
+        partition_floor=max((partition.end for partition in expired_partitions), default=None),
+        longest_metrics_days=(now - partition_cutoff).days,
+        rolled_up_through=rolled_up_through,
+    )
+    partitions = [
+        {"name": partition.name, "end": partition.end.isoformat(), "estimated_rows": estimates.get(partition.name, 0)}
+        for partition in expired_partitions
+    ]
+    return bounds, partitions
+
+
+async def build_retention_report(
+    db: AsyncSession, policies: list[RetentionPolicy], bounds: RetentionBounds, partitions: list[dict]
+) -> dict:
+    customers = []
+    totals = dict.fromkeys(RETENTION_TABLES, 0)
+    for policy in policies:
+        tables = {}
+        for table, (days, cutoff) in table_cutoffs(policy, bounds).items():
+            expired = expired_rows(table, policy.customer_id, cutoff, bounds)
+            count_query = await db.execute(select(func.count()).select_from(expired.subquery()))
+            rows = count_query.scalar()
+            if rows:
+                tables[table] = {"retention_days": days, "cutoff": cutoff.isoformat(), "rows": rows}
+                totals[table] += rows
+        # Only customers with something to remove are listed, which keeps the report small at fleet size
+        if tables:
+            customers.append({"customer_id": str(policy.customer_id), "tables": tables})
+    await db.commit()
+    return {
+        "partition_cutoff": bounds.partition_cutoff.isoformat(),
+        "partitions": partitions,
+        "rows": totals,
+        "customers": customers,
+    }
+
+
+async def delete_expired(
+    db: AsyncSession, table: str, customer_id: UUID, cutoff: datetime, bounds: RetentionBounds
+) -> int:
+    removed = 0
+    statement = delete_expired_batch(
+        table, expired_rows(table, customer_id, cutoff, bounds), settings.retention_batch_rows
+    )
+    while True:
+        # One short transaction per batch keeps row locks brief and lets WAL and autovacuum keep pace
+        deleted = (await db.execute(statement)).rowcount
+        await db.commit()
+        removed += deleted
+        if deleted < settings.retention_batch_rows:
+            return removed
+        await asyncio.sleep(settings.retention_batch_pause_seconds)
+
+
+async def apply_retention(
+    db: AsyncSession, policies: list[RetentionPolicy], bounds: RetentionBounds, report: dict
+) -> dict:
+    # Shares the partition maintenance lock so partitions are never created and dropped at once
+    await db.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": MAINTENANCE_LOCK_KEY}
+    )
+    dropped = await drop_expired_metric_partitions(db, bounds.partition_cutoff)
+    await db.commit()
+
+    removed = dict.fromkeys(RETENTION_TABLES, 0)
+    reported = {entry["customer_id"]: entry["tables"] for entry in report["customers"]}
+    for policy in policies:
+        tables = reported.get(str(policy.customer_id), {})
+        cutoffs = table_cutoffs(policy, bounds)
+        touched = []
+        for table in tables:
+            _, cutoff = cutoffs[table]
+            deleted = await delete_expired(db, table, policy.customer_id, cutoff, bounds)
+            removed[table] += deleted
+            if deleted:
+                touched.append(table)
+        if touched:
+            capacities_query = await db.execute(customer_capacity_ids(policy.customer_id))
+            capacity_ids = capacities_query.scalars().all()
+            await response_cache.invalidate(
+                *(RETENTION_CACHE_TAGS[table](capacity_id) for table in touched for capacity_id in capacity_ids)
+            )
+    return {"partitions": dropped, "rows": removed}
+
+
+async def run_retention(db: AsyncSession, now: datetime | None = None, dry_run: bool = False) -> RetentionRun | None:
+    now = now or datetime.now(timezone.utc)
+    # Held on its own connection for the whole run, since the batches commit one by one
+    async with db.bind.connect() as lock_connection:
+        await lock_connection.execution_options(isolation_level="AUTOCOMMIT")
+        locked_query = await lock_connection.execute(
+            text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": RETENTION_LOCK_KEY}
+        )
+        if not locked_query.scalar():
+            logger.info("retention_run_skipped", reason="another run holds the lock")
+            return None
+        try:
+            policies = await list_retention_policies(db)
+            bounds, partitions = await retention_bounds(db, now)
+            report = await build_retention_report(db, policies, bounds, partitions)
+
+            run = RetentionRun(started_at=now, dry_run=dry_run, report=report)
+            db.add(run)
+            await db.commit()
+
+            if not dry_run:
+                run.removed = await apply_retention(db, policies, bounds, report)
+            run.finished_at = datetime.now(timezone.utc)
+            await db.commit()
+        finally:
+            await lock_connection.execute(
+                text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": RETENTION_LOCK_KEY}
+            )
+
+    logger.info(
+        "retention_run_complete",
+        run_id=run.id,
+        dry_run=dry_run,
+        expired_partitions=[partition["name"] for partition in report["partitions"]],
+        expired_rows=report["rows"],
+        removed=run.removed,
+    )
+    return run
+
+
+async def list_retention_runs(db: AsyncSession, limit: int) -> list[RetentionRun]:
+    runs_query = await db.execute(select(RetentionRun).order_by(RetentionRun.id.desc()).limit(limit))
+    return list(runs_query.scalars().all())
+
+
+async def run_retention_loop(interval_hours: int):
+    # Deferred import to avoid circular dependency with db module at startup
+    from app.db.session import AsyncSessionLocal
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await run_retention(db, dry_run=settings.retention_dry_run)
+        except Exception as e:
+            logger.error("retention_run_failed", error=str(e))
+
+        await asyncio.sleep(interval_hours * 3600)
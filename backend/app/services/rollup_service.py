@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.models.metric import CapacityMetric
+from app.models.rollup import MetricRollupDaily, MetricRollupHourly, RollupWatermark
+from app.services.id_horizon import settled_max_id
+from app.services.response_cache import capacity_rollups_tag, response_cache
+import structlog
+
+logger = structlog.get_logger()
+
+WATERMARK_NAME = "metric_rollups"
+ROLLUP_TABLES = {
+    "hour": MetricRollupHourly,
+    "day": MetricRollupDaily,
+}
+# Widest span each resolution serves under resolution=auto; anything wider uses daily rollups
+AUTO_RESOLUTION_MAX_SPAN = (
+    ("raw", timedelta(days=2)),
+    ("hour", timedelta(days=62)),
+)
+
+ROLLUP_UPSERT_SQL = """
+    INSERT INTO {table} (
+        capacity_id, metric_name, bucket_start, customer_id,
+        min_value, max_value, avg_value, p95_value, sample_count
+    )
+    SELECT
+        touched.capacity_id,
+        touched.metric_name,
+        touched.bucket_start,
+        c.customer_id,
+        min(m.metric_value),
+        max(m.metric_value),
+        avg(m.metric_value),
+        percentile_cont(0.95) WITHIN GROUP (ORDER BY m.metric_value),
+        count(*)
+    FROM (
+        SELECT DISTINCT m.capacity_id, d.name AS metric_name, date_trunc('{unit}', m.collected_at, 'UTC') AS bucket_start
+        FROM capacity_metrics m
+        JOIN metric_definitions d ON d.id = m.metric_id
+        WHERE m.id > :low_id AND m.id <= :high_id
+    ) touched
+    JOIN capacities c ON c.id = touched.capacity_id
+    -- Rollups are keyed by name, so every aggregation type reported under that name goes into one bucket
+    JOIN metric_definitions d ON d.name = touched.metric_name
+    JOIN capacity_metrics m
+        ON m.capacity_id = touched.capacity_id
+        AND m.metric_id = d.id
+        AND m.collected_at >= touched.bucket_start
+        AND m.collected_at < touched.bucket_start + interval '1 {unit}'
+    GROUP BY touched.capacity_id, c.customer_id, touched.metric_name, touched.bucket_start
+    ON CONFLICT (capacity_id, metric_name, bucket_start) DO UPDATE SET
+        min_value = excluded.min_value,
+        max_value = excluded.max_value,
+        avg_value = excluded.avg_value,
+        p95_value = excluded.p95_value,
+        sample_count = excluded.sample_count
+    RETURNING capacity_id
+"""
+
+
+def choose_resolution(
+    resolution: str, start: datetime | None, end: datetime | None, now: datetime | None = None
+) -> str:
+    if resolution != "auto":
+        return resolution
+    # Without a lower bound the caller wants the latest points, which only raw data has
+    if start is None:
+        return "raw"
+    span = (end or now or datetime.now(timezone.utc)) - start
+    for candidate, max_span in AUTO_RESOLUTION_MAX_SPAN:
+        if span <= max_span:
+            return candidate
+    return "day"
+
+
+async def get_metric_rollups(
+    db: AsyncSession,
+    customer_id: UUID,
+    capacity_id: UUID,
+    resolution: str,
+    start: datetime | None,
+    end: datetime | None,
+    metric_name: str | None,
+    limit: int = 1000,
+) -> list:
+    rollup = ROLLUP_TABLES[resolution]
+    query = select(rollup).where(
+        rollup.customer_id == customer_id,
+        rollup.capacity_id == capacity_id,
+    )
+
+    if start:
+        query = query.where(rollup.bucket_start >= start)
+    if end:
+        query = query.where(rollup.bucket_start <= end)
+    if metric_name:
+        query = query.where(rollup.metric_name == metric_name)
+
+    rollups_query = await db.execute(query.order_by(rollup.bucket_start.desc()).limit(limit))
+    return list(rollups_query.scalars().all())
+
+
+async def refresh_rollups(db: AsyncSession) -> dict:
+    # Daily buckets advance by calendar day, which follows the session zone across DST changes
+    await db.execute(text("SET LOCAL TIME ZONE 'UTC'"))
+    await db.execute(
+        pg_insert(RollupWatermark)
+        .values(name=WATERMARK_NAME, last_metric_id=0)
+        .on_conflict_do_nothing(index_elements=[RollupWatermark.name])
+    )
+    # Row lock keeps replicas from rolling up the same id range concurrently
+    watermark_query = await db.execute(
+        select(RollupWatermark).where(RollupWatermark.name == WATERMARK_NAME).with_for_update()
+    )
+    watermark = watermark_query.scalar_one()
+
+    # The watermark never passes ids that a COPY still in flight could commit later
+    max_id = await settled_max_id(db, CapacityMetric.__tablename__)
+    if max_id is None or max_id <= watermark.last_metric_id:
+        await db.commit()
+        return {"low_id": watermark.last_metric_id, "high_id": watermark.last_metric_id, "backlog": False}
+
+    high_id = min(max_id, watermark.last_metric_id + settings.rollup_batch_size)
+    # A writer that had drawn an id but not yet its transaction id is invisible to the wait above;
+    # rescanning a small overlap recomputes the buckets of such rows, which is idempotent
+    low_id = max(watermark.last_metric_id - settings.rollup_id_overlap, 0)
+
+    touched_capacities = set()
+    for unit, rollup in ROLLUP_TABLES.items():
+        upsert_query = await db.execute(
+            text(ROLLUP_UPSERT_SQL.format(table=rollup.__tablename__, unit=unit)),
+            {"low_id": low_id, "high_id": high_id},
+        )
+        touched_capacities.update(upsert_query.scalars().all())
+
+    watermark.last_metric_id = high_id
+    watermark.updated_at = datetime.now(timezone.utc)
+    await db.commit()
+    await response_cache.invalidate(*map(capacity_rollups_tag, touched_capacities))
+    return {"low_id": low_id, "high_id": high_id, "backlog": max_id > high_id}
+
+
+async def run_rollup_loop(interval_minutes: int):
+    # Deferred import to avoid circular dependency with db module at startup
+    from app.db.session import AsyncSessionLocal
+
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                while True:
+                    processed = await refresh_rollups(db)
+                    logger.info("rollup_refresh_complete", **processed)
+                    # Keep going while a backlog remains, one bounded id range per transaction
+                    if not processed["backlog"]:
+                        break
+        except Exception as e:
+            logger.error("rollup_refresh_failed", error=str(e))
+
+        await asyncio.sleep(interval_minutes * 60)
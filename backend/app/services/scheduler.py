@@ -0,0 +1,163 @@
+import heapq
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, NamedTuple
+from uuid import UUID
+
+DEGRADED_AFTER_FAILURES = 3
+CRITICAL_AFTER_FAILURES = 5
+
+
+class CollectionResult(NamedTuple):
+    success: bool
+    capacity_states: dict[UUID, str | None] = {}
+
+
+@dataclass
+class ScheduleEntry:
+    customer: Any
+    due: float
+    failures: int = 0
+    capacity_states: dict[UUID, str | None] = field(default_factory=dict)
+    running: bool = False
+    started: float | None = None
+
+
+class CollectionScheduler:
+    def __init__(
+        self,
+        default_interval: float,
+        fast_interval: float,
+        max_backoff: float,
+        jitter: float = 0.1,
+        startup_spread: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random | None = None,
+    ):
+        self.default_interval = default_interval
+        self.fast_interval = fast_interval
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.startup_spread = startup_spread
+        self.clock = clock
+        self.rng = rng or random.Random()
+        self.entries: dict[UUID, ScheduleEntry] = {}
+        self._heap: list[tuple[float, int, UUID]] = []
+        self._sequence = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def interval_for(self, customer) -> float:
+        minutes = getattr(customer, "collection_interval_minutes", None)
+        return minutes * 60 if minutes else self.default_interval
+
+    def backoff_interval(self, interval: float, failures: int) -> float:
+        if failures < DEGRADED_AFTER_FAILURES:
+            return interval
+        # Degraded and critical tenants back off so they stop holding worker slots every cycle
+        doublings = failures - DEGRADED_AFTER_FAILURES + 1
+        return min(interval * 2**doublings, max(self.max_backoff, interval))
+
+    def _jittered(self, delay: float) -> float:
+        return delay * self.rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, entry: ScheduleEntry, due: float):
+        entry.due = due
+        self._sequence += 1
+        heapq.heappush(self._heap, (due, self._sequence, entry.customer.id))
+
+    def initial_delay(self, customer, wall_now: datetime | None = None) -> float:
+        interval = self.interval_for(customer)
+        failures = getattr(customer, "consecutive_failures", 0) or 0
+        if failures >= DEGRADED_AFTER_FAILURES:
+            # A restart or shard move must not hand a broken tenant an early retry
+            return self._jittered(self.backoff_interval(interval, failures))
+        last_success = getattr(customer, "last_successful_collection", None)
+        if last_success is not None:
+            if last_success.tzinfo is None:
+                last_success = last_success.replace(tzinfo=timezone.utc)
+            wall_now = wall_now or datetime.now(timezone.utc)
+            # Pick up the customer's own cadence, so restarts and shard moves do not reset everyone to now
+            remaining = interval - (wall_now - last_success).total_seconds()
+            if remaining > 0:
+                return self._jittered(remaining)
+        return self.rng.uniform(0, min(interval, self.startup_spread))
+
+    def sync(self, customers, now: float | None = None):
+        now = self.clock() if now is None else now
+        seen = set()
+        for customer in customers:
+            seen.add(customer.id)
+            entry = self.entries.get(customer.id)
+            if entry is not None:
+                entry.customer = customer
+                continue
+            entry = ScheduleEntry(customer, now, failures=getattr(customer, "consecutive_failures", 0) or 0)
+            self.entries[customer.id] = entry
+            self._push(entry, now + self.initial_delay(customer))
+
+        # Heap items for dropped customers are discarded lazily when they surface
+        for customer_id in self.entries.keys() - seen:
+            del self.entries[customer_id]
+
+    def _live(self, item: tuple[float, int, UUID]) -> ScheduleEntry | None:
+        due, _, customer_id = item
+        entry = self.entries.get(customer_id)
+        if entry is None or entry.running or entry.due != due:
+            return None
+        return entry
+
+    def next_due(self) -> float | None:
+        while self._heap:
+            if self._live(self._heap[0]):
+                return self._heap[0][0]
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: float | None = None) -> list:
+        now = self.clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = self._live(heapq.heappop(self._heap))
+            if entry:
+                entry.running = True
+                entry.started = now
+                due.append(entry.customer)
+        return due
+
+    def next_delay(self, entry: ScheduleEntry, result: CollectionResult | None) -> float:
+        interval = self.interval_for(entry.customer)
+        if result is None:
+            return self._jittered(interval)
+
+        if result.success:
+            previous = entry.capacity_states
+            changed = bool(previous) and any(
+                previous.get(capacity_id) != state for capacity_id, state in result.capacity_states.items()
+            )
+            entry.failures = 0
+            entry.capacity_states = dict(result.capacity_states)
+            if changed:
+                # A capacity mid-transition (resuming, scaling) is polled closely until it settles
+                interval = min(interval, self.fast_interval)
+        else:
+            entry.failures += 1
+            interval = self.backoff_interval(interval, entry.failures)
+        return self._jittered(interval)
+
+    def complete(self, customer_id: UUID, result: CollectionResult | None, now: float | None = None) -> float | None:
+        entry = self.entries.get(customer_id)
+        if entry is None:
+            return None
+        now = self.clock() if now is None else now
+        entry.running = False
+        delay = self.next_delay(entry, result)
+        # Measured from when the collection started, so the cadence does not drift by its duration; an
+        # overrunning collection is due right away but is not fired again before it has finished
+        started = now if entry.started is None else entry.started
+        entry.started = None
+        self._push(entry, max(started + delay, now))
+        return delay
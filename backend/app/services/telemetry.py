@@ -0,0 +1,136 @@
+import time
+from typing import AsyncIterator, TypeVar
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+T = TypeVar("T")
+
+# Own registry, so /metrics shows only what this app defines and tests can read it in isolation
+registry = CollectorRegistry()
+
+# ARM pages and cold token or secret fetches can take tens of seconds, past the client's default buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+COLLECTOR_STAGES = ("secret", "token", "list_capacities", "upsert", "snapshot", "health", "monitor_metrics")
+
+collector_stage_seconds = Histogram(
+    "fabricmon_collector_stage_duration_seconds",
+    "Time spent in one stage of a customer collection; list_capacities and the writes count once per ARM page",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+collection_seconds = Histogram(
+    "fabricmon_collection_duration_seconds",
+    "Duration of one customer's collection cycle",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+customers_in_flight = Gauge(
+    "fabricmon_collector_customers_in_flight",
+    "Customers being collected right now",
+    registry=registry,
+)
+metric_rows_written = Counter(
+    "fabricmon_metric_rows_written",
+    "Metric rows committed to capacity_metrics",
+    ["source"],
+    registry=registry,
+)
+metric_definition_ids_used = Gauge(
+    "fabricmon_metric_definition_ids_used",
+    "Highest metric_definitions id handed out by this process; ids are a smallint, so the limit is 32767",
+    registry=registry,
+)
+ingest_flush_seconds = Histogram(
+    "fabricmon_ingest_flush_duration_seconds",
+    "Duration of one ingest queue flush",
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+http_request_seconds = Histogram(
+    "fabricmon_http_request_duration_seconds",
+    "HTTP request duration until the last body chunk is sent",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+    registry=registry,
+)
+
+for stage in COLLECTOR_STAGES:
+    # Declared up front so every stage is exported, and alerts see zeros rather than missing series
+    collector_stage_seconds.labels(stage=stage)
+
+
+def time_stage(stage: str):
+    return collector_stage_seconds.labels(stage=stage).time()
+
+
+async def time_pages(source: AsyncIterator[T], stage: str) -> AsyncIterator[T]:
+    histogram = collector_stage_seconds.labels(stage=stage)
+    try:
+        while True:
+            started = time.perf_counter()
+            try:
+                item = await anext(source)
+            except StopAsyncIteration:
+                return
+            histogram.observe(time.perf_counter() - started)
+            yield item
+    finally:
+        await source.aclose()
+
+
+class DatabasePoolCollector:
+    # Read at scrape time, so the numbers are current without the pool reporting anything itself
+    def __init__(self, engine):
+        self.engine = engine
+
+    def collect(self):
+        pool = self.engine.pool
+        connections = GaugeMetricFamily(
+            "fabricmon_db_pool_connections", "Pooled database connections by state", labels=["state"]
+        )
+        connections.add_metric(["checked_out"], pool.checkedout())
+        connections.add_metric(["idle"], pool.checkedin())
+        # Negative while the pool has not yet opened all of its base connections
+        connections.add_metric(["overflow"], max(pool.overflow(), 0))
+        yield connections
+        yield GaugeMetricFamily("fabricmon_db_pool_size", "Configured base size of the pool", value=pool.size())
+
+
+class IngestQueueCollector:
+    def __init__(self, ingest_queue):
+        self.ingest_queue = ingest_queue
+
+    def collect(self):
+        yield GaugeMetricFamily(
+            "fabricmon_ingest_queue_rows", "Metric rows waiting in the ingest queue", value=self.ingest_queue.depth
+        )
+
+
+class RequestTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The route template, not the raw path, keeps customer and capacity ids out of the label values
+            route = scope.get("route")
+            http_request_seconds.labels(
+                scope["method"], getattr(route, "path", "unmatched"), str(status)
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,103 @@
+"""Compare a bare httpx client with the rate-limited ARM transport against a throttling fake ARM.
+
+Usage (from backend/):
+    python -m scripts.benchmark_arm_throttling --subscriptions 4 --requests 600 --concurrency 50
+
+Runs scripts.fake_arm_server in-process over the ASGI transport by default, or against a running
+instance with --arm-url. Reports how many list_capacities calls the collector would have counted as
+customer failures, how many 429s the server handed out and the wall-clock time of each run.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import time
+from uuid import uuid4
+import httpx
+from app.services.azure_client import AzureClient
+from scripts.fake_arm_server import create_app
+
+
+def fake_token(tenant_id: str) -> str:
+    # Unsigned JWT shape so both sides can read the tid claim
+    claims = base64.urlsafe_b64encode(json.dumps({"tid": tenant_id}).encode()).decode().rstrip("=")
+    return f"e30.{claims}.sig"
+
+
+async def run(client: AzureClient, token: str, subscriptions: list[str], request_count: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    outcomes = {"ok": 0, "failed": 0}
+
+    async def one(i: int):
+        async with semaphore:
+            try:
+                async for _ in client.list_capacities(token, subscriptions[i % len(subscriptions)]):
+                    pass
+                outcomes["ok"] += 1
+            except httpx.HTTPStatusError:
+                outcomes["failed"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(request_count)])
+    outcomes["seconds"] = round(time.perf_counter() - started, 2)
+    return outcomes
+
+
+def inner_transport(args, app) -> httpx.AsyncBaseTransport:
+    if args.arm_url:
+        return httpx.AsyncHTTPTransport()
+    return httpx.ASGITransport(app=app)
+
+
+async def main(args):
+    subscriptions = [str(uuid4()) for _ in range(args.subscriptions)]
+    token = fake_token(str(uuid4()))
+
+    for label in ("bare", "rate-limited"):
+        app = create_app(
+            rate=args.server_rate,
+            burst=args.server_burst,
+            tenant_rate=args.server_tenant_rate,
+            tenant_burst=args.server_tenant_burst,
+            error_rate=args.error_rate,
+            seed=1,
+        )
+        client = AzureClient(transport=inner_transport(args, app))
+        if label == "bare":
+            # Retries and buckets off: what the collector did before the transport existed
+            client.transport.max_retries = 0
+            client.transport.subscription_rate = client.transport.tenant_rate = 1e9
+            client.transport.subscription_burst = client.transport.tenant_burst = 10**9
+        else:
+            client.transport.subscription_rate = args.server_rate * 0.9
+            client.transport.subscription_burst = args.server_burst
+            client.transport.tenant_rate = args.server_tenant_rate * 0.9
+            client.transport.tenant_burst = args.server_tenant_burst
+        if args.arm_url:
+            client.arm_endpoint = args.arm_url.rstrip("/")
+        else:
+            client.arm_endpoint = "http://fake-arm"
+
+        outcome = await run(client, token, subscriptions, args.requests, args.concurrency)
+        throttled = "n/a" if args.arm_url else app.state.stats["throttled"]
+        transport = client.transport.snapshot()
+        print(
+            f"{label:>13}: {outcome['ok']} ok, {outcome['failed']} failed in {outcome['seconds']}s; "
+            f"server 429s {throttled}, retries {transport['retries']}, "
+            f"summed client throttle wait {transport['throttle_wait_seconds']:.1f}s"
+        )
+        await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscriptions", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--server-rate", type=float, default=20.0)
+    parser.add_argument("--server-burst", type=int, default=20)
+    parser.add_argument("--server-tenant-rate", type=float, default=50.0)
+    parser.add_argument("--server-tenant-burst", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--arm-url", default=None)
+    asyncio.run(main(parser.parse_args()))
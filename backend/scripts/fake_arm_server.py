@@ -0,0 +1,147 @@
+"""Local stand-in for ARM that throttles like the real thing, for exercising the collector's HTTP layer.
+
+Usage (from backend/):
+    python -m scripts.fake_arm_server --port 8081 --rate 20 --burst 20 --error-rate 0.02
+
+Serves `GET /subscriptions/{id}[/resourceGroups/{rg}]/providers/Microsoft.Fabric/capacities`.
+Each subscription and each tenant (the `tid` claim of the bearer token, when it is a JWT) gets a
+token bucket. Every response carries `x-ms-ratelimit-remaining-subscription-reads` and
+`x-ms-ratelimit-remaining-tenant-reads`. An empty bucket answers 429 with `Retry-After`.
+`--error-rate` injects 503s. `--page-size` splits the list into pages linked by `nextLink`.
+"""
+import argparse
+import math
+import random
+import time
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.services.arm_transport import token_tenant
+
+
+class ServerBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        self.refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil((1 - self.tokens) / self.rate))
+
+
+def create_app(
+    rate: float = 20.0,
+    burst: int = 20,
+    tenant_rate: float | None = None,
+    tenant_burst: int | None = None,
+    error_rate: float = 0.0,
+    capacities_per_subscription: int = 3,
+    page_size: int | None = None,
+    seed: int | None = None,
+) -> FastAPI:
+    app = FastAPI(title="Fake ARM")
+    subscription_buckets: dict[str, ServerBucket] = {}
+    tenant_buckets: dict[str, ServerBucket] = {}
+    rng = random.Random(seed)
+    app.state.stats = Counter()
+
+    def capacities(subscription_id: str, resource_group: str) -> list[dict]:
+        return [
+            {
+                "id": (
+                    f"/subscriptions/{subscription_id}/resourceGroups/{resource_group}"
+                    f"/providers/Microsoft.Fabric/capacities/cap{i}"
+                ),
+                "name": f"cap{i}",
+                "location": "westeurope",
+                "sku": {"name": "F2", "tier": "Fabric"},
+                "properties": {"state": "Active"},
+            }
+            for i in range(capacities_per_subscription)
+        ]
+
+    async def list_capacities(request: Request, subscription_id: str, resource_group: str = "rg"):
+        stats = app.state.stats
+        stats["requests"] += 1
+        subscription = subscription_buckets.setdefault(subscription_id, ServerBucket(rate, burst))
+        tenant_id = token_tenant(request.headers.get("authorization")) or "anonymous"
+        tenant = tenant_buckets.setdefault(
+            tenant_id, ServerBucket(tenant_rate or rate, tenant_burst or burst)
+        )
+
+        for scope, bucket in (("subscription", subscription), ("tenant", tenant)):
+            if not bucket.take():
+                stats["throttled"] += 1
+                return JSONResponse(
+                    {"error": {"code": "TooManyRequests", "message": f"{scope} read limit reached"}},
+                    status_code=429,
+                    headers={
+                        "Retry-After": str(bucket.retry_after()),
+                        f"x-ms-ratelimit-remaining-{scope}-reads": "0",
+                    },
+                )
+
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"code": "ServiceUnavailable"}}, status_code=503)
+
+        stats["ok"] += 1
+        value = capacities(subscription_id, resource_group)
+        body = {"value": value}
+        if page_size:
+            skip = int(request.query_params.get("$skiptoken", 0))
+            body["value"] = value[skip:skip + page_size]
+            if skip + page_size < len(value):
+                body["nextLink"] = str(request.url.include_query_params(**{"$skiptoken": skip + page_size}))
+        return JSONResponse(
+            body,
+            headers={
+                "x-ms-ratelimit-remaining-subscription-reads": str(int(subscription.tokens)),
+                "x-ms-ratelimit-remaining-tenant-reads": str(int(tenant.tokens)),
+            },
+        )
+
+    app.add_api_route(
+        "/subscriptions/{subscription_id}/providers/Microsoft.Fabric/capacities", list_capacities
+    )
+    app.add_api_route(
+        "/subscriptions/{subscription_id}/resourceGroups/{resource_group}/providers/Microsoft.Fabric/capacities",
+        list_capacities,
+    )
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--rate", type=float, default=20.0)
+    parser.add_argument("--burst", type=int, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--capacities", type=int, default=3)
+    parser.add_argument("--page-size", type=int, default=None)
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(
+            args.rate,
+            args.burst,
+            error_rate=args.error_rate,
+            capacities_per_subscription=args.capacities,
+            page_size=args.page_size,
+        ),
+        port=args.port,
+    )
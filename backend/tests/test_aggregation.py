@@ -0,0 +1,171 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from httpx import AsyncClient
+from app.core.config import settings
+from app.main import app
+from app.schemas.customer import CustomerCreate
+from app.services import aggregation_service, capacity_service, customer_service
+from app.services.aggregation_service import AggregationError
+from app.services.metric_service import bulk_insert_metrics
+
+START = datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+async def create_fleet(db_session):
+    fleet = []
+    for name in ("Customer A", "Customer B"):
+        customer = await customer_service.create_customer(
+            db_session,
+            CustomerCreate(
+                name=name,
+                tenant_id=str(uuid4()),
+                client_id=str(uuid4()),
+                client_secret="secret",
+                subscription_id=str(uuid4()),
+            ),
+        )
+        for i in range(2):
+            capacity = await capacity_service.upsert_capacity(
+                db_session,
+                customer.id,
+                f"/subscriptions/xxx/resourceGroups/rg1/providers/Microsoft.Fabric/capacities/{customer.id}-{i}",
+                f"{name} capacity {i}",
+                "F2",
+                "Standard",
+                "eastus",
+                "Active",
+            )
+            fleet.append((customer, capacity))
+    return fleet
+
+
+async def add_metrics(db_session, fleet):
+    # Capacity k reports CPU = k*10 + minute for two hours, one sample every 15 minutes
+    await bulk_insert_metrics(
+        db_session,
+        [
+            (customer.id, capacity.id, START + timedelta(minutes=minute), name, value, None)
+            for k, (customer, capacity) in enumerate(fleet)
+            for minute in range(0, 120, 15)
+            for name, value in (("CPU", k * 10 + minute / 15), ("Memory", 1.0))
+        ],
+    )
+    await db_session.commit()
+
+
+def test_parse_duration():
+    assert aggregation_service.parse_duration("PT15M") == timedelta(minutes=15)
+    assert aggregation_service.parse_duration("pt1h") == timedelta(hours=1)
+    assert aggregation_service.parse_duration("P1DT12H") == timedelta(days=1, hours=12)
+    for invalid in ("P", "PT", "15m", "PT0M", "PT1S"):
+        with pytest.raises(AggregationError):
+            aggregation_service.parse_duration(invalid)
+
+
+@pytest.mark.asyncio
+async def test_aggregate_buckets_percentiles_and_grouping(db_session):
+    fleet = await create_fleet(db_session)
+    await add_metrics(db_session, fleet)
+    customer, capacity = fleet[1]
+
+    rows = await aggregation_service.aggregate_metrics(
+        db_session,
+        ["CPU"],
+        START,
+        START + timedelta(hours=2),
+        timedelta(hours=1),
+        ["avg", "max", "sum", "count", "p95"],
+        ["capacity"],
+        customer_id=customer.id,
+        capacity_ids=[capacity.id],
+    )
+
+    assert [row["bucket_start"] for row in rows] == [START, START + timedelta(hours=1)]
+    first = rows[0]
+    assert first["capacity_id"] == capacity.id
+    assert first["count"] == 4
+    assert first["max"] == 13
+    assert first["sum"] == 10 + 11 + 12 + 13
+    assert first["avg"] == pytest.approx(11.5)
+    assert first["p95"] == pytest.approx(12.85)
+
+    by_customer = await aggregation_service.aggregate_metrics(
+        db_session,
+        ["CPU", "Memory"],
+        START,
+        START + timedelta(hours=2),
+        timedelta(hours=2),
+        ["count"],
+        ["customer", "metric_name"],
+    )
+    assert len(by_customer) == 4
+    assert {row["count"] for row in by_customer} == {16}
+
+    with pytest.raises(AggregationError):
+        aggregation_service.aggregate_metrics_statement(
+            ["CPU"], START, START + timedelta(days=30), timedelta(minutes=1), ["avg"], ["capacity"]
+        )
+
+
+@pytest.mark.asyncio
+async def test_top_capacities_orders_fleet_by_aggregate(db_session):
+    fleet = await create_fleet(db_session)
+    await add_metrics(db_session, fleet)
+
+    top = await aggregation_service.top_capacities(
+        db_session, "CPU", START, START + timedelta(hours=2), "max", limit=3
+    )
+    assert [row["capacity_id"] for row in top] == [capacity.id for _, capacity in reversed(fleet[1:])]
+    assert [row["value"] for row in top] == [37, 27, 17]
+    assert top[0]["sample_count"] == 8
+
+    customer_a = fleet[0][0]
+    scoped = await aggregation_service.top_capacities(
+        db_session, "CPU", START, START + timedelta(hours=2), "p95", customer_id=customer_a.id
+    )
+    assert {row["customer_id"] for row in scoped} == {customer_a.id}
+
+
+@pytest.mark.asyncio
+async def test_aggregate_endpoints(db_session, override_get_db):
+    fleet = await create_fleet(db_session)
+    await add_metrics(db_session, fleet)
+    customer, capacity = fleet[0]
+    headers = {"X-Admin-Key": settings.admin_api_key}
+    window = {"start": START.isoformat(), "end": (START + timedelta(hours=2)).isoformat()}
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get(
+            f"/api/customers/{customer.id}/metrics/aggregate",
+            params={**window, "metric_name": "CPU", "agg": ["avg", "p95"], "bucket": "PT30M"},
+        )
+        assert response.status_code == 200
+        rows = response.json()
+        assert len(rows) == 8
+        assert set(rows[0]) == {"bucket_start", "capacity_id", "avg", "p95"}
+
+        invalid = await client.get(
+            f"/api/customers/{customer.id}/metrics/aggregate",
+            params={**window, "metric_name": "CPU", "bucket": "15 minutes"},
+        )
+        assert invalid.status_code == 400
+
+        unauthorized = await client.get("/api/metrics/aggregate", params={**window, "metric_name": "CPU"})
+        assert unauthorized.status_code == 422
+
+        fleet_wide = await client.get(
+            "/api/metrics/aggregate",
+            params={**window, "metric_name": "CPU", "group_by": "customer", "agg": "max", "bucket": "PT2H"},
+            headers=headers,
+        )
+        assert sorted(row["max"] for row in fleet_wide.json()) == [17, 37]
+
+        top = await client.get(
+            "/api/metrics/top",
+            params={"metric_name": "CPU", "window": "PT2H", "end": window["end"], "agg": "max", "limit": 1},
+            headers=headers,
+        )
+        assert top.status_code == 200
+        assert top.json()[0]["capacity_id"] == str(fleet[-1][1].id)
+        assert top.json()[0]["display_name"] == "Customer B capacity 1"
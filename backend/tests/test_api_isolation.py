@@ -70,8 +70,8 @@ async def test_snapshots_endpoint_blocks_cross_customer_access(db_session, overr
 
 @pytest.mark.asyncio
 async def test_metrics_endpoint_blocks_cross_customer_access(db_session, override_get_db):
-    from datetime import datetime
-    from app.models.metric import CapacityMetric
+    from datetime import datetime, timedelta, timezone
+    from app.services.metric_service import bulk_insert_metrics
 
     customer1_data = CustomerCreate(
         name="Customer A",
@@ -113,25 +113,14 @@ async def test_metrics_endpoint_blocks_cross_customer_access(db_session, overrid
         "Active",
     )
 
-    metric1 = CapacityMetric(
-        customer_id=customer1.id,
-        capacity_id=capacity1.id,
-        collected_at=datetime.utcnow(),
-        metric_name="CPU",
-        metric_value=75.5,
-        aggregation_type="Average",
-    )
-    db_session.add(metric1)
-
-    metric2 = CapacityMetric(
-        customer_id=customer2.id,
-        capacity_id=capacity2.id,
-        collected_at=datetime.utcnow(),
-        metric_name="Memory",
-        metric_value=80.0,
-        aggregation_type="Average",
+    collected_at = datetime.now(timezone.utc)
+    await bulk_insert_metrics(
+        db_session,
+        [
+            (customer1.id, capacity1.id, collected_at, "CPU", 75.5, "Average"),
+            (customer2.id, capacity2.id, collected_at, "Memory", 80.0, "Average"),
+        ],
     )
-    db_session.add(metric2)
     await db_session.commit()
 
     async with AsyncClient(app=app, base_url="http://test") as client:
@@ -150,6 +139,18 @@ async def test_metrics_endpoint_blocks_cross_customer_access(db_session, overrid
         data_cross = response_cross.json()
         assert len(data_cross) == 0
 
+        response_aggregate = await client.get(
+            f"/api/customers/{customer1.id}/metrics/aggregate",
+            params={
+                "metric_name": ["CPU", "Memory"],
+                "start": (collected_at - timedelta(hours=1)).isoformat(),
+                "end": (collected_at + timedelta(hours=1)).isoformat(),
+                "capacity_id": str(capacity2.id),
+            },
+        )
+        assert response_aggregate.status_code == 200
+        assert response_aggregate.json() == []
+
 
 @pytest.mark.asyncio
 async def test_ingest_endpoint_validates_customer_capacity_ownership(db_session, override_get_db):
@@ -0,0 +1,117 @@
+import base64
+import json
+import httpx
+import pytest
+from app.services.arm_transport import RateLimitedTransport, retry_after_seconds, token_tenant
+from app.services.azure_client import AzureClient
+
+SUBSCRIPTION_URL = "https://management.azure.com/subscriptions/sub-1/providers/Microsoft.Fabric/capacities"
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def jwt_for(tenant_id: str) -> str:
+    claims = base64.urlsafe_b64encode(json.dumps({"tid": tenant_id}).encode()).decode().rstrip("=")
+    return f"e30.{claims}.sig"
+
+
+def make_transport(responses, clock: FakeClock, **kwargs):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return responses.pop(0) if responses else httpx.Response(200, json={"value": []})
+
+    options = {"clock": clock, "sleep": clock.sleep, "backoff_base": 1.0}
+    options.update(kwargs)
+    return RateLimitedTransport(httpx.MockTransport(handler), **options), requests
+
+
+@pytest.mark.asyncio
+async def test_throttled_request_waits_out_retry_after_and_succeeds():
+    clock = FakeClock()
+    transport, requests = make_transport(
+        [httpx.Response(429, headers={"Retry-After": "7"}), httpx.Response(503)], clock
+    )
+    client = AzureClient(transport=transport)
+
+    assert [page async for page in client.list_capacities("token", "sub-1")] == [[]]
+    assert len(requests) == 3
+    assert 7 <= clock.sleeps[0] < 8
+    assert 0.5 <= clock.sleeps[1] <= 2
+    assert transport.stats.throttled == 1
+    assert transport.stats.server_errors == 1
+    assert transport.stats.retries == 2
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries_and_never_retries_plain_posts():
+    clock = FakeClock()
+    transport, requests = make_transport([httpx.Response(503) for _ in range(10)], clock, max_retries=2)
+    client = AzureClient(transport=transport)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        async for _ in client.list_capacities("token", "sub-1"):
+            pass
+    assert len(requests) == 3
+
+    requests.clear()
+    async with httpx.AsyncClient(transport=transport) as http:
+        response = await http.post(SUBSCRIPTION_URL, json={})
+    assert response.status_code == 503
+    assert len(requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_buckets_pace_each_subscription_and_tenant():
+    clock = FakeClock()
+    transport, _ = make_transport(
+        [], clock, subscription_rate=10, subscription_burst=5, tenant_rate=100, tenant_burst=100
+    )
+    async with httpx.AsyncClient(transport=transport) as http:
+        for _ in range(15):
+            await http.get(SUBSCRIPTION_URL, headers={"Authorization": f"Bearer {jwt_for('tenant-a')}"})
+        # A different subscription has its own bucket and goes straight through
+        sleeps_before = len(clock.sleeps)
+        await http.get(SUBSCRIPTION_URL.replace("sub-1", "sub-2"))
+
+    assert clock.now == pytest.approx(1.0)
+    assert len(clock.sleeps) == sleeps_before
+    assert set(transport.buckets) == {
+        ("subscription", "management.azure.com", "sub-1"),
+        ("subscription", "management.azure.com", "sub-2"),
+        ("tenant", "tenant-a"),
+    }
+
+
+@pytest.mark.asyncio
+async def test_low_remaining_quota_header_slows_requests_down():
+    clock = FakeClock()
+    low = httpx.Response(200, json={"value": []}, headers={"x-ms-ratelimit-remaining-subscription-reads": "3"})
+    transport, _ = make_transport([low], clock, subscription_rate=10, remaining_reserve=5)
+    async with httpx.AsyncClient(transport=transport) as http:
+        await http.get(SUBSCRIPTION_URL)
+        await http.get(SUBSCRIPTION_URL)
+
+    # Three left against a reserve of five puts the bucket two tokens in debt, plus this request
+    assert clock.sleeps == [pytest.approx(0.3)]
+
+
+def test_header_parsing():
+    assert token_tenant(f"Bearer {jwt_for('tenant-a')}") == "tenant-a"
+    assert token_tenant("Bearer opaque") is None
+    assert retry_after_seconds(httpx.Response(429, headers={"Retry-After": "12"})) == 12
+    assert retry_after_seconds(httpx.Response(429, headers={"retry-after-ms": "1500"})) == 1.5
+    assert retry_after_seconds(httpx.Response(429)) is None
@@ -1,3 +1,4 @@
+import httpx
 import pytest
 from app.services.azure_client import AzureClient
 
@@ -8,3 +9,38 @@ async def test_azure_client_initialization():
     assert client.arm_endpoint == "https://management.azure.com"
     assert client.api_version == "2023-11-01"
     await client.close()
+
+
+def capacity_page_handler(pages: dict[str, dict]):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=pages[request.url.params.get("$skiptoken", "0")])
+
+    return handler
+
+
+@pytest.mark.asyncio
+async def test_list_capacities_follows_next_link():
+    next_url = "https://management.azure.com/subscriptions/sub/providers/Microsoft.Fabric/capacities?$skiptoken="
+    pages = {
+        "0": {"value": [{"id": "cap-1"}, {"id": "cap-2"}], "nextLink": next_url + "2"},
+        "2": {"value": [{"id": "cap-3"}], "nextLink": next_url + "3"},
+        "3": {"value": [{"id": "cap-4"}]},
+    }
+    client = AzureClient(transport=httpx.MockTransport(capacity_page_handler(pages)))
+
+    received = [[cap["id"] for cap in page] async for page in client.list_capacities("token", "sub")]
+    assert received == [["cap-1", "cap-2"], ["cap-3"], ["cap-4"]]
+    await client.close()
+
+
+@pytest.mark.asyncio
+async def test_list_capacities_refuses_next_link_to_another_host():
+    pages = {"0": {"value": [{"id": "cap-1"}], "nextLink": "https://attacker.example/steal?$skiptoken=1"}}
+    client = AzureClient(transport=httpx.MockTransport(capacity_page_handler(pages)))
+
+    pages_seen = []
+    with pytest.raises(ValueError):
+        async for page in client.list_capacities("token", "sub"):
+            pages_seen.append(page)
+    assert len(pages_seen) == 1
+    await client.close()
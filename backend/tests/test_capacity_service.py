@@ -0,0 +1,159 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from sqlalchemy import select
+from app.models.capacity import CapacitySnapshot
+from app.schemas.customer import CustomerCreate
+from app.services import customer_service, capacity_service
+
+
+def capacity_row(name: str, state: str = "Active", sku_name: str = "F2") -> dict:
+    return {
+        "azure_resource_id": f"/subscriptions/xxx/resourceGroups/rg1/providers/Microsoft.Fabric/capacities/{name}",
+        "display_name": name,
+        "sku_name": sku_name,
+        "sku_tier": "Fabric",
+        "location": "westeurope",
+        "state": state,
+    }
+
+
+async def create_test_customer(db_session, name: str):
+    return await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name=name,
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret",
+            subscription_id=str(uuid4()),
+        ),
+    )
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_capacities_inserts_then_updates(db_session):
+    customer = await create_test_customer(db_session, "Customer A")
+
+    inserted = await capacity_service.bulk_upsert_capacities(
+        db_session, customer.id, [capacity_row("cap1"), capacity_row("cap2")]
+    )
+    await db_session.commit()
+    assert {c.display_name for c in inserted} == {"cap1", "cap2"}
+
+    updated = await capacity_service.bulk_upsert_capacities(
+        db_session, customer.id, [capacity_row("cap1", state="Paused", sku_name="F4")]
+    )
+    await db_session.commit()
+    assert len(updated) == 1
+    assert updated[0].id == next(c.id for c in inserted if c.display_name == "cap1")
+    assert updated[0].state == "Paused"
+    assert updated[0].sku_name == "F4"
+
+    capacities = await capacity_service.get_capacities_by_customer(db_session, customer.id)
+    assert len(capacities) == 2
+
+
+@pytest.mark.asyncio
+async def test_bulk_upsert_capacities_skips_other_customers_rows(db_session):
+    customer1 = await create_test_customer(db_session, "Customer A")
+    customer2 = await create_test_customer(db_session, "Customer B")
+
+    await capacity_service.bulk_upsert_capacities(db_session, customer1.id, [capacity_row("cap1")])
+    await db_session.commit()
+
+    hijack = await capacity_service.bulk_upsert_capacities(
+        db_session, customer2.id, [capacity_row("cap1", state="Paused")]
+    )
+    await db_session.commit()
+    assert hijack == []
+
+    capacity = await capacity_service.get_capacity_by_name_and_customer(
+        db_session, customer1.id, "cap1"
+    )
+    assert capacity.state == "Active"
+
+
+@pytest.mark.asyncio
+async def test_create_snapshots_inserts_all_rows(db_session):
+    customer = await create_test_customer(db_session, "Customer A")
+    capacities = await capacity_service.bulk_upsert_capacities(
+        db_session, customer.id, [capacity_row("cap1"), capacity_row("cap2")]
+    )
+
+    stored = await capacity_service.create_snapshots(
+        db_session,
+        [{"capacity_id": c.id, "state": c.state, "sku_name": c.sku_name} for c in capacities],
+    )
+    await db_session.commit()
+    assert stored == 2
+
+    snapshots_query = await db_session.execute(select(CapacitySnapshot))
+    assert len(snapshots_query.scalars().all()) == 2
+
+
+async def count_snapshots(db_session) -> int:
+    snapshots_query = await db_session.execute(select(CapacitySnapshot))
+    return len(snapshots_query.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_sync_capacities_only_rewrites_changes_and_snapshots_transitions(db_session):
+    customer = await create_test_customer(db_session, "Customer A")
+    daily = timedelta(days=1)
+
+    first = await capacity_service.sync_capacities(
+        db_session, customer.id, [capacity_row("cap1"), capacity_row("cap2")], daily
+    )
+    await db_session.commit()
+    assert (first.changed, first.unchanged, first.snapshots) == (2, 0, 2)
+    synced_at = {c.id: c.last_synced_at for c in first.capacities}
+
+    repeat = await capacity_service.sync_capacities(
+        db_session, customer.id, [capacity_row("cap1"), capacity_row("cap2")], daily
+    )
+    await db_session.commit()
+    assert (repeat.changed, repeat.unchanged, repeat.snapshots) == (0, 2, 0)
+    assert all(c.last_synced_at > synced_at[c.id] for c in repeat.capacities)
+
+    renamed = capacity_row("cap2")
+    renamed["display_name"] = "cap2-renamed"
+    transition = await capacity_service.sync_capacities(
+        db_session, customer.id, [capacity_row("cap1", state="Paused"), renamed], daily
+    )
+    await db_session.commit()
+    assert (transition.changed, transition.unchanged, transition.snapshots) == (2, 0, 1)
+    assert transition.snapshot_capacity_ids == [c.id for c in transition.capacities if c.state == "Paused"]
+
+    keyframe = await capacity_service.sync_capacities(
+        db_session, customer.id, [capacity_row("cap1", state="Paused"), renamed], timedelta(0)
+    )
+    await db_session.commit()
+    assert (keyframe.changed, keyframe.unchanged, keyframe.snapshots) == (0, 2, 2)
+    assert {c.state for c in keyframe.capacities} == {"Paused", "Active"}
+    assert await count_snapshots(db_session) == 5
+
+
+@pytest.mark.asyncio
+async def test_snapshots_from_start_include_the_state_in_effect(db_session):
+    customer = await create_test_customer(db_session, "Customer A")
+    (capacity,) = await capacity_service.bulk_upsert_capacities(db_session, customer.id, [capacity_row("cap1")])
+    t0 = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    await capacity_service.create_snapshots(
+        db_session,
+        [
+            {"capacity_id": capacity.id, "collected_at": t0, "state": "Active", "sku_name": "F2"},
+            {"capacity_id": capacity.id, "collected_at": t0 + timedelta(hours=3), "state": "Paused", "sku_name": "F2"},
+        ],
+    )
+    await db_session.commit()
+
+    snapshots = await capacity_service.get_snapshots(
+        db_session, customer.id, capacity.id, t0 + timedelta(hours=1), None
+    )
+    assert [s.state for s in snapshots] == ["Paused", "Active"]
+
+    later = await capacity_service.get_snapshots(
+        db_session, customer.id, capacity.id, t0 + timedelta(hours=4), None
+    )
+    assert [s.state for s in later] == ["Paused"]
@@ -0,0 +1,275 @@
+import asyncio
+import time
+import httpx
+import pytest
+from types import SimpleNamespace
+from uuid import uuid4
+from structlog.testing import capture_logs
+from app.core.config import settings
+from app.schemas.customer import CustomerCreate
+from app.services import capacity_service, customer_service
+from app.services import collector as collector_module
+from app.services.azure_client import AzureClient
+from app.services.collector import CapacityCollector, prefetch
+from app.services.scheduler import CollectionResult, CollectionScheduler
+from app.services.telemetry import COLLECTOR_STAGES, registry
+from tests.conftest import TestSessionLocal
+
+ARM_LATENCY = 0.02
+DB_LATENCY = 0.02
+
+
+class FakeAzureClient:
+    async def get_token(self, tenant_id, client_id, client_secret):
+        await asyncio.sleep(ARM_LATENCY)
+        return "token"
+
+    async def list_capacities(self, token, subscription_id, resource_group=None):
+        await asyncio.sleep(ARM_LATENCY)
+        yield []
+
+    async def close(self):
+        pass
+
+
+class FakeKeyVault:
+    async def get_secret(self, name):
+        return SimpleNamespace(value="secret")
+
+
+class FakeSessionFactory:
+    def __init__(self):
+        self.open_sessions = 0
+        self.max_open_sessions = 0
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+class FakeSession:
+    def __init__(self, factory: FakeSessionFactory):
+        self.factory = factory
+
+    async def __aenter__(self):
+        self.factory.open_sessions += 1
+        self.factory.max_open_sessions = max(
+            self.factory.max_open_sessions, self.factory.open_sessions
+        )
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.factory.open_sessions -= 1
+
+    async def execute(self, statement):
+        await asyncio.sleep(DB_LATENCY)
+        return SimpleNamespace(scalar=lambda: None)
+
+    async def commit(self):
+        await asyncio.sleep(DB_LATENCY)
+
+
+def make_customers(count: int):
+    return [
+        SimpleNamespace(
+            id=uuid4(),
+            name=f"customer-{i}",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret_ref=f"customer-{i}-secret",
+            subscription_id=str(uuid4()),
+            resource_group=None,
+        )
+        for i in range(count)
+    ]
+
+
+async def timed_cycle(customer_count: int) -> tuple[float, FakeSessionFactory]:
+    session_factory = FakeSessionFactory()
+    collector = CapacityCollector(azure_client=FakeAzureClient(), session_factory=session_factory)
+    collector.kv_client = FakeKeyVault()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[collector.collect_with_limit(customer) for customer in make_customers(customer_count)])
+    return time.perf_counter() - started, session_factory
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("customer_count", [10, 50, 200])
+async def test_collection_cycle_uses_parallel_sessions(customer_count):
+    elapsed, session_factory = await timed_cycle(customer_count)
+
+    per_customer = 2 * ARM_LATENCY + 2 * DB_LATENCY
+    serialized_db = customer_count * 2 * DB_LATENCY
+
+    assert session_factory.open_sessions == 0
+    assert 1 < session_factory.max_open_sessions <= 10
+    assert elapsed < max(serialized_db / 2, per_customer * 3)
+
+
+async def slow_pages(count: int, delay: float):
+    for i in range(count):
+        await asyncio.sleep(delay)
+        yield [i]
+
+
+@pytest.mark.asyncio
+async def test_prefetch_overlaps_fetching_with_processing():
+    started = time.perf_counter()
+    received = []
+    async for page in prefetch(slow_pages(5, 0.05)):
+        received.extend(page)
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    assert received == [0, 1, 2, 3, 4]
+    # Serial fetch-then-write would take 0.5s; overlapped it is one fetch plus five writes
+    assert elapsed < 0.4
+
+
+class PagedAzureClient(FakeAzureClient):
+    def __init__(self, pages: int, per_page: int):
+        self.pages = pages
+        self.per_page = per_page
+
+    async def list_capacities(self, token, subscription_id, resource_group=None):
+        for page in range(self.pages):
+            await asyncio.sleep(ARM_LATENCY)
+            yield [
+                {
+                    "id": f"/subscriptions/{subscription_id}/providers/Microsoft.Fabric/capacities/cap-{page}-{i}",
+                    "name": f"cap-{page}-{i}",
+                    "sku": {"name": "F2", "tier": "Fabric"},
+                    "location": "westeurope",
+                    "properties": {"state": "Active"},
+                }
+                for i in range(self.per_page)
+            ]
+
+
+@pytest.mark.asyncio
+async def test_collector_stores_every_page(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "monitor_metrics_enabled", False)
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name="Customer A",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    collector = CapacityCollector(azure_client=PagedAzureClient(pages=3, per_page=4), session_factory=TestSessionLocal)
+    collector.kv_client = FakeKeyVault()
+
+    def stage_counts():
+        return {
+            stage: registry.get_sample_value("fabricmon_collector_stage_duration_seconds_count", {"stage": stage})
+            for stage in COLLECTOR_STAGES
+        }
+
+    before = stage_counts()
+    result = await collector.collect_for_customer(customer)
+    after = stage_counts()
+
+    assert result.success
+    assert len(result.capacity_states) == 12
+    assert {stage: after[stage] - before[stage] for stage in COLLECTOR_STAGES} == {
+        "secret": 1,
+        "token": 1,
+        "list_capacities": 3,
+        "upsert": 3,
+        "snapshot": 3,
+        "health": 1,
+        "monitor_metrics": 0,
+    }
+    capacities = await capacity_service.get_capacities_by_customer(db_session, customer.id)
+    assert len(capacities) == 12
+
+
+class HangingAzureClient(FakeAzureClient):
+    def __init__(self, hang_token: set, hang_second_page: set):
+        self.hang_token = hang_token
+        self.hang_second_page = hang_second_page
+
+    async def get_token(self, tenant_id, client_id, client_secret):
+        if tenant_id in self.hang_token:
+            await asyncio.sleep(30)
+        return "token"
+
+    async def list_capacities(self, token, subscription_id, resource_group=None):
+        yield []
+        if subscription_id in self.hang_second_page:
+            await asyncio.sleep(30)
+        yield []
+
+
+@pytest.mark.asyncio
+async def test_hanging_stages_are_cancelled_and_reported(monkeypatch):
+    monkeypatch.setattr(settings, "monitor_metrics_enabled", False)
+    monkeypatch.setattr(settings, "collector_stage_timeout_seconds", 0.1)
+    monkeypatch.setattr(settings, "collector_customer_budget_seconds", 0.3)
+    healthy, slow_token, slow_pages = make_customers(3)
+    collector = CapacityCollector(
+        azure_client=HangingAzureClient({slow_token.tenant_id}, {slow_pages.subscription_id}),
+        session_factory=FakeSessionFactory(),
+    )
+    collector.kv_client = FakeKeyVault()
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(collector.collect_with_limit(c) for c in (healthy, slow_token, slow_pages)))
+    elapsed = time.perf_counter() - started
+
+    assert [result.success for result in results] == [True, False, False]
+    assert elapsed < 1
+    report = collector.cycle_report.summary()
+    assert (report["collected"], report["failed"], report["timed_out"]) == (1, 2, 2)
+    assert report["late_customers"] == {str(slow_token.id): "token", str(slow_pages.id): "list_capacities"}
+
+
+@pytest.mark.asyncio
+async def test_stragglers_are_cancelled_at_the_budget_and_rescheduled(monkeypatch):
+    monkeypatch.setattr(settings, "collector_customer_budget_seconds", 0.05)
+    monkeypatch.setattr(collector_module, "STRAGGLER_GRACE_SECONDS", 0.01)
+    customers = make_customers(2)
+    straggler = customers[0]
+    azure_client = AzureClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+    collector = CapacityCollector(azure_client=azure_client, session_factory=FakeSessionFactory())
+    attempts = []
+    completed = []
+
+    async def load_customers():
+        return customers
+
+    async def collect_for_customer(customer):
+        attempts.append(customer.id)
+        if customer is straggler:
+            # Stuck outside any stage, so only the budget can stop it
+            await asyncio.sleep(30)
+        return CollectionResult(True)
+
+    collector.load_customers = load_customers
+    collector.collect_for_customer = collect_for_customer
+    scheduler = CollectionScheduler(
+        default_interval=0.1, fast_interval=0.1, max_backoff=0.1, jitter=0, startup_spread=0.01
+    )
+    complete = scheduler.complete
+
+    def record_complete(customer_id, result, now=None):
+        completed.append((customer_id, result))
+        return complete(customer_id, result, now)
+
+    scheduler.complete = record_complete
+    monkeypatch.setattr(settings, "collector_schedule_refresh_seconds", 0.2)
+
+    with capture_logs() as logs:
+        task = asyncio.create_task(collector.run_scheduled(scheduler))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    reported = [entry for entry in logs if entry["event"] == "collection_cycle_report"]
+
+    assert attempts.count(straggler.id) >= 2
+    assert (straggler.id, CollectionResult(False)) in completed
+    assert any(report["late_customers"] == {str(straggler.id): "budget"} for report in reported)
@@ -0,0 +1,102 @@
+import asyncio
+import pytest
+from app.services.credential_cache import CredentialCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def counting_loader(ttl: float):
+    calls = {"count": 0}
+
+    async def loader():
+        calls["count"] += 1
+        return f"value-{calls['count']}", ttl
+
+    return loader, calls
+
+
+@pytest.mark.asyncio
+async def test_hits_and_misses_are_counted():
+    cache = CredentialCache("test", clock=FakeClock())
+    loader, calls = counting_loader(ttl=3600)
+
+    assert await cache.get(("tenant", "client"), loader) == "value-1"
+    assert await cache.get(("tenant", "client"), loader) == "value-1"
+
+    assert calls["count"] == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.hits == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_cold_gets_load_once():
+    cache = CredentialCache("test", clock=FakeClock())
+    calls = {"count": 0}
+
+    async def slow_loader():
+        calls["count"] += 1
+        await asyncio.sleep(0.01)
+        return "token", 3600
+
+    results = await asyncio.gather(*[cache.get("key", slow_loader) for _ in range(10)])
+
+    assert results == ["token"] * 10
+    assert calls["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_entries_are_reloaded():
+    clock = FakeClock()
+    cache = CredentialCache("test", refresh_margin=0, clock=clock)
+    loader, calls = counting_loader(ttl=60)
+
+    await cache.get("key", loader)
+    clock.now += 61
+
+    assert await cache.get("key", loader) == "value-2"
+    assert cache.stats.misses == 2
+
+
+@pytest.mark.asyncio
+async def test_background_refresh_before_expiry():
+    clock = FakeClock()
+    cache = CredentialCache("test", refresh_margin=300, clock=clock)
+    loader, calls = counting_loader(ttl=3600)
+
+    await cache.get("key", loader)
+    clock.now += 3400
+
+    # Inside the refresh margin the cached value is served while the reload runs
+    assert await cache.get("key", loader) == "value-1"
+    await asyncio.sleep(0)
+    await asyncio.sleep(0)
+
+    assert await cache.get("key", loader) == "value-2"
+    assert cache.stats.refreshes == 1
+    assert cache.stats.misses == 1
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_lru_eviction_and_invalidation():
+    cache = CredentialCache("test", max_entries=2, clock=FakeClock())
+    loader, _ = counting_loader(ttl=3600)
+
+    await cache.get("a", loader)
+    await cache.get("b", loader)
+    await cache.get("a", loader)
+    await cache.get("c", loader)
+
+    assert len(cache) == 2
+    assert cache.stats.evictions == 1
+
+    cache.invalidate("a")
+    await cache.get("a", loader)
+    assert cache.stats.invalidations == 1
+    assert cache.stats.misses == 4
@@ -1,6 +1,14 @@
 import pytest
-from app.schemas.customer import CustomerCreate
+from datetime import datetime, timezone
+from uuid import uuid4
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from app.core.config import settings
+from app.main import app
+from app.schemas.customer import CustomerCreate, CustomerListResponse
 from app.services import customer_service
+from app.services.pagination import encode_cursor, split_page
 
 
 @pytest.mark.asyncio
@@ -36,3 +44,99 @@ async def test_list_customers(db_session):
     customers = await customer_service.list_customers(db_session)
     assert len(customers) == 1
     assert customers[0].name == "Test Customer"
+
+
+async def create_fleet(db_session, statuses: list[str]):
+    customers = []
+    for i, status in enumerate(statuses):
+        customer = await customer_service.create_customer(
+            db_session,
+            CustomerCreate(
+                name=f"Customer {i:02d}",
+                tenant_id=str(uuid4()),
+                client_id=str(uuid4()),
+                client_secret="test-secret",
+                subscription_id=str(uuid4()),
+            ),
+        )
+        customer.health_status = status
+        customer.consecutive_failures = 0 if status == "healthy" else 3
+        customers.append(customer)
+    customers[-1].is_active = False
+    await db_session.commit()
+    return customers
+
+
+@pytest.mark.asyncio
+async def test_customer_pages_follow_cursor_and_filters(db_session):
+    customers = await create_fleet(db_session, ["healthy"] * 5 + ["degraded", "critical", "critical"])
+
+    seen, cursor = [], None
+    while True:
+        rows = await customer_service.list_customer_page(db_session, cursor=cursor, limit=4)
+        page, cursor = split_page(rows, 3, time_attr="created_at")
+        seen.extend(row.id for row in page)
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(customer.id for customer in customers)
+    assert len(seen) == len(set(seen))
+
+    critical = await customer_service.list_customer_page(
+        db_session, active_only=True, health_status=["critical"]
+    )
+    assert [row.id for row in critical] == [customers[6].id]
+    assert set(critical[0]._fields) == set(CustomerListResponse.model_fields)
+
+    search = await customer_service.list_customer_page(db_session, search="customer 0_")
+    assert search == []
+
+
+@pytest.mark.asyncio
+async def test_health_summary_counts_in_sql(db_session):
+    await create_fleet(db_session, ["healthy", "healthy", "degraded", "critical", "critical"])
+
+    summary = await customer_service.get_health_summary(db_session)
+
+    assert (summary["total_customers"], summary["healthy"], summary["degraded"], summary["critical"]) == (4, 2, 1, 1)
+    assert [c["health_status"] for c in summary["customers_by_status"]] == ["critical", "degraded"]
+
+    await db_session.execute(text("SET LOCAL enable_seqscan = off"))
+    plan_query = await db_session.execute(
+        text("EXPLAIN " + str(
+            customer_service.customer_page_statement(health_status=["degraded"], limit=10).compile(
+                dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+            )
+        ))
+    )
+    assert "ix_customers_unhealthy" in "\n".join(plan_query.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_customer_list_endpoint_pages(db_session, override_get_db):
+    await create_fleet(db_session, ["healthy", "degraded", "critical"])
+    headers = {"X-Admin-Key": settings.admin_api_key}
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        first = await client.get("/api/customers", params={"limit": 2}, headers=headers)
+        assert first.status_code == 200
+        assert len(first.json()) == 2
+
+        rest = await client.get(
+            "/api/customers", params={"limit": 2, "cursor": first.headers["X-Next-Cursor"]}, headers=headers
+        )
+        assert len(rest.json()) == 1
+        assert "X-Next-Cursor" not in rest.headers
+
+        unhealthy = await client.get(
+            "/api/customers", params={"health_status": ["degraded", "critical"]}, headers=headers
+        )
+        assert {c["health_status"] for c in unhealthy.json()} == {"degraded", "critical"}
+
+        invalid = await client.get("/api/customers", params={"cursor": "nope"}, headers=headers)
+        assert invalid.status_code == 400
+
+        # Customer ids are UUIDs, so a cursor carrying an integer id is rejected rather than failing
+        int_id = await client.get(
+            "/api/customers", params={"cursor": encode_cursor(datetime.now(timezone.utc), 1)}, headers=headers
+        )
+        assert int_id.status_code == 400
@@ -1,8 +1,8 @@
 import pytest
 from uuid import uuid4
-from datetime import datetime
+from datetime import datetime, timezone
 from app.schemas.customer import CustomerCreate
-from app.services import customer_service, capacity_service
+from app.services import customer_service, capacity_service, metric_service
 from app.models.capacity import CapacitySnapshot
 from app.models.metric import CapacityMetric
 
@@ -106,46 +106,27 @@ async def test_metrics_customer_isolation(db_session):
         "Active",
     )
 
-    metric1 = CapacityMetric(
-        customer_id=customer1.id,
-        capacity_id=capacity1.id,
-        collected_at=datetime.utcnow(),
-        metric_name="CPU",
-        metric_value=75.5,
-        aggregation_type="Average",
-    )
-    db_session.add(metric1)
-
-    metric2 = CapacityMetric(
-        customer_id=customer2.id,
-        capacity_id=capacity2.id,
-        collected_at=datetime.utcnow(),
-        metric_name="Memory",
-        metric_value=80.0,
-        aggregation_type="Average",
+    collected_at = datetime.now(timezone.utc)
+    await metric_service.bulk_insert_metrics(
+        db_session,
+        [
+            (customer1.id, capacity1.id, collected_at, "CPU", 75.5, "Average"),
+            (customer2.id, capacity2.id, collected_at, "Memory", 80.0, "Average"),
+        ],
     )
-    db_session.add(metric2)
 
     await db_session.commit()
 
-    from sqlalchemy import select
-    from app.models.metric import CapacityMetric
-
-    query1 = select(CapacityMetric).where(
-        CapacityMetric.customer_id == customer1.id,
-        CapacityMetric.capacity_id == capacity1.id,
+    metrics1 = await metric_service.get_capacity_metrics(
+        db_session, customer1.id, capacity1.id, None, None, None
     )
-    result1 = await db_session.execute(query1)
-    metrics1 = result1.scalars().all()
     assert len(metrics1) == 1
     assert metrics1[0].metric_name == "CPU"
+    assert metrics1[0].customer_id == customer1.id
 
-    query2 = select(CapacityMetric).where(
-        CapacityMetric.customer_id == customer1.id,
-        CapacityMetric.capacity_id == capacity2.id,
+    metrics2 = await metric_service.get_capacity_metrics(
+        db_session, customer1.id, capacity2.id, None, None, None
     )
-    result2 = await db_session.execute(query2)
-    metrics2 = result2.scalars().all()
     assert len(metrics2) == 0
 
 
@@ -230,15 +211,9 @@ async def test_cascading_delete_customer_data(db_session):
 
     await capacity_service.create_snapshot(db_session, capacity.id, "Active", "F2")
 
-    metric = CapacityMetric(
-        customer_id=customer.id,
-        capacity_id=capacity.id,
-        collected_at=datetime.utcnow(),
-        metric_name="CPU",
-        metric_value=75.5,
-        aggregation_type="Average",
+    await metric_service.bulk_insert_metrics(
+        db_session, [(customer.id, capacity.id, datetime.now(timezone.utc), "CPU", 75.5, "Average")]
     )
-    db_session.add(metric)
     await db_session.commit()
 
     from sqlalchemy import select, delete
@@ -256,7 +231,7 @@ async def test_cascading_delete_customer_data(db_session):
 
     from app.models.metric import CapacityMetric
     metric_query = await db_session.execute(
-        select(CapacityMetric).where(CapacityMetric.customer_id == customer.id)
+        select(CapacityMetric).where(CapacityMetric.capacity_id == capacity.id)
     )
     metrics = metric_query.scalars().all()
     assert len(metrics) == 0
@@ -0,0 +1,130 @@
+import pytest
+from datetime import datetime, timezone
+from uuid import uuid4
+from httpx import AsyncClient
+from sqlalchemy import event
+from app.core.config import settings
+from app.main import app
+from app.schemas.customer import CustomerCreate
+from app.services import customer_service, capacity_service
+from app.services.customer_service import hash_ingest_key, ingest_key_cache
+from app.services.response_cache import RedisResponseCacheBackend, response_cache
+from tests.conftest import engine
+from tests.test_response_cache import LocalRedis
+
+
+async def create_customer_with_capacity(db_session):
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name="Customer A",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret-a",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    await capacity_service.upsert_capacity(
+        db_session,
+        customer.id,
+        "/subscriptions/xxx/resourceGroups/rg1/providers/Microsoft.Fabric/capacities/cap1",
+        "Capacity 1",
+        "F2",
+        "Standard",
+        "eastus",
+        "Active",
+    )
+    return customer
+
+
+def ingest_payload():
+    return {
+        "capacity_name": "Capacity 1",
+        "collected_at": datetime.now(timezone.utc).isoformat(),
+        "metrics": [{"name": "CPU", "value": 50.0}],
+    }
+
+
+def count_customer_lookups():
+    lookups = {"count": 0}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if "customers.ingest_key =" in statement:
+            lookups["count"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    return lookups, lambda: event.remove(
+        engine.sync_engine, "before_cursor_execute", before_cursor_execute
+    )
+
+
+@pytest.mark.asyncio
+async def test_cache_holds_hashed_keys_only(db_session):
+    customer = await create_customer_with_capacity(db_session)
+
+    identity = await customer_service.authenticate_ingest_key(db_session, customer.ingest_key)
+
+    assert identity == (customer.id, True)
+    assert hash_ingest_key(customer.ingest_key) in ingest_key_cache._entries
+    assert customer.ingest_key not in ingest_key_cache._entries
+    assert ingest_key_cache._entries[hash_ingest_key(customer.ingest_key)].loader is None
+
+
+@pytest.mark.asyncio
+async def test_ingest_key_lookups_are_cached_and_invalidated(db_session, override_get_db):
+    customer = await create_customer_with_capacity(db_session)
+    lookups, stop_counting = count_customer_lookups()
+    admin_headers = {"X-Admin-Key": settings.admin_api_key}
+
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            for _ in range(3):
+                response = await client.post(
+                    "/api/ingest",
+                    json=ingest_payload(),
+                    headers={"X-Ingest-Key": customer.ingest_key},
+                )
+                assert response.status_code == 202
+            assert lookups["count"] == 1
+
+            for _ in range(3):
+                response = await client.post(
+                    "/api/ingest", json=ingest_payload(), headers={"X-Ingest-Key": "not-a-key"}
+                )
+                assert response.status_code == 401
+            assert lookups["count"] == 2
+
+            old_key = customer.ingest_key
+            rotated = await client.post(
+                f"/api/customers/{customer.id}/ingest-key", headers=admin_headers
+            )
+            new_key = rotated.json()["ingest_key"]
+            assert new_key != old_key
+
+            response = await client.post(
+                "/api/ingest", json=ingest_payload(), headers={"X-Ingest-Key": old_key}
+            )
+            assert response.status_code == 401
+
+            await client.delete(f"/api/customers/{customer.id}", headers=admin_headers)
+            response = await client.post(
+                "/api/ingest", json=ingest_payload(), headers={"X-Ingest-Key": new_key}
+            )
+            assert response.status_code == 403
+    finally:
+        stop_counting()
+
+
+@pytest.mark.asyncio
+async def test_revocation_on_another_replica_reaches_cached_keys(db_session, monkeypatch):
+    monkeypatch.setattr(response_cache, "backend", RedisResponseCacheBackend(LocalRedis()))
+    customer = await create_customer_with_capacity(db_session)
+    assert await customer_service.authenticate_ingest_key(db_session, customer.ingest_key) == (customer.id, True)
+
+    # Another replica handles the deactivation, so only the shared tag tells this one
+    invalidate = ingest_key_cache.invalidate
+    monkeypatch.setattr(ingest_key_cache, "invalidate", lambda key: None)
+    await customer_service.deactivate_customer(db_session, customer.id)
+    monkeypatch.setattr(ingest_key_cache, "invalidate", invalidate)
+
+    assert await customer_service.authenticate_ingest_key(db_session, customer.ingest_key) == (customer.id, False)
@@ -0,0 +1,254 @@
+import gzip
+import json
+import pytest
+from uuid import uuid4
+from httpx import AsyncClient
+from pydantic import ValidationError
+from datetime import datetime, timezone
+from sqlalchemy import func, select, text
+from structlog.testing import capture_logs
+from app.core.config import settings
+from app.main import app
+from app.models.capacity import Capacity
+from app.models.metric import CapacityMetric, MetricDefinition
+from app.schemas.customer import CustomerCreate
+from app.services import customer_service, capacity_service
+from app.services.metric_service import (
+    BatchPayloadError,
+    BatchPayloadTooLargeError,
+    bulk_insert_metrics,
+    decompress_body,
+    get_capacity_metrics,
+    read_body,
+    metric_definition_ids,
+    parse_batch_body,
+)
+
+
+def make_entry(capacity_name: str, count: int = 2) -> dict:
+    return {
+        "capacity_name": capacity_name,
+        "metrics": [{"name": f"m{i}", "value": float(i)} for i in range(count)],
+    }
+
+
+def test_parse_batch_body_json_and_ndjson_are_equivalent():
+    entries = [make_entry("cap-a"), make_entry("cap-b", 3)]
+
+    from_json = parse_batch_body(json.dumps({"capacities": entries}).encode(), "application/json")
+    ndjson_body = "\n".join(json.dumps(entry) for entry in entries).encode() + b"\n"
+    from_ndjson = parse_batch_body(ndjson_body, "application/x-ndjson; charset=utf-8")
+
+    assert from_json == from_ndjson
+    assert [len(entry.metrics) for entry in from_ndjson.capacities] == [2, 3]
+
+
+def test_parse_batch_body_rejects_bad_input():
+    with pytest.raises(BatchPayloadError):
+        parse_batch_body(b"{}", "text/csv")
+    with pytest.raises(ValidationError):
+        parse_batch_body(b"", "application/x-ndjson")
+    with pytest.raises(ValidationError):
+        parse_batch_body(b"{not json", "application/json")
+    for metric in ({"name": "CPU\x00", "value": 1.0}, {"name": "CPU", "value": 1.0, "aggregation": "A" * 21}):
+        with pytest.raises(ValidationError):
+            parse_batch_body(json.dumps({"capacities": [{"capacity_name": "cap-a", "metrics": [metric]}]}).encode(), "application/json")
+
+
+def test_decompress_body_gzip_and_limits():
+    raw = json.dumps({"capacities": [make_entry("cap-a")]}).encode()
+
+    assert decompress_body(gzip.compress(raw), "gzip", 1024) == raw
+    assert decompress_body(raw, None, 1024) == raw
+
+    with pytest.raises(BatchPayloadTooLargeError):
+        decompress_body(gzip.compress(b"0" * 10_000), "gzip", 1024)
+    with pytest.raises(BatchPayloadError):
+        decompress_body(b"not gzip", "gzip", 1024)
+    with pytest.raises(BatchPayloadError):
+        decompress_body(raw, "br", 1024)
+
+
+@pytest.mark.asyncio
+async def test_read_body_stops_at_the_limit():
+    consumed = []
+
+    async def chunks():
+        for i in range(100):
+            consumed.append(i)
+            yield b"0" * 256
+
+    assert await read_body(chunks(), None, 100 * 256) == b"0" * 100 * 256
+
+    consumed.clear()
+    with pytest.raises(BatchPayloadTooLargeError):
+        await read_body(chunks(), None, 1024)
+    assert len(consumed) == 5
+
+    consumed.clear()
+    with pytest.raises(BatchPayloadTooLargeError):
+        await read_body(chunks(), "2048", 1024)
+    assert consumed == []
+
+
+@pytest.mark.asyncio
+async def test_batch_ingest_writes_all_capacities(db_session, override_get_db, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_max_batch_bytes", 4096)
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name="Customer A",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret-a",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    for name in ("cap-a", "cap-b"):
+        await capacity_service.upsert_capacity(
+            db_session,
+            customer.id,
+            f"/subscriptions/xxx/resourceGroups/rg1/providers/Microsoft.Fabric/capacities/{name}",
+            name,
+            "F2",
+            "Standard",
+            "eastus",
+            "Active",
+        )
+
+    body = "\n".join(json.dumps(make_entry(name, 5)) for name in ("cap-a", "cap-b")).encode()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/api/ingest/batch",
+            content=gzip.compress(body),
+            headers={
+                "X-Ingest-Key": customer.ingest_key,
+                "Content-Type": "application/x-ndjson",
+                "Content-Encoding": "gzip",
+            },
+        )
+        assert response.status_code == 202
+        assert response.json()["metrics_stored"] == 10
+
+        response_missing = await client.post(
+            "/api/ingest/batch",
+            json={"capacities": [make_entry("cap-a"), make_entry("unknown")]},
+            headers={"X-Ingest-Key": customer.ingest_key},
+        )
+        assert response_missing.status_code == 404
+        assert "unknown" in response_missing.json()["detail"]
+
+        async def chunked_body():
+            for _ in range(100):
+                yield b" " * 1024
+
+        response_too_large = await client.post(
+            "/api/ingest/batch",
+            content=chunked_body(),
+            headers={"X-Ingest-Key": customer.ingest_key, "Content-Type": "application/json"},
+        )
+        assert response_too_large.status_code == 413
+
+    metrics_query = await db_session.execute(
+        select(CapacityMetric).join(CapacityMetric.capacity).where(Capacity.customer_id == customer.id)
+    )
+    assert len(metrics_query.scalars().all()) == 10
+
+
+@pytest.mark.asyncio
+async def test_batch_ingest_caps_new_metric_definitions(db_session, override_get_db, monkeypatch):
+    monkeypatch.setattr(settings, "ingest_max_new_metric_definitions", 3)
+    monkeypatch.setattr(settings, "metric_definition_ids_warn_ratio", 0.0)
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name="Customer A",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    await capacity_service.upsert_capacity(
+        db_session, customer.id, "/subscriptions/xxx/capacities/cap-a", "cap-a", "F2", "Standard", "eastus", "Active"
+    )
+    headers = {"X-Ingest-Key": customer.ingest_key}
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/ingest/batch", json={"capacities": [make_entry("cap-a", 4)]}, headers=headers)
+        assert response.status_code == 422
+        assert "4 new metric definitions" in response.json()["detail"]
+
+        with capture_logs() as logs:
+            response = await client.post(
+                "/api/ingest/batch", json={"capacities": [make_entry("cap-a", 2)]}, headers=headers
+            )
+        assert response.status_code == 202
+        assert any(log["event"] == "metric_definition_ids_filling" for log in logs)
+
+        # Only definitions missing from the table count, not ones this process has yet to see
+        metric_definition_ids.clear()
+        response = await client.post("/api/ingest/batch", json={"capacities": [make_entry("cap-a", 5)]}, headers=headers)
+        assert response.status_code == 202
+
+        await db_session.execute(text("ALTER TABLE metric_definitions ALTER COLUMN id RESTART WITH 32767"))
+        await db_session.commit()
+        entry = {"capacity_name": "cap-a", "metrics": [{"name": "x1", "value": 1.0}, {"name": "x2", "value": 2.0}]}
+        response = await client.post("/api/ingest/batch", json={"capacities": [entry]}, headers=headers)
+        assert response.status_code == 422
+        assert response.json()["detail"] == "No metric definition ids are left"
+
+    definitions_query = await db_session.execute(select(func.count()).select_from(MetricDefinition))
+    assert definitions_query.scalar() == 5
+
+
+@pytest.mark.asyncio
+async def test_metric_definitions_are_shared_and_outlive_rollback(db_session):
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name="Customer A",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    capacity = await capacity_service.upsert_capacity(
+        db_session, customer.id, "/subscriptions/xxx/capacities/cap-a", "cap-a", "F2", "Standard", "eastus", "Active"
+    )
+    customer_id, capacity_id = customer.id, capacity.id
+    await db_session.commit()
+    collected_at = datetime.now(timezone.utc)
+
+    # The definition outlives the rolled back insert, so the remembered id stays valid
+    await bulk_insert_metrics(db_session, [(customer_id, capacity_id, collected_at, "CPU", 1.0, "Average")])
+    await db_session.rollback()
+    assert set(metric_definition_ids) == {("CPU", "Average")}
+    # COPY is the first statement of that transaction, and still goes away with it
+    metrics_query = await db_session.execute(select(func.count()).select_from(CapacityMetric))
+    assert metrics_query.scalar() == 0
+
+    for value in (1.0, 2.0):
+        await bulk_insert_metrics(
+            db_session,
+            [
+                (customer_id, capacity_id, collected_at, "CPU", value, "Average"),
+                (customer_id, capacity_id, collected_at, "CPU", value, "Maximum"),
+                (customer_id, capacity_id, collected_at, "CPU", value, None),
+            ],
+        )
+        await db_session.commit()
+
+    definitions_query = await db_session.execute(select(func.count()).select_from(MetricDefinition))
+    assert definitions_query.scalar() == 3
+    assert set(metric_definition_ids) == {("CPU", "Average"), ("CPU", "Maximum"), ("CPU", None)}
+
+    metrics = await get_capacity_metrics(db_session, customer_id, capacity_id, None, None, "CPU")
+    assert len(metrics) == 6
+    assert {(metric.customer_id, metric.aggregation_type) for metric in metrics} == {
+        (customer_id, "Average"),
+        (customer_id, "Maximum"),
+        (customer_id, None),
+    }
@@ -0,0 +1,115 @@
+import pytest
+from datetime import datetime, timezone
+from uuid import uuid4
+from httpx import AsyncClient
+from sqlalchemy import func, select
+from app.api.dependencies import get_ingest_queue
+from app.main import app
+from app.models.metric import CapacityMetric
+from app.schemas.customer import CustomerCreate
+from app.services import customer_service, capacity_service
+from app.services.ingest_queue import IngestQueue, IngestQueueFullError
+from tests.conftest import TestSessionLocal
+
+
+class FailingSessionFactory:
+    def __call__(self):
+        raise ConnectionError("database unavailable")
+
+
+def make_records(count: int, customer_id=None, capacity_id=None):
+    collected_at = datetime.now(timezone.utc)
+    return [
+        (customer_id or uuid4(), capacity_id or uuid4(), collected_at, "CPU", float(i), None)
+        for i in range(count)
+    ]
+
+
+async def count_metrics(db_session) -> int:
+    count_query = await db_session.execute(select(func.count()).select_from(CapacityMetric))
+    return count_query.scalar()
+
+
+async def create_customer_with_capacity(db_session):
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name="Customer A",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret-a",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    capacity = await capacity_service.upsert_capacity(
+        db_session,
+        customer.id,
+        "/subscriptions/xxx/resourceGroups/rg1/providers/Microsoft.Fabric/capacities/cap1",
+        "Capacity 1",
+        "F2",
+        "Standard",
+        "eastus",
+        "Active",
+    )
+    return customer, capacity
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_rows_queued_in_order():
+    queue = IngestQueue(session_factory=FailingSessionFactory(), max_rows=10, flush_rows=4)
+    first, second = make_records(3), make_records(3)
+    queue.submit(first)
+    queue.submit(second)
+
+    assert await queue.flush() == 0
+    assert queue.depth == 6
+    assert queue.stats.flush_failures == 1
+    assert list(queue._pending) == [first, second]
+
+    with pytest.raises(IngestQueueFullError):
+        queue.submit(make_records(5))
+    assert queue.stats.rejected_rows == 5
+
+
+@pytest.mark.asyncio
+async def test_flush_drops_only_payloads_the_database_rejects(db_session):
+    customer, capacity = await create_customer_with_capacity(db_session)
+    queue = IngestQueue(session_factory=TestSessionLocal)
+    queue.submit(make_records(3, customer.id, capacity.id))
+    queue.submit(make_records(2, customer.id, uuid4()))
+    # Content the columns reject fails the same way on every retry
+    queue.submit([(customer.id, capacity.id, datetime.now(timezone.utc), "CPU", 1.0, "A" * 30)])
+    queue.submit([(customer.id, capacity.id, datetime.now(timezone.utc), "CPU\x00", 1.0, None)])
+
+    assert await queue.flush() == 3
+    assert queue.depth == 0
+    assert queue.stats.dropped_rows == 4
+    assert await count_metrics(db_session) == 3
+
+
+@pytest.mark.asyncio
+async def test_ingest_returns_before_flush_and_applies_backpressure(db_session, override_get_db):
+    customer, _ = await create_customer_with_capacity(db_session)
+    queue = IngestQueue(session_factory=TestSessionLocal, max_rows=3, flush_rows=100)
+    app.dependency_overrides[get_ingest_queue] = lambda: queue
+
+    payload = {
+        "capacity_name": "Capacity 1",
+        "collected_at": datetime.now(timezone.utc).isoformat(),
+        "metrics": [{"name": "CPU", "value": 50.0}, {"name": "Memory", "value": 20.0}],
+    }
+    headers = {"X-Ingest-Key": customer.ingest_key}
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/ingest", json=payload, headers=headers)
+        assert response.status_code == 202
+        assert response.json()["metrics_queued"] == 2
+        assert await count_metrics(db_session) == 0
+
+        response = await client.post("/api/ingest", json=payload, headers=headers)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "5"
+
+    assert await queue.flush() == 2
+    assert await count_metrics(db_session) == 2
+    assert queue.snapshot()["flushes"] == 1
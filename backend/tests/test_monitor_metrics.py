@@ -0,0 +1,136 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import uuid4
+from app.services.monitor_metrics import MonitorMetricPuller, floor_to_interval, monitor_region
+
+NOW = datetime(2026, 3, 1, 12, 7, 30, tzinfo=timezone.utc)
+
+
+class FakeAzureClient:
+    def __init__(self):
+        self.definition_calls = 0
+        self.batch_calls = []
+
+    async def get_metric_definitions(self, token, resource_id):
+        self.definition_calls += 1
+        return [{"name": {"value": "cpu_percent"}, "primaryAggregationType": "Average"}]
+
+    async def get_metrics_batch(self, token, subscription_id, region, resource_ids, metric_names,
+                                aggregations, starttime, endtime, interval):
+        self.batch_calls.append((region, resource_ids, starttime, endtime))
+        start = datetime.fromisoformat(starttime.replace("Z", "+00:00"))
+        end = datetime.fromisoformat(endtime.replace("Z", "+00:00"))
+        values = []
+        for resource_id in resource_ids:
+            data = []
+            timestamp = start
+            while timestamp < end:
+                data.append({"timeStamp": timestamp.isoformat().replace("+00:00", "Z"), "average": 42.0})
+                timestamp += timedelta(minutes=5)
+            values.append({
+                "resourceid": resource_id,
+                "value": [{"name": {"value": "cpu_percent"}, "timeseries": [{"data": data}]}],
+            })
+        return values
+
+
+class LateAzureClient(FakeAzureClient):
+    # Publishes each bucket publish_delay after it closes
+    def __init__(self, publish_delay: timedelta):
+        super().__init__()
+        self.publish_delay = publish_delay
+        self.now = NOW
+
+    async def get_metrics_batch(self, *args):
+        values = await super().get_metrics_batch(*args)
+        for resource in values:
+            for metric in resource["value"]:
+                for series in metric["timeseries"]:
+                    series["data"] = [
+                        point
+                        for point in series["data"]
+                        if datetime.fromisoformat(point["timeStamp"].replace("Z", "+00:00"))
+                        + timedelta(minutes=5)
+                        + self.publish_delay
+                        <= self.now
+                    ]
+        return values
+
+
+def make_capacity(name: str, location: str, synced_through=None):
+    return SimpleNamespace(
+        id=uuid4(),
+        customer_id=uuid4(),
+        azure_resource_id=f"/subscriptions/sub/resourceGroups/rg/providers/Microsoft.Fabric/capacities/{name}",
+        location=location,
+        metrics_synced_through=synced_through,
+    )
+
+
+def test_interval_and_region_helpers():
+    assert floor_to_interval(NOW, 5) == datetime(2026, 3, 1, 12, 5, tzinfo=timezone.utc)
+    assert monitor_region("West Europe") == "westeurope"
+    assert monitor_region(None) is None
+
+
+@pytest.mark.asyncio
+async def test_pull_batches_by_region_and_respects_watermarks():
+    client = FakeAzureClient()
+    puller = MonitorMetricPuller(client, lookback_minutes=60, batch_size=2, latency_minutes=0)
+    fresh = make_capacity("fresh", "westeurope")
+    caught_up = make_capacity("caught-up", "West Europe", NOW - timedelta(minutes=17, seconds=30))
+    other_region = make_capacity("other", "northeurope")
+    third_we = make_capacity("third", "westeurope")
+
+    batches = [
+        batch
+        async for batch in puller.pull(
+            "arm", "monitor", "sub", [fresh, caught_up, other_region, third_we], now=NOW
+        )
+    ]
+
+    assert sorted(call[0] for call in client.batch_calls) == ["northeurope", "westeurope", "westeurope"]
+    assert all(batch.synced_through == datetime(2026, 3, 1, 12, 5, tzinfo=timezone.utc) for batch in batches)
+
+    points_by_capacity = {}
+    for batch in batches:
+        for record in batch.records:
+            points_by_capacity[record[1]] = points_by_capacity.get(record[1], 0) + 1
+
+    assert points_by_capacity[fresh.id] == 12
+    assert points_by_capacity[caught_up.id] == 3
+    assert points_by_capacity[other_region.id] == 12
+
+
+@pytest.mark.asyncio
+async def test_definitions_are_cached_per_resource():
+    client = FakeAzureClient()
+    puller = MonitorMetricPuller(client)
+    capacity = make_capacity("cap", "westeurope")
+
+    for _ in range(3):
+        async for _batch in puller.pull("arm", "monitor", "sub", [capacity], now=NOW):
+            pass
+
+    assert client.definition_calls == 1
+    assert len(client.batch_calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_points_published_after_the_bucket_closes_are_not_skipped():
+    client = LateAzureClient(publish_delay=timedelta(minutes=3))
+    puller = MonitorMetricPuller(client, lookback_minutes=60, latency_minutes=5)
+    capacity = make_capacity("cap", "westeurope")
+
+    timestamps = []
+    for now in (datetime(2026, 3, 1, 12, 6, tzinfo=timezone.utc), datetime(2026, 3, 1, 12, 20, tzinfo=timezone.utc)):
+        client.now = now
+        async for batch in puller.pull("arm", "monitor", "sub", [capacity], now=now):
+            timestamps.extend(record[2] for record in batch.records)
+            capacity.metrics_synced_through = batch.synced_through
+
+    # The 12:00 bucket is not out yet at 12:06, so the first pull stops before it and the next one fetches it
+    assert capacity.metrics_synced_through == datetime(2026, 3, 1, 12, 15, tzinfo=timezone.utc)
+    expected = [datetime(2026, 3, 1, 11, 0, tzinfo=timezone.utc) + timedelta(minutes=5 * i) for i in range(15)]
+    assert sorted(timestamps) == expected
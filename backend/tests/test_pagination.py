@@ -0,0 +1,101 @@
+import json
+import pytest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from uuid import UUID, uuid4
+from httpx import AsyncClient
+from app.db.session import get_session_factory
+from app.main import app
+from app.schemas.customer import CustomerCreate
+from app.services import customer_service, capacity_service
+from app.services.metric_service import bulk_insert_metrics
+from app.services.pagination import InvalidCursorError, decode_cursor, encode_cursor, split_page
+from tests.conftest import TestSessionLocal
+
+
+def test_cursor_round_trip():
+    collected_at = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    cursor = encode_cursor(collected_at, 42)
+
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (collected_at, 42)
+
+    with pytest.raises(InvalidCursorError):
+        decode_cursor("not-a-cursor")
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, UUID)
+    row_id = uuid4()
+    assert decode_cursor(encode_cursor(collected_at, row_id), UUID) == (collected_at, row_id)
+
+
+def test_split_page_only_emits_cursor_when_more_rows_exist():
+    now = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    rows = [SimpleNamespace(id=i, collected_at=now - timedelta(minutes=i)) for i in range(3)]
+
+    page, next_cursor = split_page(rows, 3)
+    assert page == rows and next_cursor is None
+
+    page, next_cursor = split_page(rows, 2)
+    assert page == rows[:2]
+    assert decode_cursor(next_cursor) == (rows[1].collected_at, 1)
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_pages_and_streams(db_session, override_get_db):
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name="Customer A",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret-a",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    capacity = await capacity_service.upsert_capacity(
+        db_session,
+        customer.id,
+        "/subscriptions/xxx/resourceGroups/rg1/providers/Microsoft.Fabric/capacities/cap1",
+        "Capacity 1",
+        "F2",
+        "Standard",
+        "eastus",
+        "Active",
+    )
+    collected_at = datetime.now(timezone.utc)
+    # Five rows share a timestamp so paging has to fall back to the id tiebreaker
+    await bulk_insert_metrics(
+        db_session,
+        [
+            (customer.id, capacity.id, collected_at - timedelta(minutes=i // 2), "CPU", float(i), None)
+            for i in range(5)
+        ],
+    )
+    await db_session.commit()
+
+    app.dependency_overrides[get_session_factory] = lambda: TestSessionLocal
+    url = f"/api/customers/{customer.id}/capacities/{capacity.id}/metrics"
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        seen = []
+        params = {"limit": 2}
+        while True:
+            response = await client.get(url, params=params)
+            assert response.status_code == 200
+            seen.extend(row["id"] for row in response.json())
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                break
+            params = {"limit": 2, "cursor": next_cursor}
+        assert len(seen) == 5 and len(set(seen)) == 5
+
+        streamed = await client.get(url, params={"format": "ndjson"})
+        assert streamed.headers["content-type"].startswith("application/x-ndjson")
+        assert [json.loads(line)["id"] for line in streamed.text.splitlines()] == seen
+
+        csv_response = await client.get(url, params={"format": "csv"})
+        assert csv_response.text.splitlines()[0].startswith("id,customer_id,capacity_id")
+        assert len(csv_response.text.splitlines()) == 6
+
+        bad_cursor = await client.get(url, params={"cursor": "garbage"})
+        assert bad_cursor.status_code == 400
@@ -0,0 +1,82 @@
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import text
+from app.services.metric_service import bulk_insert_metrics
+from app.services.partition_service import (
+    drop_expired_metric_partitions,
+    ensure_metric_partitions,
+    list_metric_partitions,
+    next_period_start,
+    parse_partition_bound,
+    partition_name,
+    period_start,
+)
+from tests.test_retention_service import create_customer_with_capacity
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_period_boundaries():
+    now = utc(2026, 12, 17, 13, 45)
+
+    assert period_start(now, "day") == utc(2026, 12, 17)
+    assert period_start(now, "week") == utc(2026, 12, 14)
+    assert period_start(now, "month") == utc(2026, 12, 1)
+    assert next_period_start(now, "month") == utc(2027, 1, 1)
+    assert next_period_start(now, "week") == utc(2026, 12, 21)
+
+    with pytest.raises(ValueError):
+        period_start(now, "quarter")
+
+
+def test_partition_name_and_bound_parsing():
+    assert partition_name(utc(2026, 3, 1)) == "capacity_metrics_p20260301"
+
+    bound = "FOR VALUES FROM ('2026-03-01 01:00:00+01') TO ('2026-04-01 02:00:00+02')"
+    assert parse_partition_bound(bound) == (utc(2026, 3, 1), utc(2026, 4, 1))
+    assert parse_partition_bound("DEFAULT") is None
+
+
+async def rows_per_partition(db_session) -> dict[str, int]:
+    rows_query = await db_session.execute(
+        text("SELECT tableoid::regclass::text, count(*) FROM capacity_metrics GROUP BY 1")
+    )
+    return dict(rows_query.all())
+
+
+@pytest.mark.asyncio
+async def test_partitions_take_default_rows_and_expire_whole(db_session):
+    customer, capacity = await create_customer_with_capacity(db_session, "partitions")
+    await bulk_insert_metrics(
+        db_session,
+        [
+            (customer.id, capacity.id, collected_at, "CPU", 1.0, "Average")
+            for collected_at in (utc(2026, 3, 2), utc(2026, 3, 31, 23), utc(2026, 4, 1), utc(2026, 6, 1))
+        ],
+    )
+    await db_session.commit()
+    assert await rows_per_partition(db_session) == {"capacity_metrics_default": 4}
+
+    created = await ensure_metric_partitions(db_session, utc(2026, 3, 15), "month", premake=1)
+    await db_session.commit()
+    assert created == ["capacity_metrics_p20260301", "capacity_metrics_p20260401"]
+    # Rows that arrived before their partition existed are moved into it
+    assert await rows_per_partition(db_session) == {
+        "capacity_metrics_p20260301": 2,
+        "capacity_metrics_p20260401": 1,
+        "capacity_metrics_default": 1,
+    }
+    assert await ensure_metric_partitions(db_session, utc(2026, 3, 20), "month", premake=1) == []
+
+    dropped = await drop_expired_metric_partitions(db_session, utc(2026, 4, 15))
+    await db_session.commit()
+    assert dropped == ["capacity_metrics_p20260301"]
+    assert [partition.name for partition in await list_metric_partitions(db_session)] == [
+        "capacity_metrics_p20260401"
+    ]
+    assert await rows_per_partition(db_session) == {
+        "capacity_metrics_p20260401": 1,
+        "capacity_metrics_default": 1,
+    }
@@ -0,0 +1,250 @@
+import fnmatch
+import pytest
+from datetime import datetime, timezone
+from uuid import uuid4
+from httpx import AsyncClient
+from sqlalchemy import event
+from app.core.config import settings
+from app.main import app
+from app.schemas.customer import CustomerCreate
+from app.services import capacity_service, customer_service
+from app.services.collector import CapacityCollector
+from app.services.response_cache import (
+    CachedResponse,
+    MemoryResponseCacheBackend,
+    RedisResponseCacheBackend,
+    ResponseCache,
+    etag_matches,
+    response_cache,
+)
+from tests.conftest import TestSessionLocal, engine
+from tests.test_collector import FakeAzureClient
+
+
+class LocalRedis:
+    """Stand-in for the subset of redis.asyncio.Redis the response cache uses."""
+
+    def __init__(self):
+        self.values: dict[str, bytes] = {}
+        self.ttls: dict[str, int] = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None):
+        self.values[key] = value
+        self.ttls[key] = ex
+
+    async def mget(self, keys):
+        return [self.values.get(key) for key in keys]
+
+    async def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+    async def scan_iter(self, match):
+        for key in list(self.values):
+            if fnmatch.fnmatch(key, match):
+                yield key
+
+    async def delete(self, key):
+        self.values.pop(key, None)
+
+    async def aclose(self):
+        pass
+
+
+class LocalPipeline:
+    def __init__(self, redis: LocalRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def incr(self, key):
+        self.commands.append(key)
+
+    async def execute(self):
+        for key in self.commands:
+            await self.redis.incr(key)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", [MemoryResponseCacheBackend, lambda: RedisResponseCacheBackend(LocalRedis())])
+async def test_invalidating_a_tag_only_orphans_entries_built_from_it(backend):
+    cache = ResponseCache(backend(), ttl=60)
+    entry = CachedResponse(b"[]", '"abc"', {"X-Next-Cursor": "c"})
+    capacity_key = await cache.key("/capacities", [("limit", "10")], ["capacities:a"])
+    other_key = await cache.key("/capacities", [("limit", "10")], ["capacities:b"])
+    await cache.set(capacity_key, entry)
+    await cache.set(other_key, entry)
+
+    assert await cache.key("/capacities", [("limit", "10")], ["capacities:a"]) == capacity_key
+    assert await cache.get(capacity_key) == entry
+
+    await cache.invalidate("capacities:a")
+
+    assert await cache.key("/capacities", [("limit", "10")], ["capacities:a"]) != capacity_key
+    assert await cache.key("/capacities", [("limit", "10")], ["capacities:b"]) == other_key
+    assert await cache.get(other_key) == entry
+    assert cache.stats.hits == 2
+    assert cache.stats.invalidations == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_evicts_least_recently_used_and_expired_entries():
+    now = [0.0]
+    backend = MemoryResponseCacheBackend(max_entries=2, clock=lambda: now[0])
+    await backend.set("a", b"1", ttl=10)
+    await backend.set("b", b"2", ttl=10)
+    await backend.get("a")
+    await backend.set("c", b"3", ttl=10)
+
+    assert await backend.get("b") is None
+    assert await backend.get("a") == b"1"
+
+    now[0] = 10
+    assert await backend.get("a") is None
+    assert len(backend) == 1
+
+
+@pytest.mark.asyncio
+async def test_backend_failures_degrade_to_misses():
+    class BrokenBackend(MemoryResponseCacheBackend):
+        async def get(self, key):
+            raise ConnectionError("redis down")
+
+        async def bump(self, tags):
+            raise ConnectionError("redis down")
+
+    cache = ResponseCache(BrokenBackend())
+    assert await cache.get("key") is None
+    await cache.invalidate("capacities:a")
+    assert cache.stats.errors == 2
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abd"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+async def create_customer_with_capacities(db_session):
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name="Customer A",
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    capacities = [
+        await capacity_service.upsert_capacity(
+            db_session,
+            customer.id,
+            f"/subscriptions/xxx/resourceGroups/rg1/providers/Microsoft.Fabric/capacities/cap{i}",
+            f"Capacity {i}",
+            "F2",
+            "Standard",
+            "eastus",
+            "Active",
+        )
+        for i in (1, 2)
+    ]
+    return customer, capacities
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_served_from_cache_until_ingest_touches_the_capacity(db_session, override_get_db):
+    customer, (capacity, other) = await create_customer_with_capacities(db_session)
+    reads = {"count": 0}
+
+    def count_metric_reads(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith("SELECT") and "FROM capacity_metrics" in statement:
+            reads["count"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", count_metric_reads)
+    metrics_url = f"/api/customers/{customer.id}/capacities/{capacity.id}/metrics"
+    other_url = f"/api/customers/{customer.id}/capacities/{other.id}/metrics"
+
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            first = await client.get(metrics_url)
+            other_first = await client.get(other_url)
+            assert first.status_code == 200
+            assert first.headers["Cache-Control"] == "private, no-cache"
+            assert first.json() == []
+
+            repeat = await client.get(metrics_url)
+            assert repeat.content == first.content
+            assert repeat.headers["ETag"] == first.headers["ETag"]
+            assert reads["count"] == 2
+
+            not_modified = await client.get(metrics_url, headers={"If-None-Match": first.headers["ETag"]})
+            assert not_modified.status_code == 304
+            assert not_modified.content == b""
+
+            ingest = await client.post(
+                "/api/ingest",
+                json={
+                    "capacity_name": "Capacity 1",
+                    "collected_at": datetime.now(timezone.utc).isoformat(),
+                    "metrics": [{"name": "CPU", "value": 50.0}],
+                },
+                headers={"X-Ingest-Key": customer.ingest_key},
+            )
+            assert ingest.status_code == 202
+
+            changed = await client.get(metrics_url, headers={"If-None-Match": first.headers["ETag"]})
+            assert changed.status_code == 200
+            assert changed.headers["ETag"] != first.headers["ETag"]
+            assert [metric["metric_value"] for metric in changed.json()] == [50.0]
+
+            untouched = await client.get(other_url, headers={"If-None-Match": other_first.headers["ETag"]})
+            assert untouched.status_code == 304
+            assert reads["count"] == 3
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", count_metric_reads)
+
+
+@pytest.mark.asyncio
+async def test_health_summary_is_invalidated_only_when_it_changes(db_session, override_get_db):
+    customer, _ = await create_customer_with_capacities(db_session)
+    collector = CapacityCollector(azure_client=FakeAzureClient(), session_factory=TestSessionLocal)
+    headers = {"X-Admin-Key": settings.admin_api_key}
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        summary = await client.get("/api/customers/health/summary", headers=headers)
+        etag = summary.headers["ETag"]
+
+        async def revalidate() -> int:
+            nonlocal etag
+            response = await client.get(
+                "/api/customers/health/summary", headers={**headers, "If-None-Match": etag}
+            )
+            etag = response.headers["ETag"]
+            return response.status_code
+
+        await collector.update_customer_health(db_session, customer.id, success=True)
+        await collector.update_customer_health(db_session, customer.id, success=False, error_message="boom")
+        assert await revalidate() == 304
+
+        for _ in range(2):
+            await collector.update_customer_health(db_session, customer.id, success=False, error_message="boom")
+        assert await revalidate() == 200
+
+        await collector.update_customer_health(db_session, customer.id, success=True)
+        assert await revalidate() == 200
+        await collector.update_customer_health(db_session, customer.id, success=True)
+        assert await revalidate() == 304
+    assert response_cache.stats.not_modified >= 2
@@ -0,0 +1,118 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from httpx import AsyncClient
+from sqlalchemy import select
+from app.core.config import settings
+from app.main import app
+from app.models.capacity import CapacitySnapshot
+from app.models.metric import CapacityMetric
+from app.models.rollup import MetricRollupHourly, RollupWatermark
+from app.schemas.customer import CustomerCreate
+from app.services import customer_service, capacity_service
+from app.services.metric_service import bulk_insert_metrics
+from app.services.retention_service import run_retention
+from app.services.rollup_service import WATERMARK_NAME
+
+# The dry-run endpoint uses the clock, so the fixtures are placed relative to it
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def days_ago(days: int) -> datetime:
+    return NOW - timedelta(days=days)
+
+
+async def create_customer_with_capacity(db_session, name: str):
+    customer = await customer_service.create_customer(
+        db_session,
+        CustomerCreate(
+            name=name,
+            tenant_id=str(uuid4()),
+            client_id=str(uuid4()),
+            client_secret="secret",
+            subscription_id=str(uuid4()),
+        ),
+    )
+    capacity = await capacity_service.upsert_capacity(
+        db_session, customer.id, f"/subscriptions/xxx/capacities/{name}", name, "F2", "Standard", "eastus", "Active"
+    )
+    return customer, capacity
+
+
+@pytest.mark.asyncio
+async def test_retention_reports_then_removes_in_batches(db_session, override_get_db, monkeypatch):
+    monkeypatch.setattr(settings, "retention_batch_rows", 1)
+    monkeypatch.setattr(settings, "retention_batch_pause_seconds", 0)
+    monkeypatch.setattr(settings, "rollup_id_overlap", 0)
+
+    short, short_capacity = await create_customer_with_capacity(db_session, "short")
+    default, default_capacity = await create_customer_with_capacity(db_session, "default")
+    short.metrics_retention_days = 30
+    short_id, short_capacity_id = short.id, short_capacity.id
+    default_id, default_capacity_id = default.id, default_capacity.id
+
+    await bulk_insert_metrics(
+        db_session,
+        [
+            (short_id, short_capacity_id, days_ago(days), "CPU", 1.0, "Average")
+            for days in (60, 59, 1)
+        ]
+        + [(default_id, default_capacity_id, days_ago(60), "CPU", 1.0, "Average")],
+    )
+    rolled_up_query = await db_session.execute(select(CapacityMetric.id).order_by(CapacityMetric.id.desc()))
+    db_session.add(RollupWatermark(name=WATERMARK_NAME, last_metric_id=rolled_up_query.scalars().first()))
+    # Not rolled up yet, so it outlives its retention until the rollup job passes it
+    await bulk_insert_metrics(db_session, [(short_id, short_capacity_id, days_ago(58), "CPU", 1.0, "Average")])
+
+    for days in (500, 450, 10):
+        db_session.add(
+            CapacitySnapshot(capacity_id=short_capacity_id, collected_at=days_ago(days), state="Active", sku_name="F2")
+        )
+    for days in (400, 1):
+        db_session.add(
+            MetricRollupHourly(
+                capacity_id=short_capacity_id,
+                metric_name="CPU",
+                bucket_start=days_ago(days),
+                customer_id=short_id,
+                min_value=1.0,
+                max_value=1.0,
+                avg_value=1.0,
+                p95_value=1.0,
+                sample_count=1,
+            )
+        )
+    await db_session.commit()
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/retention/dry-run", headers={"X-Admin-Key": settings.admin_api_key})
+    assert response.status_code == 201
+    assert response.json()["removed"] is None
+
+    run = await run_retention(db_session, NOW)
+    expected = {"capacity_metrics": 2, "capacity_snapshots": 1, "metric_rollups_hourly": 1}
+    assert run.report["rows"] == expected
+    assert [entry["customer_id"] for entry in run.report["customers"]] == [str(short_id)]
+    assert run.report["customers"][0]["tables"]["capacity_metrics"]["retention_days"] == 30
+    assert run.removed == {"partitions": [], "rows": expected}
+
+    metrics_query = await db_session.execute(
+        select(CapacityMetric.capacity_id, CapacityMetric.collected_at).order_by(CapacityMetric.collected_at)
+    )
+    assert metrics_query.all() == [
+        (default_capacity_id, days_ago(60)),
+        (short_capacity_id, days_ago(58)),
+        (short_capacity_id, days_ago(1)),
+    ]
+    # The snapshot in effect at the cutoff stays, so the state before the cutoff is still known
+    snapshots_query = await db_session.execute(
+        select(CapacitySnapshot.collected_at).order_by(CapacitySnapshot.collected_at)
+    )
+    assert snapshots_query.scalars().all() == [days_ago(450), days_ago(10)]
+    rollups_query = await db_session.execute(select(MetricRollupHourly.bucket_start))
+    assert rollups_query.scalars().all() == [days_ago(1)]
+
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/api/retention/runs", headers={"X-Admin-Key": settings.admin_api_key})
+    assert [entry["dry_run"] for entry in response.json()] == [False, True]
+    assert response.json()[1]["report"]["rows"]["capacity_snapshots"] == 1
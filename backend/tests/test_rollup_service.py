@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from app.core.config import settings
+from app.models.rollup import MetricRollupDaily, MetricRollupHourly
+from app.services.metric_service import bulk_insert_metrics
+from app.services.rollup_service import choose_resolution, refresh_rollups
+from tests.conftest import TestSessionLocal
+from tests.test_retention_service import create_customer_with_capacity
+
+NOW = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_explicit_resolution_is_kept():
+    assert choose_resolution("hour", None, None, NOW) == "hour"
+    assert choose_resolution("raw", NOW - timedelta(days=365), NOW, NOW) == "raw"
+
+
+def test_auto_resolution_picks_coarsest_fitting_rollup():
+    assert choose_resolution("auto", None, None, NOW) == "raw"
+    assert choose_resolution("auto", NOW - timedelta(hours=6), None, NOW) == "raw"
+    assert choose_resolution("auto", NOW - timedelta(days=30), NOW, NOW) == "hour"
+    assert choose_resolution("auto", NOW - timedelta(days=180), NOW, NOW) == "day"
+
+
+async def hourly_counts(db_session) -> dict[datetime, int]:
+    rollups_query = await db_session.execute(
+        select(MetricRollupHourly.bucket_start, MetricRollupHourly.sample_count).order_by(
+            MetricRollupHourly.bucket_start
+        )
+    )
+    return dict(rollups_query.all())
+
+
+@pytest.mark.asyncio
+async def test_refresh_recomputes_only_touched_buckets(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "rollup_id_overlap", 0)
+    customer, capacity = await create_customer_with_capacity(db_session, "rollups")
+    customer_id, capacity_id = customer.id, capacity.id
+    hour = datetime(2026, 3, 1, 10, tzinfo=timezone.utc)
+
+    def record(minutes: int, value: float):
+        return (customer_id, capacity_id, hour + timedelta(minutes=minutes), "CPU", value, "Average")
+
+    await bulk_insert_metrics(db_session, [record(5, 10.0), record(20, 30.0)])
+    await db_session.commit()
+    first = await refresh_rollups(db_session)
+    assert await hourly_counts(db_session) == {hour: 2}
+
+    # A late point for the same hour re-touches its bucket, which is recomputed from all of its rows
+    await bulk_insert_metrics(db_session, [record(40, 50.0), record(70, 1.0)])
+    await db_session.commit()
+    second = await refresh_rollups(db_session)
+    assert second["low_id"] == first["high_id"]
+    assert await hourly_counts(db_session) == {hour: 3, hour + timedelta(hours=1): 1}
+    daily_query = await db_session.execute(select(MetricRollupDaily.avg_value, MetricRollupDaily.sample_count))
+    assert daily_query.one() == (22.75, 4)
+
+    third = await refresh_rollups(db_session)
+    assert third["low_id"] == third["high_id"] == second["high_id"]
+
+
+@pytest.mark.asyncio
+async def test_watermark_waits_for_writers_that_commit_lower_ids_late(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "rollup_id_overlap", 0)
+    monkeypatch.setattr(settings, "write_settle_timeout_seconds", 0.1)
+    customer, capacity = await create_customer_with_capacity(db_session, "late")
+    customer_id, capacity_id = customer.id, capacity.id
+    await db_session.commit()
+    collected_at = datetime(2026, 3, 1, 10, 5, tzinfo=timezone.utc)
+    record = (customer_id, capacity_id, collected_at, "CPU", 1.0, "Average")
+
+    async with TestSessionLocal() as slow_writer:
+        # Draws the lower id, then commits after a later writer has already committed a higher one
+        await bulk_insert_metrics(slow_writer, [record])
+        await bulk_insert_metrics(db_session, [record])
+        await db_session.commit()
+
+        stalled = await refresh_rollups(db_session)
+        assert stalled["high_id"] == 0
+        assert await hourly_counts(db_session) == {}
+
+        monkeypatch.setattr(settings, "write_settle_timeout_seconds", 5)
+        refresh = asyncio.create_task(refresh_rollups(db_session))
+        await asyncio.sleep(0.2)
+        assert not refresh.done()
+        await slow_writer.commit()
+        await refresh
+
+    assert await hourly_counts(db_session) == {collected_at.replace(minute=0): 2}
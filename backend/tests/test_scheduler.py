@@ -0,0 +1,160 @@
+import asyncio
+import random
+import httpx
+import pytest
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+from app.services.azure_client import AzureClient
+from app.services.collector import CapacityCollector
+from app.services.scheduler import CollectionResult, CollectionScheduler
+from tests.test_collector import FakeSessionFactory, make_customers
+
+INTERVAL = 900
+
+
+def make_scheduler(**kwargs) -> CollectionScheduler:
+    options = {
+        "default_interval": INTERVAL,
+        "fast_interval": 120,
+        "max_backoff": 4 * 3600,
+        "jitter": 0.1,
+        "clock": lambda: 0.0,
+        "rng": random.Random(7),
+    }
+    options.update(kwargs)
+    return CollectionScheduler(**options)
+
+
+def test_customers_are_spread_instead_of_firing_together():
+    scheduler = make_scheduler()
+    customers = make_customers(200)
+    scheduler.sync(customers, now=0.0)
+
+    first_due = [entry.due for entry in scheduler.entries.values()]
+    assert all(0 <= due <= 60 for due in first_due)
+    assert len(set(first_due)) == len(customers)
+
+    due = scheduler.pop_due(now=60)
+    assert len(due) == len(customers)
+    assert scheduler.pop_due(now=60) == []
+    assert scheduler.next_due() is None
+
+    delays = [scheduler.complete(customer.id, CollectionResult(True), now=60) for customer in due]
+    assert all(INTERVAL * 0.9 <= delay <= INTERVAL * 1.1 for delay in delays)
+    assert max(delays) - min(delays) > INTERVAL * 0.1
+
+
+def test_cadence_resumes_from_last_success_and_per_customer_interval():
+    scheduler = make_scheduler(jitter=0)
+    recent, overdue = make_customers(2)
+    recent.last_successful_collection = datetime.now(timezone.utc) - timedelta(minutes=5)
+    recent.collection_interval_minutes = 30
+    overdue.last_successful_collection = datetime.now(timezone.utc) - timedelta(hours=2)
+    scheduler.sync([recent, overdue], now=0.0)
+
+    assert scheduler.entries[recent.id].due == pytest.approx(25 * 60, abs=5)
+    assert scheduler.entries[overdue.id].due <= 60
+    assert scheduler.interval_for(recent) == 30 * 60
+    assert scheduler.interval_for(overdue) == INTERVAL
+
+
+def test_next_run_is_measured_from_the_start_of_the_collection():
+    scheduler = make_scheduler(jitter=0)
+    steady, overrunning = make_customers(2)
+    scheduler.sync([steady, overrunning], now=0.0)
+    assert len(scheduler.pop_due(now=100)) == 2
+
+    # A 40 second collection keeps the 900 second cadence from its start
+    scheduler.complete(steady.id, CollectionResult(True), now=140)
+    assert scheduler.entries[steady.id].due == 100 + INTERVAL
+
+    # One that ran past its next due time is due on completion, not earlier
+    scheduler.complete(overrunning.id, CollectionResult(True), now=100 + INTERVAL + 30)
+    assert scheduler.entries[overrunning.id].due == 100 + INTERVAL + 30
+
+
+def test_degraded_customer_keeps_its_backoff_across_restarts():
+    scheduler = make_scheduler(jitter=0)
+    degraded, healthy = make_customers(2)
+    degraded.consecutive_failures = 5
+    scheduler.sync([degraded, healthy], now=0.0)
+
+    assert scheduler.entries[degraded.id].due == INTERVAL * 2**3
+    assert scheduler.entries[degraded.id].failures == 5
+    assert scheduler.entries[healthy.id].due <= 60
+
+
+def test_failing_customer_backs_off_exponentially_and_recovers():
+    scheduler = make_scheduler(jitter=0)
+    (customer,) = make_customers(1)
+    scheduler.sync([customer], now=0.0)
+
+    delays = []
+    for _ in range(8):
+        scheduler.pop_due(now=10**9)
+        delays.append(scheduler.complete(customer.id, CollectionResult(False), now=0.0))
+
+    # Healthy retry cadence until degraded, then doubling up to the cap
+    assert delays == [900, 900, 1800, 3600, 7200, 14400, 14400, 14400]
+
+    scheduler.pop_due(now=10**9)
+    assert scheduler.complete(customer.id, CollectionResult(True), now=0.0) == INTERVAL
+    assert scheduler.entries[customer.id].failures == 0
+
+
+def test_state_change_switches_to_fast_polling_until_stable():
+    scheduler = make_scheduler(jitter=0)
+    (customer,) = make_customers(1)
+    capacity_id = uuid4()
+    scheduler.sync([customer], now=0.0)
+
+    delays = []
+    for state in ["Active", "Active", "Resuming", "Resuming"]:
+        scheduler.pop_due(now=10**9)
+        delays.append(scheduler.complete(customer.id, CollectionResult(True, {capacity_id: state}), now=0.0))
+
+    assert delays == [INTERVAL, INTERVAL, 120, INTERVAL]
+
+
+def test_removed_customers_drop_out_of_the_schedule():
+    scheduler = make_scheduler()
+    kept, removed = make_customers(2)
+    scheduler.sync([kept, removed], now=0.0)
+    scheduler.sync([kept], now=0.0)
+
+    assert [customer.id for customer in scheduler.pop_due(now=INTERVAL)] == [kept.id]
+    assert scheduler.complete(removed.id, CollectionResult(True)) is None
+
+
+@pytest.mark.asyncio
+async def test_broken_customer_stops_taking_worker_slots():
+    customers = make_customers(5)
+    broken = customers[0]
+    azure_client = AzureClient(transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+    collector = CapacityCollector(azure_client=azure_client, session_factory=FakeSessionFactory())
+    attempts = Counter()
+
+    async def load_customers():
+        return customers
+
+    async def collect_for_customer(customer):
+        attempts[customer.id] += 1
+        await asyncio.sleep(0.001)
+        return CollectionResult(customer is not broken)
+
+    collector.load_customers = load_customers
+    collector.collect_for_customer = collect_for_customer
+    scheduler = CollectionScheduler(
+        default_interval=0.02, fast_interval=0.01, max_backoff=1.0, startup_spread=0.01
+    )
+
+    task = asyncio.create_task(collector.run_scheduled(scheduler))
+    await asyncio.sleep(0.6)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    healthy = min(attempts[customer.id] for customer in customers[1:])
+    assert healthy >= 10
+    assert attempts[broken.id] < healthy / 2
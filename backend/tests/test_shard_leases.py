@@ -0,0 +1,218 @@
+import asyncio
+import time
+import pytest
+from collections import Counter
+from uuid import uuid4
+from app.services import collector as collector_module
+from app.services.collector import CapacityCollector
+from app.services.leases import (
+    PostgresAdvisoryLeaseBackend,
+    ShardLeaseManager,
+    jump_hash,
+    shard_for,
+    shard_lease_name,
+)
+from tests.conftest import engine
+from tests.test_collector import FakeAzureClient, FakeKeyVault, FakeSessionFactory, make_customers
+
+SHARD_COUNT = 16
+LEASE_SECONDS = 60
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class LocalLeaseBackend:
+    # Same semantics as blob leases: exclusive, time-limited, renewable only by the holder
+    def __init__(self, clock: FakeClock):
+        self.clock = clock
+        self.leases: dict[str, tuple[str, float]] = {}
+
+    def holder(self, name: str) -> str | None:
+        lease = self.leases.get(name)
+        if lease and lease[1] > self.clock():
+            return lease[0]
+        return None
+
+    async def acquire(self, name, owner, duration):
+        if self.holder(name) not in (None, owner):
+            return False
+        self.leases[name] = (owner, self.clock() + duration)
+        return True
+
+    async def renew(self, name, owner, duration):
+        if self.holder(name) != owner:
+            return False
+        self.leases[name] = (owner, self.clock() + duration)
+        return True
+
+    async def release(self, name, owner):
+        if self.holder(name) == owner:
+            del self.leases[name]
+
+    async def holders(self, prefix):
+        return {
+            name: self.holder(name)
+            for name in self.leases
+            if name.startswith(prefix) and self.holder(name)
+        }
+
+    async def close(self):
+        pass
+
+
+def make_managers(backend, clock, count):
+    return [
+        ShardLeaseManager(
+            backend,
+            replica_id=f"replica-{i}",
+            shard_count=SHARD_COUNT,
+            lease_seconds=LEASE_SECONDS,
+            clock=clock,
+        )
+        for i in range(count)
+    ]
+
+
+async def heartbeat_rounds(managers, rounds=3):
+    for _ in range(rounds):
+        for manager in managers:
+            await manager.heartbeat()
+
+
+def assert_exclusive_cover(backend, managers):
+    owners = Counter(shard for manager in managers for shard in manager.owned)
+    assert set(owners) == set(range(SHARD_COUNT))
+    assert all(count == 1 for count in owners.values())
+    for manager in managers:
+        for shard in manager.owned:
+            assert backend.holder(shard_lease_name(shard)) == manager.replica_id
+
+
+def test_jump_hash_is_stable_and_moves_few_keys():
+    keys = [uuid4() for _ in range(2000)]
+    before = {key: shard_for(key, 16) for key in keys}
+    after = {key: shard_for(key, 17) for key in keys}
+
+    assert all(0 <= shard < 16 for shard in before.values())
+    assert before == {key: shard_for(key, 16) for key in keys}
+    moved = sum(1 for key in keys if before[key] != after[key])
+    # Growing from 16 to 17 shards should move about 1/17 of keys, not reshuffle them all
+    assert moved < len(keys) * 0.1
+    assert jump_hash(0, 1) == 0
+
+
+@pytest.mark.asyncio
+async def test_replicas_split_shards_and_rebalance_when_one_dies():
+    clock = FakeClock()
+    backend = LocalLeaseBackend(clock)
+    managers = make_managers(backend, clock, 3)
+
+    await heartbeat_rounds(managers)
+    assert_exclusive_cover(backend, managers)
+    assert max(len(manager.owned) for manager in managers) == 6
+
+    survivors, dead = managers[:2], managers[2]
+    for _ in range(4):
+        clock.now += LEASE_SECONDS / 3
+        await heartbeat_rounds(survivors, rounds=1)
+
+    assert not dead.owns_customer(uuid4())
+    assert_exclusive_cover(backend, survivors)
+    assert [len(manager.owned) for manager in survivors] == [8, 8]
+
+
+@pytest.mark.asyncio
+async def test_new_replica_takes_over_its_share():
+    clock = FakeClock()
+    backend = LocalLeaseBackend(clock)
+    first, second = make_managers(backend, clock, 2)
+
+    await heartbeat_rounds([first])
+    assert len(first.owned) == SHARD_COUNT
+
+    await heartbeat_rounds([second, first, second])
+    assert_exclusive_cover(backend, [first, second])
+    assert len(first.owned) == len(second.owned) == SHARD_COUNT // 2
+
+    await first.release_all()
+    assert await backend.holders("collector-member-") == {"collector-member-replica-1": "replica-1"}
+
+
+@pytest.mark.asyncio
+async def test_sharded_replicas_split_collection_work(monkeypatch):
+    customers = make_customers(100)
+
+    async def list_customers(db, active_only=False):
+        return customers
+
+    monkeypatch.setattr(collector_module, "list_customers", list_customers)
+
+    async def replica_cycle(manager: ShardLeaseManager | None):
+        collector = CapacityCollector(
+            azure_client=FakeAzureClient(),
+            session_factory=FakeSessionFactory(),
+            shard_leases=manager,
+        )
+        collector.kv_client = FakeKeyVault()
+        collected = []
+        original = collector.collect_for_customer
+
+        async def record(customer):
+            collected.append(customer.id)
+            return await original(customer)
+
+        collector.collect_for_customer = record
+        owned = await collector.load_customers()
+        await asyncio.gather(*[collector.collect_with_limit(customer) for customer in owned])
+        return collected
+
+    started = time.perf_counter()
+    single = await replica_cycle(None)
+    single_elapsed = time.perf_counter() - started
+
+    clock = FakeClock()
+    backend = LocalLeaseBackend(clock)
+    managers = make_managers(backend, clock, 2)
+    await heartbeat_rounds(managers)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*[replica_cycle(manager) for manager in managers])
+    sharded_elapsed = time.perf_counter() - started
+
+    assert len(single) == 100
+    assert sorted(results[0] + results[1]) == sorted(single)
+    assert not set(results[0]) & set(results[1])
+    assert sharded_elapsed < single_elapsed * 0.75
+
+
+@pytest.mark.asyncio
+async def test_postgres_advisory_backend_splits_and_fails_over():
+    backends = [PostgresAdvisoryLeaseBackend(engine) for _ in range(2)]
+    managers = [
+        ShardLeaseManager(backend, replica_id=f"pg-replica-{i}", shard_count=SHARD_COUNT)
+        for i, backend in enumerate(backends)
+    ]
+
+    try:
+        await heartbeat_rounds(managers)
+        owners = Counter(shard for manager in managers for shard in manager.owned)
+        assert set(owners) == set(range(SHARD_COUNT))
+        assert all(count == 1 for count in owners.values())
+        assert [len(manager.owned) for manager in managers] == [8, 8]
+
+        holders = await backends[0].holders("collector-member-")
+        assert set(holders.values()) == {"pg-replica-0", "pg-replica-1"}
+
+        # Dropping the connection is what a crashed replica looks like: Postgres frees its locks at once
+        await backends[1].close()
+        await heartbeat_rounds(managers[:1], rounds=2)
+        assert managers[0].owned == set(range(SHARD_COUNT))
+    finally:
+        for backend in backends:
+            await backend.close()
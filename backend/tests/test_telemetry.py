@@ -0,0 +1,55 @@
+import pytest
+from httpx import AsyncClient
+from app.core.config import settings
+from app.main import app
+from app.services.telemetry import DatabasePoolCollector, registry, time_pages
+from tests.conftest import engine
+
+
+async def pages(count: int):
+    for page in range(count):
+        yield [page]
+
+
+@pytest.mark.asyncio
+async def test_time_pages_observes_each_page():
+    def observed() -> float:
+        return registry.get_sample_value(
+            "fabricmon_collector_stage_duration_seconds_count", {"stage": "list_capacities"}
+        )
+
+    before = observed()
+    assert [page async for page in time_pages(pages(3), "list_capacities")] == [[0], [1], [2]]
+    assert observed() - before == 3
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_formats_and_route_labels(monkeypatch):
+    collector = DatabasePoolCollector(engine)
+    registry.register(collector)
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            await client.get("/health")
+            response = await client.get("/metrics")
+            openmetrics_response = await client.get(
+                "/metrics", headers={"Accept": "application/openmetrics-text; version=1.0.0"}
+            )
+
+            monkeypatch.setattr(settings, "metrics_bearer_token", "scrape-token")
+            unauthorized = await client.get("/metrics")
+            authorized = await client.get("/metrics", headers={"Authorization": "Bearer scrape-token"})
+    finally:
+        registry.unregister(collector)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    # Route templates, not raw paths, become label values
+    assert 'fabricmon_http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
+    assert 'fabricmon_collector_stage_duration_seconds_count{stage="snapshot"}' in response.text
+    assert 'fabricmon_db_pool_connections{state="checked_out"}' in response.text
+
+    assert openmetrics_response.headers["content-type"].startswith("application/openmetrics-text")
+    assert openmetrics_response.text.endswith("# EOF\n")
+
+    assert unauthorized.status_code == 401
+    assert authorized.status_code == 200
@@ -3,6 +3,7 @@
 
 import sempy.fabric as fabric
 import requests
+import time
 from datetime import datetime, timedelta
 import json
 
@@ -66,12 +67,17 @@ try:
             "Content-Type": "application/json"
         }
         
-        response = requests.post(
-            f"{API_URL}/api/ingest",
-            json=payload,
-            headers=headers,
-            timeout=30
-        )
+        # The API answers 429 with Retry-After while its ingest queue is full
+        for attempt in range(3):
+            response = requests.post(
+                f"{API_URL}/api/ingest",
+                json=payload,
+                headers=headers,
+                timeout=30
+            )
+            if response.status_code != 429:
+                break
+            time.sleep(int(response.headers.get("Retry-After", "5")))
         
         if response.status_code == 202:
             print(f"Successfully pushed {len(payload['metrics'])} metrics")